@@ -0,0 +1,268 @@
+# 📡 Bus d'Événements des Conditions
+# Un seul observateur (inotify via watchdog) pour toutes les conditions fichier et email des tâches
+import os
+import threading
+from email.header import decode_header, make_header
+from email.parser import BytesHeaderParser
+from typing import Dict, List, Any, Optional, Callable, Set, Tuple
+import logging
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Scrutation de repli (sans watchdog, ou dossier parent encore absent), en secondes
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Types de conditions servis par le bus (les autres restent vérifiés par l'ordonnanceur)
+EVENT_CONDITIONS = ("file", "email")
+
+
+def _header(value: Optional[str]) -> str:
+    """En-tête décodé (sujets encodés =?utf-8?...?=)"""
+    if not value:
+        return ""
+    try:
+        return str(make_header(decode_header(value)))
+    except Exception:
+        return value
+
+
+class _Handler(FileSystemEventHandler):
+    """Relaie au bus les chemins créés, modifiés ou déplacés"""
+
+    def __init__(self, bus: "EventBus"):
+        super().__init__()
+        self.bus = bus
+
+    def on_any_event(self, event):
+        if event.event_type == "deleted" or event.is_directory:
+            return
+        self.bus.publish(getattr(event, "dest_path", None) or event.src_path)
+
+
+class EventBus:
+    """Déclenche les tâches conditionnelles dès que leur événement se produit
+
+    - condition "file" : le fichier apparaît (ou existe déjà à l'abonnement) ;
+    - condition "email" : un message correspondant (expéditeur, sujet) arrive
+      dans le dossier new/ de la boîte Maildir locale.
+
+    Toutes les conditions partagent un seul observateur : un dossier n'est
+    surveillé qu'une fois quel que soit le nombre de tâches qui y attendent
+    un fichier, et un événement est rapproché des abonnements par un index
+    des chemins (O(1)). Un abonnement est à usage unique, comme une échéance
+    de l'ordonnanceur : il est retiré au déclenchement.
+    """
+
+    def __init__(self, maildir: Optional[str] = None, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 use_watchdog: bool = True):
+        self.maildir = os.path.abspath(maildir) if maildir else None
+        self.mail_dir = os.path.join(self.maildir, "new") if self.maildir else None
+        self.poll_interval = poll_interval
+        self.use_watchdog = use_watchdog and Observer is not None
+        self._subscriptions: Dict[str, Tuple[str, Any, Callable[[], Any]]] = {}
+        self._files: Dict[str, Set[str]] = {}
+        self._mail: Dict[str, Tuple[str, str]] = {}
+        self._watches: Dict[str, Any] = {}
+        self._polled: Set[str] = set()
+        self._seen_mail: Optional[Set[str]] = None
+        self._observer = None
+        self._poller: Optional[threading.Thread] = None
+        self._lock = threading.RLock()
+        self._stopped = threading.Event()
+        self._running = False
+        self.fired = 0
+
+    def start(self):
+        """Active le bus (les threads d'observation ne démarrent qu'au premier abonnement)"""
+        with self._lock:
+            self._running = True
+            self._stopped.clear()
+
+    def stop(self):
+        """Arrête l'observation et retire tous les abonnements"""
+        with self._lock:
+            self._running = False
+            self._stopped.set()
+            observer, self._observer = self._observer, None
+            self._subscriptions.clear()
+            self._files.clear()
+            self._mail.clear()
+            self._watches.clear()
+            self._polled.clear()
+            self._seen_mail = None
+        if observer is not None:
+            observer.stop()
+            observer.join(5)
+        if self._poller and self._poller is not threading.current_thread():
+            self._poller.join(5)
+        self._poller = None
+
+    def subscribe(self, key: str, condition: Dict[str, Any], callback: Callable[[], Any]) -> bool:
+        """Abonne `callback` à l'événement d'une condition ; False si la condition n'est pas événementielle"""
+        condition_type = condition.get("type", "email")
+        if condition_type not in EVENT_CONDITIONS:
+            return False
+
+        with self._lock:
+            self._remove(key)
+            if condition_type == "file":
+                path = os.path.abspath(condition.get("file_path") or "")
+                if not condition.get("file_path"):
+                    logger.warning(f"Condition fichier sans chemin pour '{key}'")
+                    return False
+                self._subscriptions[key] = ("file", path, callback)
+                self._files.setdefault(path, set()).add(key)
+                self._watch_path(path)
+            else:
+                if not self.mail_dir:
+                    logger.warning(f"Condition email de '{key}' ignorée : PLANNER_MAILDIR non configuré")
+                    return False
+                self._subscriptions[key] = ("email", None, callback)
+                self._mail[key] = ((condition.get("email_sender") or "").lower(),
+                                   (condition.get("email_subject") or "").lower())
+                self._watch_mailbox()
+
+        # Le fichier attendu est peut-être déjà là : la condition est remplie tout de suite
+        if condition_type == "file" and os.path.exists(path):
+            self.publish(path)
+        return True
+
+    def unsubscribe(self, key: str) -> bool:
+        """Retire l'abonnement d'une clé ; False s'il n'existait pas"""
+        with self._lock:
+            return self._remove(key)
+
+    def _remove(self, key: str) -> bool:
+        subscription = self._subscriptions.pop(key, None)
+        if subscription is None:
+            return False
+        kind, path, _ = subscription
+        if kind == "file":
+            keys = self._files.get(path)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._files[path]
+                    self._polled.discard(path)
+        else:
+            self._mail.pop(key, None)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._subscriptions
+
+    def _watch_path(self, path: str):
+        """Surveille le dossier du fichier (une seule fois par dossier), sinon le scrute (verrou détenu)"""
+        directory = os.path.dirname(path)
+        if self.use_watchdog and os.path.isdir(directory):
+            self._watch_directory(directory)
+        else:
+            # Dossier encore absent : scrutation du chemin jusqu'à sa création
+            self._polled.add(path)
+            self._ensure_poller()
+
+    def _watch_mailbox(self):
+        if self.mail_dir in self._watches:
+            return
+        if self.use_watchdog and os.path.isdir(self.mail_dir):
+            self._watch_directory(self.mail_dir)
+            return
+        if self._seen_mail is None:
+            # Seuls les messages arrivés après l'abonnement comptent
+            self._seen_mail = set(os.listdir(self.mail_dir)) if os.path.isdir(self.mail_dir) else set()
+        self._ensure_poller()
+
+    def _watch_directory(self, directory: str):
+        if directory in self._watches:
+            return
+        if self._observer is None:
+            self._observer = Observer()
+            self._observer.daemon = True
+            self._observer.start()
+        self._watches[directory] = self._observer.schedule(_Handler(self), directory, recursive=False)
+
+    def _ensure_poller(self):
+        if self._poller is None or not self._poller.is_alive():
+            self._poller = threading.Thread(target=self._poll, name="event-poller", daemon=True)
+            self._poller.start()
+
+    def _poll(self):
+        """Repli sans inotify : un seul thread scrute les chemins en attente et la boîte mail"""
+        while not self._stopped.wait(self.poll_interval):
+            with self._lock:
+                paths = list(self._polled)
+                poll_mail = bool(self._mail) and self._seen_mail is not None
+            for path in paths:
+                if os.path.exists(path):
+                    self.publish(path)
+            if poll_mail and os.path.isdir(self.mail_dir):
+                names = set(os.listdir(self.mail_dir))
+                for name in names - self._seen_mail:
+                    self.publish(os.path.join(self.mail_dir, name))
+                self._seen_mail = names
+
+    def publish(self, path: str) -> int:
+        """Signale la création ou la modification d'un chemin ; retourne le nombre de tâches déclenchées"""
+        path = os.path.abspath(path)
+        with self._lock:
+            keys = list(self._files.get(path, ()))
+            if self.mail_dir and os.path.dirname(path) == self.mail_dir and self._mail:
+                keys.extend(self._matching_mail(path))
+            callbacks = [self._subscriptions[key][2] for key in keys if key in self._subscriptions]
+            for key in keys:
+                self._remove(key)
+            self.fired += len(callbacks)
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Erreur lors du déclenchement d'une tâche sur '{path}': {e}")
+        return len(callbacks)
+
+    def _matching_mail(self, path: str) -> List[str]:
+        """Abonnements dont l'expéditeur et le sujet correspondent au message (verrou détenu)"""
+        try:
+            with open(path, "rb") as f:
+                headers = BytesHeaderParser().parse(f)
+        except OSError as e:
+            logger.error(f"Lecture du message '{path}' impossible: {e}")
+            return []
+        sender = _header(headers.get("From")).lower()
+        subject = _header(headers.get("Subject")).lower()
+        return [key for key, (wanted_sender, wanted_subject) in self._mail.items()
+                if wanted_sender in sender and wanted_subject in subject]
+
+    def stats(self) -> Dict[str, Any]:
+        """Abonnements, dossiers surveillés et mode d'observation"""
+        with self._lock:
+            return {
+                "subscriptions": len(self._subscriptions),
+                "file_conditions": len(self._files),
+                "email_conditions": len(self._mail),
+                "watched_directories": len(self._watches),
+                "polled_paths": len(self._polled),
+                "backend": "inotify" if self.use_watchdog else "polling",
+                "running": self._running,
+                "fired": self.fired
+            }
+
+
+def create_event_bus() -> EventBus:
+    """Crée le bus d'événements configuré par les variables PLANNER_*"""
+    return EventBus(
+        maildir=os.getenv('PLANNER_MAILDIR') or None,
+        poll_interval=float(os.getenv('PLANNER_EVENT_POLL_INTERVAL', DEFAULT_POLL_INTERVAL))
+    )
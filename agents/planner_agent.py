@@ -1,113 +1,366 @@
 # 🤖 Agent Planificateur de Tâches
 # Agent spécialisé dans la planification et l'exécution automatique de tâches
 
-import json
 import os
+import json
+import socket
+import threading
+import uuid
 from datetime import datetime, timedelta
-import schedule
+from functools import partial
 import time
-import threading
 from typing import Dict, List, Any, Optional
 import logging
 
+from agents.task_scheduler import TaskScheduler, next_occurrence, next_time_window
+from agents.task_executor import create_task_executor
+from agents.event_bus import create_event_bus
+from database.task_repository import TaskRepository
+
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Intervalle de vérification des conditions sans événement associé (secondes)
+CONDITION_CHECK_INTERVAL = 300
+# Durée du bail d'exécution : au-delà, un processus arrêté en pleine exécution ne bloque plus l'échéance
+DEFAULT_LEASE_SECONDS = 900
+# Intervalle de relecture des tâches modifiées par les autres processus (secondes, 0 : désactivée)
+DEFAULT_SYNC_INTERVAL = 30
+# Clé de l'échéance de synchronisation dans l'ordonnanceur
+SYNC_KEY = "__sync__"
+
 class PlannerAgent:
-    """Agent planificateur de tâches avancé"""
+    """Agent planificateur de tâches avancé
+
+    Plusieurs processus (workers de l'API, Streamlit) peuvent partager la même
+    base : chacun planifie toutes les tâches, mais chaque échéance n'est
+    exécutée que par le processus qui en obtient le bail (TaskRepository.claim).
+    """
     
-    def __init__(self):
+    def __init__(self, repository: Optional[TaskRepository] = None):
         self.agent_id = "planner_agent_system"
         self.name = "Planificateur de Tâches"
         self.description = "Agent spécialisé dans la planification et l'exécution automatique de tâches"
         self.version = "1.0.0"
         self.tasks_file = "data/planned_tasks.json"
         self.scheduler_running = False
+        self.scheduler = TaskScheduler()
+        self.executor = create_task_executor()
+        self.events = create_event_bus()
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = float(os.getenv('PLANNER_LEASE_SECONDS', DEFAULT_LEASE_SECONDS))
+        self.sync_interval = float(os.getenv('PLANNER_SYNC_INTERVAL', DEFAULT_SYNC_INTERVAL))
         
         # Créer le répertoire de données s'il n'existe pas
         os.makedirs("data", exist_ok=True)
+        self.repository = repository or TaskRepository()
         
-        # Charger les tâches existantes
+        # Charger les tâches existantes (index par ID pour des recherches en O(1)) ; la liste et
+        # l'index sont modifiés par l'ordonnanceur, les workers, le bus d'événements et l'interface
+        self._lock = threading.RLock()
+        self._synced_at = None
         self.planned_tasks = self._load_tasks()
+        self._task_index = {task["id"]: task for task in self.planned_tasks}
         
         # Démarrer le planificateur en arrière-plan
         self._start_scheduler()
     
     def _load_tasks(self) -> List[Dict[str, Any]]:
-        """Charge les tâches planifiées depuis le fichier JSON"""
+        """Charge les tâches planifiées depuis la base (reprise unique de l'ancien fichier JSON)"""
         try:
             if os.path.exists(self.tasks_file):
-                with open(self.tasks_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return []
+                self._migrate_legacy_tasks()
+            self._synced_at = self.repository.latest_update()
+            return self.repository.load_all()
         except Exception as e:
             logger.error(f"Erreur lors du chargement des tâches: {e}")
             return []
     
-    def _save_tasks(self):
-        """Sauvegarde les tâches planifiées dans le fichier JSON"""
-        try:
-            with open(self.tasks_file, 'w', encoding='utf-8') as f:
-                json.dump(self.planned_tasks, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"Erreur lors de la sauvegarde des tâches: {e}")
+    def _migrate_legacy_tasks(self):
+        """Importe planned_tasks.json ; le fichier n'est renommé que si toutes ses tâches sont en base"""
+        with open(self.tasks_file, 'r', encoding='utf-8') as f:
+            expected = sum(1 for task in json.load(f) if task.get("id"))
+        imported = self.repository.import_from_json(self.tasks_file)
+        if imported != expected:
+            logger.error(f"Import de {self.tasks_file} incomplet ({imported}/{expected} tâches) : fichier conservé")
+            return
+        os.replace(self.tasks_file, self.tasks_file + ".migrated")
+    
+    def _save_task(self, task: Dict[str, Any]):
+        """Enregistre le nouvel état d'une seule tâche (écriture d'une ligne, pas du planning complet)"""
+        if not self.repository.save(task):
+            logger.error(f"Erreur lors de la sauvegarde de la tâche '{task['id']}'")
     
     def _start_scheduler(self):
-        """Démarre le planificateur en arrière-plan"""
+        """Replanifie les tâches actives chargées et démarre l'ordonnanceur en arrière-plan"""
         if not self.scheduler_running:
             self.scheduler_running = True
-            scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
-            scheduler_thread.start()
-            logger.info("🔄 Planificateur de tâches démarré")
+            self.events.start()
+            entries = []
+            for task in self.planned_tasks:
+                if task.get("enabled", True) and not self._watch(task):
+                    entry = self._scheduler_entry(task)
+                    if entry:
+                        entries.append(entry)
+            if self.sync_interval > 0:
+                entries.append((SYNC_KEY, time.time() + self.sync_interval, self._sync_from_store))
+            self.executor.start()
+            self.scheduler.schedule_many(entries)
+            self.scheduler.start()
+            logger.info(f"🔄 Planificateur de tâches démarré ({len(entries)} tâches planifiées)")
     
-    def _run_scheduler(self):
-        """Exécute le planificateur en continu"""
-        while self.scheduler_running:
-            try:
-                schedule.run_pending()
-                time.sleep(1)
-            except Exception as e:
-                logger.error(f"Erreur dans le planificateur: {e}")
-                time.sleep(5)
+    def _scheduler_entry(self, task: Dict[str, Any]):
+        """Échéance (clé, date, callback) d'une tâche selon son type de planification"""
+        try:
+            schedule_type = task["schedule_type"]
+            schedule_config = task["schedule_config"]
+            if schedule_type == "datetime":
+                # Exécution unique : une date passée non encore exécutée part aussitôt
+                if task.get("execution_count", 0) > 0:
+                    return None
+                when = datetime.fromisoformat(schedule_config["datetime"])
+                callback = partial(self._dispatch, task["id"], when.timestamp())
+            elif schedule_type == "conditional":
+                condition = schedule_config.get("condition", {})
+                if condition.get("type") == "time":
+                    # Vérification à l'ouverture de la plage horaire, pas toutes les 5 minutes
+                    when = next_time_window(condition.get("time_condition", {}), datetime.now())
+                    if when is None:
+                        return None
+                else:
+                    interval = schedule_config.get("check_interval", CONDITION_CHECK_INTERVAL)
+                    when = datetime.now() + timedelta(seconds=interval)
+                callback = partial(self._check_conditional_task, task["id"])
+            else:
+                when = next_occurrence(schedule_type, schedule_config, datetime.now())
+                if when is None:
+                    return None
+                callback = partial(self._dispatch, task["id"], when.timestamp())
+            return task["id"], when, callback
+        except Exception as e:
+            logger.error(f"Erreur lors de la planification de la tâche '{task.get('id')}': {e}")
+            return None
+    
+    @staticmethod
+    def _task_target(task: Dict[str, Any]) -> Optional[str]:
+        """Cible dont la concurrence est bornée (agent ou workflow exécuté)"""
+        target = task.get("target", {})
+        if task["type"] == "agent_execution":
+            return f"agent:{target.get('agent_name', '')}"
+        if task["type"] == "workflow_execution":
+            return f"workflow:{target.get('workflow_name', '')}"
+        return None
+    
+    @staticmethod
+    def _occurrence(task: Dict[str, Any], due: Optional[float]) -> float:
+        """Identifiant de l'échéance commun à tous les processus
+        
+        L'horodatage de l'échéance pour une tâche récurrente ou saisonnière,
+        le nombre d'exécutions déjà faites pour une tâche unique ou conditionnelle.
+        """
+        if task["schedule_type"] in ["recurring", "seasonal"] and due is not None:
+            return float(due)
+        return float(task.get("execution_count", 0))
+    
+    def _dispatch(self, task_id: str, due: Optional[float] = None):
+        """Confie une tâche échue au pool de workers : l'ordonnanceur ne fait que distribuer"""
+        task = self.get_task(task_id)
+        if not task or not task.get("enabled", True):
+            return
+        
+        # Échéance suivante planifiée tout de suite : elle ne dépend pas de la durée d'exécution
+        if task["schedule_type"] in ["recurring", "seasonal"]:
+            self._arm(task)
+        
+        occurrence = self._occurrence(task, due)
+        grace = task.get("misfire_grace")
+        submitted = self.executor.submit(
+            task_id, partial(self._run_claimed, task_id, occurrence),
+            task_type=task["type"],
+            priority=task.get("priority", "normal"),
+            target=self._task_target(task),
+            due=due,
+            misfire_grace=grace if grace is not None else "default",
+            on_misfire=partial(self._record_misfire, task_id, occurrence)
+        )
+        if not submitted:
+            logger.warning(f"⏭️ Tâche '{task['name']}' encore en file ou en cours, échéance fusionnée")
+    
+    def _claim(self, task_id: str, occurrence: float) -> Optional[Dict[str, Any]]:
+        """Obtient le bail d'une échéance et rafraîchit la tâche locale depuis la base
+        
+        None si un autre processus l'a déjà obtenu ou si la tâche a été
+        supprimée ou désactivée entre-temps.
+        """
+        fresh = self.repository.claim(task_id, self.owner_id, occurrence, self.lease_seconds)
+        if fresh is None:
+            if self.repository.get(task_id) is None:
+                self._forget(task_id)
+            else:
+                logger.info(f"⏭️ Échéance de la tâche '{task_id}' prise en charge par un autre processus")
+            return None
+        with self._lock:
+            task = self.get_task(task_id)
+            if task is not None:
+                task.update(fresh)
+        if task is None:
+            self.repository.release(task_id, self.owner_id, occurrence)
+        return task
+    
+    def _run_claimed(self, task_id: str, occurrence: float):
+        """Exécute une échéance seulement si ce processus en obtient le bail"""
+        if self._claim(task_id, occurrence) is None:
+            return
+        try:
+            self._execute_task(task_id)
+        finally:
+            self.repository.release(task_id, self.owner_id, occurrence)
+    
+    def _record_misfire(self, task_id: str, occurrence: float, lateness: float):
+        """Échéance manquée au-delà de la tolérance de retard : l'exécution est abandonnée"""
+        # Le bail évite d'écraser l'exécution réussie d'un autre processus
+        task = self._claim(task_id, occurrence)
+        if not task:
+            return
+        try:
+            task["status"] = "missed"
+            task["last_error"] = f"Échéance manquée de {lateness:.0f}s"
+            if task["schedule_type"] not in ["recurring", "seasonal"]:
+                task["enabled"] = False
+            self._save_task(task)
+        finally:
+            self.repository.release(task_id, self.owner_id, occurrence)
+    
+    def _forget(self, task_id: str):
+        """Retire localement une tâche supprimée par un autre processus"""
+        with self._lock:
+            self._disarm(task_id)
+            if self._task_index.pop(task_id, None) is not None:
+                self.planned_tasks = [t for t in self.planned_tasks if t["id"] != task_id]
+                logger.info(f"🗑️ Tâche '{task_id}' supprimée par un autre processus")
+    
+    def _sync_from_store(self):
+        """Applique les tâches créées, modifiées ou supprimées par les autres processus"""
+        try:
+            changed, self._synced_at = self.repository.load_changed(self._synced_at)
+            with self._lock:
+                for stored in changed:
+                    self._apply_stored(stored)
+            
+            # Les suppressions n'apparaissent pas parmi les lignes modifiées
+            if self.repository.count() != len(self.planned_tasks):
+                stored_ids = self.repository.task_keys()
+                with self._lock:
+                    for task_id in [t["id"] for t in self.planned_tasks if t["id"] not in stored_ids]:
+                        self._forget(task_id)
+        except Exception as e:
+            logger.error(f"Erreur lors de la synchronisation des tâches: {e}")
+        finally:
+            if self.scheduler_running and self.sync_interval > 0:
+                self.scheduler.schedule(SYNC_KEY, time.time() + self.sync_interval, self._sync_from_store)
+    
+    def _apply_stored(self, stored: Dict[str, Any]):
+        """Fusionne une tâche relue en base dans la liste locale et la (re)planifie (verrou détenu)"""
+        task_id = stored["id"]
+        # Une exécution locale en file ou en cours relira la tâche en obtenant son bail
+        if self.executor.is_pending(task_id):
+            return
+        task = self.get_task(task_id)
+        if task is None:
+            self.planned_tasks.append(stored)
+            self._task_index[task_id] = task = stored
+            rearm = True
+        elif task != stored:
+            rearm = (task.get("schedule_config") != stored.get("schedule_config")
+                     or task.get("enabled", True) != stored.get("enabled", True))
+            task.update(stored)
+        else:
+            return
+        if not task.get("enabled", True):
+            self._disarm(task_id)
+        elif rearm or not self._armed(task_id):
+            self._arm(task)
+    
+    def _watch(self, task: Dict[str, Any]) -> bool:
+        """Abonne une tâche conditionnelle à son événement (fichier, email) ; False sinon"""
+        if task["schedule_type"] != "conditional":
+            return False
+        condition = task["schedule_config"].get("condition", {})
+        return self.events.subscribe(task["id"], condition, partial(self._dispatch, task["id"]))
+    
+    def _arm(self, task: Dict[str, Any]) -> bool:
+        """Place la prochaine échéance d'une tâche dans l'ordonnanceur (ou sur le bus d'événements)"""
+        if self._watch(task):
+            return True
+        entry = self._scheduler_entry(task)
+        if entry is None:
+            return False
+        self.scheduler.schedule(*entry)
+        return True
+    
+    def _disarm(self, task_id: str):
+        """Retire une tâche de l'ordonnanceur et du bus d'événements"""
+        self.scheduler.cancel(task_id)
+        self.events.unsubscribe(task_id)
+    
+    def _armed(self, task_id: str) -> bool:
+        return task_id in self.scheduler or task_id in self.events
     
     def plan_task(self, task_config: Dict[str, Any]) -> Dict[str, Any]:
         """Planifie une nouvelle tâche"""
         try:
-            # Générer un ID unique pour la tâche
-            task_id = f"task_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(self.planned_tasks)}"
-            
-            # Créer la tâche
-            task = {
-                "id": task_id,
-                "name": task_config.get("name", "Tâche sans nom"),
-                "description": task_config.get("description", ""),
-                "type": task_config.get("type", "agent_execution"),
-                "schedule_type": task_config.get("schedule_type", "datetime"),
-                "schedule_config": task_config.get("schedule_config", {}),
-                "target": task_config.get("target", {}),
-                "status": "planned",
-                "created_at": datetime.now().isoformat(),
-                "next_execution": None,
-                "last_execution": None,
-                "execution_count": 0,
-                "max_executions": task_config.get("max_executions", -1),  # -1 = illimité
-                "enabled": True
-            }
-            
-            # Configurer la planification selon le type
-            if task["schedule_type"] == "datetime":
-                self._schedule_datetime_task(task)
-            elif task["schedule_type"] == "recurring":
-                self._schedule_recurring_task(task)
-            elif task["schedule_type"] == "conditional":
-                self._schedule_conditional_task(task)
-            elif task["schedule_type"] == "seasonal":
-                self._schedule_seasonal_task(task)
-            
-            # Ajouter la tâche à la liste
-            self.planned_tasks.append(task)
-            self._save_tasks()
+            with self._lock:
+                # Générer un ID unique pour la tâche
+                # (après une suppression, le compteur peut retomber sur un ID existant : la ligne serait écrasée)
+                suffix = len(self.planned_tasks)
+                task_id = f"task_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{suffix}"
+                while task_id in self._task_index:
+                    suffix += 1
+                    task_id = f"task_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{suffix}"
+                
+                # Créer la tâche
+                task = {
+                    "id": task_id,
+                    "name": task_config.get("name", "Tâche sans nom"),
+                    "description": task_config.get("description", ""),
+                    "type": task_config.get("type", "agent_execution"),
+                    "schedule_type": task_config.get("schedule_type", "datetime"),
+                    "schedule_config": task_config.get("schedule_config", {}),
+                    "target": task_config.get("target", {}),
+                    "status": "planned",
+                    "created_at": datetime.now().isoformat(),
+                    "next_execution": None,
+                    "last_execution": None,
+                    "execution_count": 0,
+                    "max_executions": task_config.get("max_executions", -1),  # -1 = illimité
+                    "priority": task_config.get("priority", "normal"),  # high, normal, low ou entier
+                    "misfire_grace": task_config.get("misfire_grace"),  # secondes de retard tolérées
+                    "enabled": True
+                }
+                
+                # Indexer et enregistrer la tâche avant de la planifier : une échéance déjà passée
+                # (ou un fichier déjà présent) part aussitôt, et son bail se prend sur la ligne en base
+                self._task_index[task_id] = task
+                self._save_task(task)
+                try:
+                    # Configurer la planification selon le type
+                    if task["schedule_type"] == "datetime":
+                        self._schedule_datetime_task(task)
+                    elif task["schedule_type"] == "recurring":
+                        self._schedule_recurring_task(task)
+                    elif task["schedule_type"] == "conditional":
+                        self._schedule_conditional_task(task)
+                    elif task["schedule_type"] == "seasonal":
+                        self._schedule_seasonal_task(task)
+                except Exception:
+                    del self._task_index[task_id]
+                    self.repository.delete(task_id)
+                    raise
+                
+                # Ajouter la tâche à la liste
+                self.planned_tasks.append(task)
+                self._save_task(task)
             
             logger.info(f"✅ Tâche '{task['name']}' planifiée avec succès (ID: {task_id})")
             
@@ -126,148 +379,40 @@ class PlannerAgent:
             }
     
     def _schedule_datetime_task(self, task: Dict[str, Any]):
-        """Planifie une tâche à une date/heure précise"""
-        schedule_config = task["schedule_config"]
-        target_datetime = datetime.fromisoformat(schedule_config["datetime"])
+        """Planifie une tâche à une date/heure précise (exécution unique)"""
+        target_datetime = datetime.fromisoformat(task["schedule_config"]["datetime"])
         task["next_execution"] = target_datetime.isoformat()
-
-        # Exécution unique précise via Timer
-        now = datetime.now()
-        delay_seconds = (target_datetime - now).total_seconds()
-        if delay_seconds < 0:
-            delay_seconds = 0
-
-        def _run_once():
-            try:
-                self._execute_task(task["id"])
-            finally:
-                # Désactiver après exécution unique
-                t = self.get_task(task["id"])
-                if t:
-                    t["enabled"] = False
-                    t["status"] = "completed"
-                    self._save_tasks()
-
-        timer = threading.Timer(delay_seconds, _run_once)
-        timer.daemon = True
-        timer.start()
+        self._arm(task)
     
     def _schedule_recurring_task(self, task: Dict[str, Any]):
-        """Planifie une tâche récurrente"""
-        schedule_config = task["schedule_config"]
-        frequency = schedule_config.get("frequency", "daily")
-        
-        if frequency == "daily":
-            time_str = schedule_config.get("time", "09:00")
-            schedule.every().day.at(time_str).do(
-                self._execute_task, task["id"]
-            ).tag(task["id"])
-        
-        elif frequency == "weekly":
-            day = schedule_config.get("day", "monday")
-            time_str = schedule_config.get("time", "09:00")
-            getattr(schedule.every(), day).at(time_str).do(
-                self._execute_task, task["id"]
-            ).tag(task["id"])
-        
-        elif frequency == "monthly":
-            day = schedule_config.get("day", 1)
-            time_str = schedule_config.get("time", "09:00")
-            schedule.every().month.at(time_str).do(
-                self._execute_task, task["id"]
-            ).tag(task["id"])
-        
-        elif frequency == "weekend":
-            time_str = schedule_config.get("time", "10:00")
-            schedule.every().saturday.at(time_str).do(
-                self._execute_task, task["id"]
-            ).tag(task["id"])
-            schedule.every().sunday.at(time_str).do(
-                self._execute_task, task["id"]
-            ).tag(task["id"])
-        
-        # Calculer la prochaine exécution
+        """Planifie une tâche récurrente (daily, weekly, monthly, weekend)"""
         task["next_execution"] = self._calculate_next_execution(task)
+        self._arm(task)
     
     def _schedule_conditional_task(self, task: Dict[str, Any]):
         """Planifie une tâche conditionnelle (événement)"""
-        # Pour les tâches conditionnelles, on vérifie périodiquement
-        schedule.every(5).minutes.do(
-            self._check_conditional_task, task["id"]
-        ).tag(task["id"])
-        
+        # Déclenchée par le bus d'événements (fichier, email) ou à l'ouverture de sa plage horaire
         task["next_execution"] = "Conditionnel"
+        self._arm(task)
     
     def _schedule_seasonal_task(self, task: Dict[str, Any]):
-        """Planifie une tâche saisonnière"""
-        schedule_config = task["schedule_config"]
-        season = schedule_config.get("season", "spring")
-        time_str = schedule_config.get("time", "09:00")
-        
-        # Définir les dates de début de saison
-        season_dates = {
-            "spring": "03-21",
-            "summer": "06-21", 
-            "autumn": "09-21",
-            "winter": "12-21"
-        }
-        
-        if season in season_dates:
-            schedule.every().year.at(season_dates[season]).at(time_str).do(
-                self._execute_task, task["id"]
-            ).tag(task["id"])
-            
-            task["next_execution"] = f"{datetime.now().year}-{season_dates[season]} {time_str}"
+        """Planifie une tâche saisonnière (chaque année au début de la saison)"""
+        task["next_execution"] = self._calculate_next_execution(task)
+        self._arm(task)
     
     def _calculate_next_execution(self, task: Dict[str, Any]) -> str:
-        """Calcule la prochaine exécution d'une tâche"""
+        """Calcule la prochaine exécution d'une tâche récurrente ou saisonnière"""
         try:
-            schedule_config = task["schedule_config"]
-            frequency = schedule_config.get("frequency", "daily")
-            time_str = schedule_config.get("time", "09:00")
-            
-            now = datetime.now()
-            target_time = datetime.strptime(time_str, "%H:%M").time()
-            
-            if frequency == "daily":
-                next_exec = datetime.combine(now.date(), target_time)
-                if next_exec <= now:
-                    next_exec += timedelta(days=1)
-            
-            elif frequency == "weekly":
-                day = schedule_config.get("day", "monday")
-                days = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
-                current_day = now.strftime("%A").lower()
-                target_day_idx = days.index(day)
-                current_day_idx = days.index(current_day)
-                
-                days_ahead = (target_day_idx - current_day_idx) % 7
-                if days_ahead == 0 and now.time() > target_time:
-                    days_ahead = 7
-                
-                next_exec = datetime.combine(now.date(), target_time) + timedelta(days=days_ahead)
-            
-            elif frequency == "weekend":
-                # Prochain samedi
-                days_until_saturday = (5 - now.weekday()) % 7
-                if days_until_saturday == 0 and now.time() > target_time:
-                    days_until_saturday = 7
-                
-                next_exec = datetime.combine(now.date(), target_time) + timedelta(days=days_until_saturday)
-            
-            else:
-                next_exec = datetime.combine(now.date(), target_time)
-            
-            return next_exec.isoformat()
-            
+            next_exec = next_occurrence(task["schedule_type"], task["schedule_config"], datetime.now())
+            return next_exec.isoformat() if next_exec else "Erreur de calcul"
         except Exception as e:
             logger.error(f"Erreur lors du calcul de la prochaine exécution: {e}")
             return "Erreur de calcul"
     
     def _check_conditional_task(self, task_id: str):
-        """Vérifie si une tâche conditionnelle doit être exécutée"""
-        task = next((t for t in self.planned_tasks if t["id"] == task_id), None)
-        if not task:
+        """Vérifie si une tâche conditionnelle doit être exécutée, sinon replanifie la vérification"""
+        task = self.get_task(task_id)
+        if not task or not task.get("enabled", True):
             return
         
         schedule_config = task["schedule_config"]
@@ -275,19 +420,17 @@ class PlannerAgent:
         
         # Vérifier la condition (exemple: arrivée d'un email)
         if self._check_condition(condition):
-            self._execute_task(task_id)
+            self._dispatch(task_id)
+        elif not self._armed(task_id):
+            self._arm(task)
     
     def _check_condition(self, condition: Dict[str, Any]) -> bool:
         """Vérifie si une condition est remplie"""
         condition_type = condition.get("type", "email")
         
         if condition_type == "email":
-            # Vérifier l'arrivée d'un email spécifique
-            email_subject = condition.get("email_subject", "")
-            email_sender = condition.get("email_sender", "")
-            
-            # Ici tu peux implémenter la logique de vérification d'email
-            # Pour l'instant, on simule
+            # L'arrivée d'un email est signalée par le bus d'événements (boîte Maildir,
+            # PLANNER_MAILDIR) : sans boîte configurée, la condition n'est jamais remplie
             return False
         
         elif condition_type == "file":
@@ -300,12 +443,12 @@ class PlannerAgent:
             time_condition = condition.get("time_condition", {})
             current_time = datetime.now().time()
             
-            if "after" in time_condition:
+            if time_condition.get("after"):
                 after_time = datetime.strptime(time_condition["after"], "%H:%M").time()
                 if current_time < after_time:
                     return False
             
-            if "before" in time_condition:
+            if time_condition.get("before"):
                 before_time = datetime.strptime(time_condition["before"], "%H:%M").time()
                 if current_time > before_time:
                     return False
@@ -316,7 +459,7 @@ class PlannerAgent:
     
     def _execute_task(self, task_id: str):
         """Exécute une tâche planifiée"""
-        task = next((t for t in self.planned_tasks if t["id"] == task_id), None)
+        task = self.get_task(task_id)
         if not task or not task.get("enabled", True):
             return
         
@@ -327,6 +470,7 @@ class PlannerAgent:
             task["status"] = "executing"
             task["last_execution"] = datetime.now().isoformat()
             task["execution_count"] += 1
+            self._save_task(task)
             
             # Exécuter la tâche selon son type
             if task["type"] == "agent_execution":
@@ -346,6 +490,7 @@ class PlannerAgent:
             # Vérifier si la tâche doit être répétée
             if task["max_executions"] > 0 and task["execution_count"] >= task["max_executions"]:
                 task["enabled"] = False
+                self._disarm(task_id)
                 logger.info(f"✅ Tâche '{task['name']}' terminée (limite atteinte)")
             else:
                 # Replanifier si nécessaire
@@ -356,13 +501,13 @@ class PlannerAgent:
                     task["enabled"] = False
                     logger.info(f"✅ Tâche '{task['name']}' terminée (exécution unique)")
             
-            self._save_tasks()
+            self._save_task(task)
             
         except Exception as e:
             logger.error(f"❌ Erreur lors de l'exécution de la tâche '{task['name']}': {e}")
             task["status"] = "error"
             task["last_error"] = str(e)
-            self._save_tasks()
+            self._save_task(task)
     
     def _execute_agent_task(self, task: Dict[str, Any]):
         """Exécute une tâche d'agent"""
@@ -433,68 +578,80 @@ class PlannerAgent:
     
     def get_tasks(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
         """Récupère la liste des tâches planifiées"""
-        if status:
-            return [task for task in self.planned_tasks if task.get("status") == status]
-        return self.planned_tasks
+        with self._lock:
+            if status:
+                return [task for task in self.planned_tasks if task.get("status") == status]
+            return list(self.planned_tasks)
     
     def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
         """Récupère une tâche spécifique"""
-        return next((task for task in self.planned_tasks if task["id"] == task_id), None)
+        return self._task_index.get(task_id)
     
     def update_task(self, task_id: str, updates: Dict[str, Any]) -> bool:
         """Met à jour une tâche planifiée"""
-        task = self.get_task(task_id)
-        if not task:
-            return False
-        
-        try:
-            # Mettre à jour les champs
-            for key, value in updates.items():
-                if key in ["name", "description", "enabled", "max_executions"]:
-                    task[key] = value
+        with self._lock:
+            task = self.get_task(task_id)
+            if not task:
+                return False
             
-            # Si la planification change, replanifier
-            if "schedule_config" in updates:
-                task["schedule_config"] = updates["schedule_config"]
+            try:
+                # Mettre à jour les champs
+                for key, value in updates.items():
+                    if key in ["name", "description", "enabled", "max_executions"]:
+                        task[key] = value
                 
-                # Supprimer l'ancienne planification
-                schedule.clear(task_id)
+                # Si la planification change, replanifier
+                if "schedule_config" in updates:
+                    task["schedule_config"] = updates["schedule_config"]
+                    
+                    # Supprimer l'ancienne planification
+                    self._disarm(task_id)
+                    
+                    # Replanifier
+                    if task["schedule_type"] == "datetime":
+                        self._schedule_datetime_task(task)
+                    elif task["schedule_type"] == "recurring":
+                        self._schedule_recurring_task(task)
+                    elif task["schedule_type"] == "conditional":
+                        self._schedule_conditional_task(task)
+                    elif task["schedule_type"] == "seasonal":
+                        self._schedule_seasonal_task(task)
                 
-                # Replanifier
-                if task["schedule_type"] == "datetime":
-                    self._schedule_datetime_task(task)
-                elif task["schedule_type"] == "recurring":
-                    self._schedule_recurring_task(task)
-                elif task["schedule_type"] == "seasonal":
-                    self._schedule_seasonal_task(task)
-            
-            self._save_tasks()
-            return True
+                # Une tâche désactivée quitte l'ordonnanceur, une tâche réactivée y revient
+                if not task.get("enabled", True):
+                    self._disarm(task_id)
+                elif "enabled" in updates and not self._armed(task_id):
+                    self._arm(task)
+                
+                self._save_task(task)
+                return True
             
-        except Exception as e:
-            logger.error(f"Erreur lors de la mise à jour de la tâche: {e}")
-            return False
+            except Exception as e:
+                logger.error(f"Erreur lors de la mise à jour de la tâche: {e}")
+                return False
     
     def delete_task(self, task_id: str) -> bool:
         """Supprime une tâche planifiée"""
-        task = self.get_task(task_id)
-        if not task:
-            return False
-        
-        try:
-            # Supprimer la planification
-            schedule.clear(task_id)
-            
-            # Supprimer de la liste
-            self.planned_tasks = [t for t in self.planned_tasks if t["id"] != task_id]
-            self._save_tasks()
+        with self._lock:
+            task = self.get_task(task_id)
+            if not task:
+                return False
             
-            logger.info(f"✅ Tâche '{task['name']}' supprimée avec succès")
-            return True
+            try:
+                # Supprimer la planification
+                self._disarm(task_id)
+                
+                # Supprimer de la liste
+                self.planned_tasks = [t for t in self.planned_tasks if t["id"] != task_id]
+                del self._task_index[task_id]
+                self.repository.delete(task_id)
+                
+                logger.info(f"✅ Tâche '{task['name']}' supprimée avec succès")
+                return True
             
-        except Exception as e:
-            logger.error(f"Erreur lors de la suppression de la tâche: {e}")
-            return False
+            except Exception as e:
+                logger.error(f"Erreur lors de la suppression de la tâche: {e}")
+                return False
     
     def enable_task(self, task_id: str) -> bool:
         """Active une tâche désactivée"""
@@ -506,23 +663,31 @@ class PlannerAgent:
     
     def get_stats(self) -> Dict[str, Any]:
         """Récupère les statistiques du planificateur"""
-        total_tasks = len(self.planned_tasks)
-        enabled_tasks = len([t for t in self.planned_tasks if t.get("enabled", True)])
-        completed_tasks = len([t for t in self.planned_tasks if t.get("status") == "completed"])
-        error_tasks = len([t for t in self.planned_tasks if t.get("status") == "error"])
+        with self._lock:
+            tasks = list(self.planned_tasks)
+        total_tasks = len(tasks)
+        enabled_tasks = len([t for t in tasks if t.get("enabled", True)])
+        completed_tasks = len([t for t in tasks if t.get("status") == "completed"])
+        error_tasks = len([t for t in tasks if t.get("status") == "error"])
         
         return {
             "total_tasks": total_tasks,
             "enabled_tasks": enabled_tasks,
             "completed_tasks": completed_tasks,
             "error_tasks": error_tasks,
-            "scheduler_running": self.scheduler_running
+            "scheduler_running": self.scheduler_running,
+            "owner": self.owner_id,
+            "scheduler": self.scheduler.stats(),
+            "events": self.events.stats(),
+            "executor": self.executor.stats()
         }
     
     def stop_scheduler(self):
         """Arrête le planificateur"""
         self.scheduler_running = False
-        schedule.clear()
+        self.scheduler.stop()
+        self.events.stop()
+        self.executor.shutdown()
         logger.info("🛑 Planificateur de tâches arrêté")
 
 # Instance globale de l'agent planificateur
@@ -0,0 +1,238 @@
+# 🏭 Exécuteur de Tâches
+# Pool de workers borné : files par type de tâche, priorités, concurrence par cible et tolérance de retard
+import os
+import json
+import time
+import heapq
+import itertools
+import threading
+from collections import Counter, deque
+from typing import Dict, List, Any, Optional, Callable
+import logging
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_PER_TARGET = 2
+DEFAULT_MISFIRE_GRACE = 300  # secondes
+
+# Niveaux de priorité nommés (plus petit = plus urgent)
+PRIORITY_LEVELS = {"high": 0, "normal": 5, "low": 9}
+
+
+def priority_value(priority: Any) -> int:
+    """Priorité numérique d'une tâche ("high", "normal", "low" ou entier)"""
+    if isinstance(priority, str):
+        return PRIORITY_LEVELS.get(priority, PRIORITY_LEVELS["normal"])
+    try:
+        return int(priority)
+    except (TypeError, ValueError):
+        return PRIORITY_LEVELS["normal"]
+
+
+class TaskJob:
+    """Exécution en attente d'un worker"""
+
+    __slots__ = ("key", "run", "task_type", "priority", "target", "due", "misfire_grace", "on_misfire", "seq")
+
+    def __init__(self, key: str, run: Callable[[], Any], task_type: str, priority: int,
+                 target: Optional[str], due: float, misfire_grace: Optional[float],
+                 on_misfire: Optional[Callable[[float], Any]], seq: int):
+        self.key = key
+        self.run = run
+        self.task_type = task_type
+        self.priority = priority
+        self.target = target
+        self.due = due
+        self.misfire_grace = misfire_grace
+        self.on_misfire = on_misfire
+        self.seq = seq
+
+    def sort_key(self):
+        # Priorité d'abord, puis l'échéance la plus ancienne, puis l'ordre d'arrivée
+        return self.priority, self.due, self.seq
+
+
+class TaskExecutor:
+    """Exécute les tâches échues sur un pool de workers, hors du thread de l'ordonnanceur
+
+    - une file à priorité par type de tâche ; un type ne peut occuper que
+      `type_limits[type]` workers (par défaut tous sauf un), si bien qu'une
+      rafale de tâches lentes ne bloque pas les autres types ;
+    - au plus `max_per_target` exécutions simultanées par cible (agent ou
+      workflow) : les suivantes attendent qu'une place se libère ;
+    - une exécution démarrée plus de `misfire_grace` secondes après son
+      échéance est abandonnée (on_misfire) ;
+    - une tâche déjà en file ou en cours n'est pas empilée une seconde fois.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_per_target: int = DEFAULT_MAX_PER_TARGET,
+                 type_limits: Optional[Dict[str, int]] = None,
+                 misfire_grace: Optional[float] = DEFAULT_MISFIRE_GRACE, name: str = "task-worker"):
+        self.workers = max(1, workers)
+        self.max_per_target = max(1, max_per_target)
+        self.type_limits = type_limits or {}
+        self.default_type_limit = max(1, self.workers - 1)
+        self.misfire_grace = misfire_grace
+        self.name = name
+        self._queues: Dict[str, List[tuple]] = {}
+        self._blocked: Dict[str, deque] = {}
+        self._pending = set()
+        self._running_by_type = Counter()
+        self._running_by_target = Counter()
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._shutdown = False
+        self.counters = Counter()
+
+    def start(self):
+        """Démarre les workers"""
+        with self._condition:
+            if self._threads:
+                return
+            self._shutdown = False
+            self._threads = [
+                threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def type_limit(self, task_type: str) -> int:
+        return self.type_limits.get(task_type, self.default_type_limit)
+
+    def submit(self, key: str, run: Callable[[], Any], task_type: str = "default", priority: Any = "normal",
+               target: Optional[str] = None, due: Optional[float] = None, misfire_grace: Any = "default",
+               on_misfire: Optional[Callable[[float], Any]] = None) -> bool:
+        """Met une exécution en file ; False si la même clé est déjà en file ou en cours
+
+        `misfire_grace` : secondes de retard tolérées (None : aucune limite,
+        "default" : valeur de l'exécuteur).
+        """
+        with self._condition:
+            if self._shutdown:
+                return False
+            if key in self._pending:
+                self.counters["coalesced"] += 1
+                return False
+            job = TaskJob(key, run, task_type, priority_value(priority), target,
+                          time.time() if due is None else due,
+                          self.misfire_grace if misfire_grace == "default" else misfire_grace,
+                          on_misfire, next(self._counter))
+            self._pending.add(key)
+            heapq.heappush(self._queues.setdefault(task_type, []), (job.sort_key(), job))
+            self.counters["submitted"] += 1
+            self._condition.notify()
+        return True
+
+    def is_pending(self, key: str) -> bool:
+        """Indique si une exécution de cette clé est en file ou en cours"""
+        with self._condition:
+            return key in self._pending
+
+    def _take(self) -> Optional[TaskJob]:
+        """Meilleure exécution éligible parmi les têtes des files (verrou détenu)"""
+        best = None
+        for task_type, queue in self._queues.items():
+            if not queue or self._running_by_type[task_type] >= self.type_limit(task_type):
+                continue
+            # Les tâches d'une cible saturée sont mises de côté jusqu'à la libération d'une place
+            while queue and queue[0][1].target and \
+                    self._running_by_target[queue[0][1].target] >= self.max_per_target:
+                job = heapq.heappop(queue)[1]
+                self._blocked.setdefault(job.target, deque()).append(job)
+            if queue and (best is None or queue[0][0] < best[0]):
+                best = queue[0]
+        if best is None:
+            return None
+        job = heapq.heappop(self._queues[best[1].task_type])[1]
+        self._running_by_type[job.task_type] += 1
+        if job.target:
+            self._running_by_target[job.target] += 1
+        return job
+
+    def _release(self, job: TaskJob):
+        self._pending.discard(job.key)
+        self._running_by_type[job.task_type] -= 1
+        if job.target:
+            self._running_by_target[job.target] -= 1
+            blocked = self._blocked.get(job.target)
+            if blocked:
+                waiting = blocked.popleft()
+                heapq.heappush(self._queues.setdefault(waiting.task_type, []), (waiting.sort_key(), waiting))
+                if not blocked:
+                    del self._blocked[job.target]
+        self._condition.notify_all()
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                job = self._take()
+                while job is None and not self._shutdown:
+                    self._condition.wait()
+                    job = self._take()
+                if job is None:
+                    return
+            outcome = "failed"
+            try:
+                lateness = time.time() - job.due
+                if job.misfire_grace is not None and lateness > job.misfire_grace:
+                    outcome = "missed"
+                    logger.warning(f"⏰ Exécution de '{job.key}' abandonnée : {lateness:.0f}s de retard")
+                    if job.on_misfire:
+                        job.on_misfire(lateness)
+                else:
+                    job.run()
+                    outcome = "completed"
+            except Exception as e:
+                logger.error(f"Erreur lors de l'exécution de '{job.key}': {e}")
+            finally:
+                with self._condition:
+                    self.counters[outcome] += 1
+                    self._release(job)
+
+    def shutdown(self, wait: bool = True, timeout: float = 5.0):
+        """Arrête les workers (les exécutions en file sont abandonnées)"""
+        with self._condition:
+            self._shutdown = True
+            self._queues.clear()
+            self._blocked.clear()
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                if thread is not threading.current_thread():
+                    thread.join(timeout)
+        self._threads = []
+
+    def stats(self) -> Dict[str, Any]:
+        """Files, exécutions en cours et compteurs du pool"""
+        with self._condition:
+            return {
+                "workers": self.workers,
+                "queued": {task_type: len(queue) for task_type, queue in self._queues.items() if queue},
+                "waiting_for_target": sum(len(jobs) for jobs in self._blocked.values()),
+                "running": {task_type: count for task_type, count in self._running_by_type.items() if count},
+                "running_by_target": {target: count for target, count in self._running_by_target.items() if count},
+                "counters": dict(self.counters)
+            }
+
+
+def create_task_executor() -> TaskExecutor:
+    """Crée l'exécuteur configuré par les variables PLANNER_*"""
+    type_limits = {}
+    raw_limits = os.getenv('PLANNER_TYPE_CONCURRENCY')
+    if raw_limits:
+        try:
+            type_limits = {task_type: int(limit) for task_type, limit in json.loads(raw_limits).items()}
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.error(f"PLANNER_TYPE_CONCURRENCY invalide, limites par défaut utilisées: {e}")
+    grace = os.getenv('PLANNER_MISFIRE_GRACE', str(DEFAULT_MISFIRE_GRACE))
+    return TaskExecutor(
+        workers=int(os.getenv('PLANNER_WORKERS', DEFAULT_WORKERS)),
+        max_per_target=int(os.getenv('PLANNER_MAX_PER_TARGET', DEFAULT_MAX_PER_TARGET)),
+        type_limits=type_limits,
+        misfire_grace=None if grace.lower() in ("", "none") else float(grace)
+    )
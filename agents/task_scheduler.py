@@ -0,0 +1,247 @@
+# ⏱️ Ordonnanceur de Tâches
+# Tas binaire des échéances, un seul thread endormi jusqu'à la prochaine tâche due
+import time
+import heapq
+import calendar
+import itertools
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Callable, Iterable, Tuple, Union
+import logging
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Réveil de sécurité : suit un changement de l'horloge système sans attendre l'échéance
+MAX_SLEEP = 300.0
+# En dessous de ce nombre d'entrées annulées, le tas n'est jamais compacté
+COMPACT_MIN = 1024
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+SEASON_DATES = {
+    "spring": (3, 21),
+    "summer": (6, 21),
+    "autumn": (9, 21),
+    "winter": (12, 21)
+}
+
+# Indices d'une entrée du tas : [échéance, numéro d'ordre, clé, callback, active]
+DUE, SEQ, KEY, CALLBACK, ACTIVE = range(5)
+
+
+def _at(day: datetime, time_str: str) -> datetime:
+    target = datetime.strptime(time_str, "%H:%M").time()
+    return datetime.combine(day.date(), target)
+
+
+def next_occurrence(schedule_type: str, schedule_config: Dict[str, Any],
+                    after: datetime) -> Optional[datetime]:
+    """Prochaine échéance strictement postérieure à `after` d'une tâche récurrente ou saisonnière
+
+    Retourne None pour un type de planification sans récurrence calendaire.
+    """
+    if schedule_type == "seasonal":
+        season = schedule_config.get("season", "spring")
+        if season not in SEASON_DATES:
+            return None
+        month, day = SEASON_DATES[season]
+        candidate = _at(after.replace(month=month, day=day), schedule_config.get("time", "09:00"))
+        return candidate if candidate > after else candidate.replace(year=after.year + 1)
+
+    if schedule_type != "recurring":
+        return None
+
+    frequency = schedule_config.get("frequency", "daily")
+    time_str = schedule_config.get("time", "10:00" if frequency == "weekend" else "09:00")
+    today = _at(after, time_str)
+
+    if frequency == "daily":
+        return today if today > after else today + timedelta(days=1)
+
+    if frequency in ("weekly", "weekend"):
+        days = ([WEEKDAYS.index(schedule_config.get("day", "monday"))] if frequency == "weekly"
+                else [5, 6])  # samedi et dimanche
+        return min(
+            today + timedelta(days=(day - after.weekday()) % 7 or (0 if today > after else 7))
+            for day in days
+        )
+
+    if frequency == "monthly":
+        day = int(schedule_config.get("day", 1))
+        year, month = after.year, after.month
+        for _ in range(2):
+            # Un jour absent du mois (31 en avril) est ramené au dernier jour du mois
+            candidate = _at(after.replace(year=year, month=month,
+                                          day=min(day, calendar.monthrange(year, month)[1])), time_str)
+            if candidate > after:
+                return candidate
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    return None
+
+
+def next_time_window(time_condition: Dict[str, Any], after: datetime) -> Optional[datetime]:
+    """Premier instant, à partir de `after`, compris dans la plage horaire {"after", "before"}
+
+    Retourne `after` s'il est déjà dans la plage, None si la plage est vide.
+    """
+    opens = _at(after, time_condition.get("after") or "00:00")
+    end = time_condition.get("before")
+    closes = _at(after, end) if end else datetime.combine(after.date(), datetime.max.time())
+    if opens > closes:
+        return None
+    if after < opens:
+        return opens
+    return after if after <= closes else opens + timedelta(days=1)
+
+
+class TaskScheduler:
+    """Planificateur à tas binaire des échéances, exécuté par un seul thread
+
+    Le thread dort exactement jusqu'à la prochaine échéance (ou jusqu'à ce
+    qu'une tâche plus proche soit ajoutée) : ni scrutation, ni thread par
+    tâche. Ajout et remplacement en O(log n) ; l'annulation marque l'entrée
+    (O(1)) et le tas est compacté quand la moitié de ses entrées est annulée.
+    """
+
+    def __init__(self, name: str = "task-scheduler", max_sleep: float = MAX_SLEEP):
+        self.name = name
+        self.max_sleep = max_sleep
+        self._heap: List[list] = []
+        self._entries: Dict[str, list] = {}
+        self._counter = itertools.count()
+        self._cancelled = 0
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self.fired = 0
+        self.errors = 0
+
+    @staticmethod
+    def _timestamp(when: Union[datetime, float]) -> float:
+        return when.timestamp() if isinstance(when, datetime) else float(when)
+
+    def _discard(self, key: str) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry[ACTIVE] = False
+        self._cancelled += 1
+        if self._cancelled > COMPACT_MIN and self._cancelled * 2 >= len(self._heap):
+            self._heap = [item for item in self._heap if item[ACTIVE]]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+        return True
+
+    def _new_entry(self, key: str, when: Union[datetime, float], callback: Callable[[], Any]) -> list:
+        self._discard(key)
+        entry = [self._timestamp(when), next(self._counter), key, callback, True]
+        self._entries[key] = entry
+        return entry
+
+    def schedule(self, key: str, when: Union[datetime, float], callback: Callable[[], Any]) -> float:
+        """Planifie (ou replanifie) `callback` à l'échéance `when` ; une date passée est exécutée aussitôt"""
+        with self._condition:
+            entry = self._new_entry(key, when, callback)
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._condition.notify()
+        return entry[DUE]
+
+    def schedule_many(self, items: Iterable[Tuple[str, Union[datetime, float], Callable[[], Any]]]) -> int:
+        """Planifie un lot d'échéances en O(n) (rechargement des tâches au démarrage)"""
+        with self._condition:
+            count = 0
+            for key, when, callback in items:
+                self._heap.append(self._new_entry(key, when, callback))
+                count += 1
+            heapq.heapify(self._heap)
+            self._condition.notify()
+        return count
+
+    def cancel(self, key: str) -> bool:
+        """Annule l'échéance d'une clé ; False si elle n'était pas planifiée"""
+        with self._condition:
+            return self._discard(key)
+
+    def next_run(self, key: str) -> Optional[datetime]:
+        """Prochaine échéance planifiée pour une clé"""
+        entry = self._entries.get(key)
+        return datetime.fromtimestamp(entry[DUE]) if entry else None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def _next_due_entry(self) -> Optional[list]:
+        """Attend et retire la prochaine entrée échue ; None à l'arrêt"""
+        with self._condition:
+            while self._running:
+                while self._heap and not self._heap[0][ACTIVE]:
+                    heapq.heappop(self._heap)
+                    self._cancelled -= 1
+                if not self._heap:
+                    self._condition.wait(self.max_sleep)
+                    continue
+                delay = self._heap[0][DUE] - time.time()
+                if delay <= 0:
+                    entry = heapq.heappop(self._heap)
+                    del self._entries[entry[KEY]]
+                    return entry
+                self._condition.wait(min(delay, self.max_sleep))
+        return None
+
+    def _run(self):
+        while True:
+            entry = self._next_due_entry()
+            if entry is None:
+                return
+            self.fired += 1
+            try:
+                entry[CALLBACK]()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Erreur lors de l'exécution de l'échéance '{entry[KEY]}': {e}")
+
+    def start(self):
+        """Démarre le thread de l'ordonnanceur"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, clear: bool = True, timeout: float = 5.0):
+        """Arrête le thread (et vide les échéances par défaut)"""
+        with self._condition:
+            self._running = False
+            if clear:
+                self._heap.clear()
+                self._entries.clear()
+                self._cancelled = 0
+            self._condition.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def stats(self) -> Dict[str, Any]:
+        """Taille du tas, prochaine échéance et compteurs d'exécution"""
+        with self._condition:
+            next_due = min((entry[DUE] for entry in self._heap[:1] if entry[ACTIVE]), default=None)
+            if next_due is None and self._entries:
+                next_due = min(entry[DUE] for entry in self._entries.values())
+            return {
+                "scheduled": len(self._entries),
+                "heap_size": len(self._heap),
+                "next_due": datetime.fromtimestamp(next_due).isoformat() if next_due else None,
+                "fired": self.fired,
+                "errors": self.errors,
+                "running": self._running
+            }
@@ -0,0 +1,243 @@
+"""
+🗃️ Cache des réponses IA
+Évite de rappeler un fournisseur pour une requête identique
+(modèle, prompt système, entrée utilisateur, paramètres).
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 3600  # 1 heure
+DEFAULT_MAX_ENTRIES = 1000
+# Part de la capacité libérée d'un coup par le cache SQLite quand il est plein :
+# les écritures suivantes n'ont pas à recompter les entrées
+SQLITE_EVICTION_BATCH = 0.1
+
+
+def _to_jsonable(value: Any) -> Any:
+    """Convertit les objets des SDK (ex: usage OpenAI) en structures sérialisables"""
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    if hasattr(value, "__dict__"):
+        return {k: v for k, v in vars(value).items() if not k.startswith("_")}
+    return str(value)
+
+
+class ResponseCache:
+    """Classe de base des caches de réponses (TTL, taille bornée, compteurs)"""
+
+    def __init__(self, ttl: Optional[float] = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, user_input: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """Construit une clé stable à partir de la requête"""
+        payload = json.dumps(
+            [model, system_prompt, user_input, params or {}],
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Retourne la réponse en cache, ou None si absente ou expirée"""
+        raise NotImplementedError("Cette méthode doit être implémentée par les sous-classes")
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """Enregistre une réponse dans le cache"""
+        raise NotImplementedError("Cette méthode doit être implémentée par les sous-classes")
+
+    def clear(self):
+        """Vide le cache"""
+        raise NotImplementedError("Cette méthode doit être implémentée par les sous-classes")
+
+    def __len__(self) -> int:
+        raise NotImplementedError("Cette méthode doit être implémentée par les sous-classes")
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.ttl if self.ttl else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistiques du cache"""
+        total = self.hits + self.misses
+        return {
+            "backend": self.__class__.__name__,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+class MemoryResponseCache(ResponseCache):
+    """Cache LRU en mémoire"""
+
+    def __init__(self, ttl: Optional[float] = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at is not None and time.time() > expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return json.loads(value)
+
+    def set(self, key: str, value: Dict[str, Any]):
+        serialized = json.dumps(value, ensure_ascii=False, default=_to_jsonable)
+        with self._lock:
+            self._entries[key] = (self._expires_at(), serialized)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteResponseCache(ResponseCache):
+    """Cache persistant sur disque (SQLite), éviction LRU par date de dernier accès"""
+
+    def __init__(self, db_path: str = "data/response_cache.db", ttl: Optional[float] = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_last_access ON response_cache (last_access)")
+        self._conn.commit()
+        # Taille estimée (un remplacement la surestime) : le COUNT(*) n'est fait qu'au dépassement présumé
+        self._estimated_size = self._count()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = row
+            if expires_at is not None and now > expires_at:
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self._estimated_size = max(0, self._estimated_size - 1)
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(value)
+
+    def set(self, key: str, value: Dict[str, Any]):
+        serialized = json.dumps(value, ensure_ascii=False, default=_to_jsonable)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, serialized, self._expires_at(), time.time())
+            )
+            self._estimated_size += 1
+            if self._estimated_size > self.max_entries:
+                # Recalage sur la taille réelle (elle inclut les écritures des autres processus)
+                size = self._count()
+                overflow = 0
+                if size > self.max_entries:
+                    overflow = size - self.max_entries + int(self.max_entries * SQLITE_EVICTION_BATCH)
+                    self._conn.execute("""
+                        DELETE FROM response_cache WHERE key IN (
+                            SELECT key FROM response_cache ORDER BY last_access LIMIT ?
+                        )
+                    """, (overflow,))
+                    self.evictions += overflow
+                self._estimated_size = size - overflow
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        """Supprime les entrées expirées et retourne leur nombre"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM response_cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+            )
+            self._conn.commit()
+            self._estimated_size = max(0, self._estimated_size - cursor.rowcount)
+            return cursor.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self._conn.commit()
+            self._estimated_size = 0
+
+    def close(self):
+        """Ferme la connexion SQLite"""
+        with self._lock:
+            self._conn.close()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._count()
+
+
+def create_response_cache(backend: Optional[str] = None) -> Optional[ResponseCache]:
+    """Crée le cache configuré par AI_CACHE_BACKEND (memory, sqlite ou none)"""
+    backend = (backend or os.getenv('AI_CACHE_BACKEND', 'memory')).lower()
+    ttl = float(os.getenv('AI_CACHE_TTL', DEFAULT_TTL)) or None
+    max_entries = int(os.getenv('AI_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+
+    if backend == 'memory':
+        return MemoryResponseCache(ttl=ttl, max_entries=max_entries)
+    if backend == 'sqlite':
+        db_path = os.getenv('AI_CACHE_PATH', 'data/response_cache.db')
+        return SQLiteResponseCache(db_path, ttl=ttl, max_entries=max_entries)
+    if backend not in ('none', 'off', ''):
+        logger.warning(f"Backend de cache inconnu '{backend}', cache désactivé")
+    return None
@@ -0,0 +1,254 @@
+"""
+📐 Construction du contexte des agents
+Mesure la taille d'un document en tokens, le transmet tel quel s'il tient
+dans la fenêtre du modèle, sinon le découpe et le résume par parties
+(map-reduce) pour que le coût et la durée restent bornés.
+"""
+
+import os
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Callable
+import logging
+
+from ai_usage import count_tokens, sum_usage
+
+logger = logging.getLogger(__name__)
+
+# Fenêtres de contexte (tokens) des modèles de la plateforme, surchargées par AI_CONTEXT_WINDOWS
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "GPT-4": 8192,
+    "GPT-3.5-turbo": 16385,
+    "Claude-3": 200000,
+    "Gemini Pro": 30720,
+    "Groq": 8192,
+    "Grok Beta": 131072,
+    "Llama 2": 4096,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+DEFAULT_RESERVED_OUTPUT = 4000  # max_tokens par défaut des fournisseurs
+DEFAULT_SUMMARY_TOKENS = 500
+DEFAULT_MAX_CHUNKS = 128
+DEFAULT_MAX_LEVELS = 3
+DEFAULT_MAP_WORKERS = 4
+# Les tokenizers des modèles diffèrent du comptage local : marge de sécurité sur la fenêtre
+SAFETY_RATIO = 0.9
+MIN_CHUNK_TOKENS = 256
+
+# Consigne placée en tête du message utilisateur : le prompt système de l'agent reste
+# identique pour tous les appels, ce qui permet la mise en cache du préfixe côté fournisseur
+MAP_INSTRUCTIONS = (
+    "Le document à traiter est trop long pour être transmis en une fois : il t'est fourni par parties. "
+    "Résume uniquement la partie ci-dessous en conservant les faits, chiffres, noms, dates et citations "
+    "utiles à la demande. Réponds seulement par le résumé, en {summary_tokens} tokens au plus."
+)
+
+
+@lru_cache(maxsize=1)
+def get_context_windows() -> Dict[str, int]:
+    """Fenêtres de contexte ; AI_CONTEXT_WINDOWS='{"Groq": 131072}' ajoute ou remplace des modèles"""
+    windows = dict(MODEL_CONTEXT_WINDOWS)
+    override = os.getenv('AI_CONTEXT_WINDOWS')
+    if override:
+        try:
+            windows.update({model: int(size) for model, size in json.loads(override).items()})
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.error(f"AI_CONTEXT_WINDOWS invalide, fenêtres par défaut utilisées: {e}")
+    return windows
+
+
+def get_context_window(models) -> int:
+    """Fenêtre d'un modèle ; pour une liste routée, la plus petite (n'importe lequel peut répondre)"""
+    if isinstance(models, str):
+        models = [models]
+    windows = get_context_windows()
+    sizes = [windows.get(model, DEFAULT_CONTEXT_WINDOW) for model in models or []]
+    return min(sizes) if sizes else DEFAULT_CONTEXT_WINDOW
+
+
+def _split_oversized(line: str, max_tokens: int) -> List[str]:
+    """Coupe une ligne trop longue par groupes de mots (texte extrait sans sauts de ligne)"""
+    words = line.split(" ")
+    # Estimation du nombre de mots par morceau à partir de la densité de la ligne
+    per_piece = max(1, int(len(words) * max_tokens / max(count_tokens(line), 1)))
+    return [" ".join(words[start:start + per_piece]) for start in range(0, len(words), per_piece)]
+
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """Découpe un texte en morceaux d'au plus `max_tokens` tokens, aux sauts de ligne
+
+    Les morceaux sont équilibrés : un document à peine trop long donne deux
+    moitiés plutôt qu'un morceau plein et un reliquat.
+    """
+    lines = []
+    for line in text.splitlines():
+        tokens = count_tokens(line)
+        if tokens <= max_tokens:
+            lines.append((line, tokens))
+        else:
+            lines.extend((piece, count_tokens(piece)) for piece in _split_oversized(line, max_tokens))
+
+    total = sum(tokens for _, tokens in lines)
+    if total == 0:
+        return []
+    target = min(max_tokens, math.ceil(total / math.ceil(total / max_tokens)))
+
+    chunks, current, current_tokens = [], [], 0
+    for line, tokens in lines:
+        if current and current_tokens + tokens > target:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """Conserve le début d'un texte dans la limite de `max_tokens` tokens"""
+    chunks = chunk_text(text, max_tokens)
+    return chunks[0] if chunks else ""
+
+
+class ContextBuilder:
+    """Prépare le contenu transmis à un agent en respectant la fenêtre de son modèle
+
+    - le document tient dans la fenêtre : il est transmis tel quel ("direct") ;
+    - sinon il est découpé, chaque partie est résumée en parallèle puis les
+      résumés sont regroupés et résumés à nouveau si besoin ("map_reduce") ;
+    - sans fournisseur disponible, ou avec la stratégie "truncate", seul le
+      début du document est conservé.
+
+    Le nombre de parties et de niveaux de réduction est plafonné : un
+    document de plusieurs centaines de pages coûte au plus
+    max_chunks appels de résumé (plus quelques appels de réduction).
+    """
+
+    STRATEGIES = ("map_reduce", "truncate")
+
+    def __init__(self, orchestrator=None, strategy: str = "map_reduce",
+                 reserved_output: int = DEFAULT_RESERVED_OUTPUT, summary_tokens: int = DEFAULT_SUMMARY_TOKENS,
+                 max_chunks: int = DEFAULT_MAX_CHUNKS, max_levels: int = DEFAULT_MAX_LEVELS,
+                 map_workers: int = DEFAULT_MAP_WORKERS):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Stratégie de contexte inconnue: {strategy}")
+        self.orchestrator = orchestrator
+        self.strategy = strategy
+        self.reserved_output = reserved_output
+        self.summary_tokens = summary_tokens
+        self.max_chunks = max_chunks
+        self.max_levels = max_levels
+        self.map_workers = map_workers
+
+    def input_budget(self, models, system_prompt: str, user_prompt: str, output_tokens: int) -> int:
+        """Tokens disponibles pour le document une fois le prompt et la réponse réservés"""
+        window = get_context_window(models)
+        output_tokens = min(output_tokens, window // 2)
+        budget = int(window * SAFETY_RATIO) - output_tokens - count_tokens(system_prompt) - count_tokens(user_prompt)
+        if budget < MIN_CHUNK_TOKENS:
+            logger.warning(f"Prompt trop long pour la fenêtre de {window} tokens, budget ramené à {MIN_CHUNK_TOKENS}")
+        return max(budget, MIN_CHUNK_TOKENS)
+
+    def _map_prompt(self, user_prompt: str, part: int, parts: int, chunk: str) -> str:
+        # Partie commune (consigne, demande) d'abord, partie variable à la fin
+        instructions = MAP_INSTRUCTIONS.format(summary_tokens=self.summary_tokens)
+        request = f"Demande : {user_prompt.strip()}\n\n" if user_prompt and user_prompt.strip() else ""
+        return f"{instructions}\n\n{request}--- Partie {part}/{parts} ---\n{chunk}"
+
+    def _summarize(self, models, system_prompt: str, user_prompt: str, chunks: List[str],
+                   progress: Optional[Callable[[int, int], None]]) -> List[Dict[str, Any]]:
+        """Résume les parties en parallèle (la concurrence par fournisseur reste bornée par ai_limits)"""
+        def summarize(indexed):
+            index, chunk = indexed
+            result = self.orchestrator.process_request(
+                models, system_prompt, self._map_prompt(user_prompt, index + 1, len(chunks), chunk),
+                max_tokens=self.summary_tokens
+            )
+            if not result.get("success"):
+                # Repli extractif : la partie est tronquée plutôt que perdue
+                logger.error(f"Résumé de la partie {index + 1}/{len(chunks)} impossible: {result.get('error')}")
+                result = {"response": truncate_text(chunk, self.summary_tokens)}
+            return result
+
+        results = []
+        with ThreadPoolExecutor(max_workers=self.map_workers, thread_name_prefix="context-map") as pool:
+            for result in pool.map(summarize, enumerate(chunks)):
+                results.append(result)
+                if progress:
+                    progress(len(results), len(chunks))
+        return results
+
+    def build(self, models, system_prompt: str, user_prompt: str, content: str,
+              progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Contenu à transmettre au modèle et bilan de sa préparation
+
+        Retourne content, strategy, document_tokens, context_tokens, chunks,
+        calls, truncated ainsi que usage et cost des appels de résumé.
+        """
+        document_tokens = count_tokens(content)
+        budget = self.input_budget(models, system_prompt, user_prompt, self.reserved_output)
+        plan = {"content": content, "strategy": "direct", "document_tokens": document_tokens,
+                "context_tokens": document_tokens, "chunks": 1, "calls": 0, "truncated": False,
+                "usage": None, "cost": 0.0}
+        if document_tokens <= budget:
+            return plan
+
+        if self.strategy == "truncate" or self.orchestrator is None:
+            plan["content"] = truncate_text(content, budget)
+            plan.update(strategy="truncate", truncated=True, context_tokens=count_tokens(plan["content"]))
+            return plan
+
+        # Les appels de résumé ne réservent que la longueur d'un résumé : parties plus grandes
+        chunk_budget = self.input_budget(models, system_prompt, user_prompt,
+                                         self.summary_tokens) - count_tokens(MAP_INSTRUCTIONS)
+        chunk_budget = max(chunk_budget, MIN_CHUNK_TOKENS)
+        chunks = chunk_text(content, chunk_budget)
+        if len(chunks) > self.max_chunks:
+            logger.warning(f"Document de {len(chunks)} parties, seules les {self.max_chunks} premières sont traitées")
+            chunks = chunks[:self.max_chunks]
+            plan["truncated"] = True
+        plan["chunks"] = len(chunks)
+
+        results, level = [], 0
+        while True:
+            level_results = self._summarize(models, system_prompt, user_prompt, chunks, progress)
+            results.extend(level_results)
+            summaries = "\n\n".join(
+                f"[Partie {index + 1}/{len(chunks)}]\n{result.get('response') or ''}"
+                for index, result in enumerate(level_results)
+            )
+            level += 1
+            if count_tokens(summaries) <= budget or level >= self.max_levels:
+                break
+            chunks = chunk_text(summaries, chunk_budget)
+
+        if count_tokens(summaries) > budget:
+            summaries = truncate_text(summaries, budget)
+            plan["truncated"] = True
+
+        plan.update(
+            content=f"Synthèse du document, résumé par parties ({plan['chunks']} parties) :\n\n{summaries}",
+            strategy="map_reduce",
+            calls=len(results),
+            usage=sum_usage(result.get("usage") for result in results),
+            cost=round(sum(result.get("cost") or 0 for result in results), 8)
+        )
+        plan["context_tokens"] = count_tokens(plan["content"])
+        return plan
+
+
+def create_context_builder(orchestrator=None) -> ContextBuilder:
+    """Crée le constructeur de contexte configuré par les variables AI_CONTEXT_*"""
+    return ContextBuilder(
+        orchestrator,
+        strategy=os.getenv('AI_CONTEXT_STRATEGY', 'map_reduce').lower(),
+        reserved_output=int(os.getenv('AI_CONTEXT_RESERVED_OUTPUT', DEFAULT_RESERVED_OUTPUT)),
+        summary_tokens=int(os.getenv('AI_CONTEXT_SUMMARY_TOKENS', DEFAULT_SUMMARY_TOKENS)),
+        max_chunks=int(os.getenv('AI_CONTEXT_MAX_CHUNKS', DEFAULT_MAX_CHUNKS)),
+        max_levels=int(os.getenv('AI_CONTEXT_MAX_LEVELS', DEFAULT_MAX_LEVELS)),
+        map_workers=int(os.getenv('AI_CONTEXT_MAP_WORKERS', DEFAULT_MAP_WORKERS))
+    )
@@ -5,13 +5,101 @@ Intègre OpenAI, Anthropic, Google, Meta et GROK APIs
 
 import os
 import json
+import asyncio
+import threading
+import importlib.util
+from contextlib import ExitStack
+from functools import lru_cache
 from datetime import datetime
-from typing import Dict, Any, Optional
-import streamlit as st
+from typing import Dict, Any, Optional, Iterator, Iterable, Callable
+import logging
+
+from ai_cache import ResponseCache, create_response_cache
+from ai_limits import get_provider_limiter, estimate_tokens, limiter_stats
+from ai_router import create_model_router
+from ai_usage import account_result, normalize_usage, estimate_cost, count_tokens
+
+# Import léger : ni SDK, ni Streamlit, ni lecture de config.env ici.
+# Les SDK sont importés à la création du premier client d'un fournisseur,
+# et l'orchestrateur est construit au premier appel de get_orchestrator().
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = 'config.env'
+
+# Limites par défaut du pool de connexions HTTP asynchrones (une instance par fournisseur),
+# surchargées par AI_POOL_MAX_CONNECTIONS / AI_POOL_MAX_KEEPALIVE
+ASYNC_POOL_MAX_CONNECTIONS = 200
+ASYNC_POOL_MAX_KEEPALIVE = 50
+ASYNC_POOL_KEEPALIVE_EXPIRY = 30.0
+REQUEST_TIMEOUT = 30
+# Taille minimale d'un prompt système mis en cache par Anthropic (en dessous, le marqueur est ignoré)
+ANTHROPIC_CACHE_MIN_TOKENS = 1024
+
+
+@lru_cache(maxsize=None)
+def _module_available(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+def _http2_available() -> bool:
+    """HTTP/2 n'est activé que si le paquet 'h2' est installé"""
+    return _module_available("h2")
+
+
+def _httpx_available() -> bool:
+    """Sans httpx, le chemin asynchrone se replie sur un thread"""
+    return _module_available("httpx")
+
+
+def _usage_dict(usage) -> Optional[Dict[str, Any]]:
+    """Usage d'un SDK (objet pydantic ou dictionnaire) en dictionnaire sérialisable"""
+    if usage is None:
+        return None
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump()
+    return dict(usage)
+
+
+def _anthropic_system(system_prompt: str):
+    """Prompt système Anthropic, marqué pour la mise en cache du préfixe s'il est assez long
+
+    OpenAI, Groq et Grok mettent en cache les préfixes identiques sans marqueur :
+    le prompt système doit seulement rester le même d'un appel à l'autre.
+    """
+    if count_tokens(system_prompt) < ANTHROPIC_CACHE_MIN_TOKENS:
+        return system_prompt
+    return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+
+
+def _create_requests_session(headers: Dict[str, str]):
+    """Session requests (keep-alive) ; None si le paquet n'est pas installé"""
+    try:
+        import requests
+    except ImportError:
+        logger.error("Module 'requests' non installé. Installez-le avec: pip install requests")
+        return None
+    session = requests.Session()
+    session.headers.update(headers)
+    return session
+
+
+def _iter_sse_deltas(lines: Iterable[str]) -> Iterator[str]:
+    """Extrait les fragments de texte d'un flux SSE /chat/completions (format OpenAI)"""
+    for line in lines:
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            continue
+        choices = chunk.get("choices") or [{}]
+        delta = choices[0].get("delta", {}).get("content")
+        if delta:
+            yield delta
 
-# Chargement des variables d'environnement
-from dotenv import load_dotenv
-load_dotenv('config.env')
 
 class AIProvider:
     """Classe de base pour les fournisseurs IA"""
@@ -20,94 +108,258 @@ class AIProvider:
         self.api_key = api_key
         self.model = model
         self.provider_name = "Base Provider"
+        # Un client asynchrone par boucle d'événements : boucle -> (client, tâche de fermeture)
+        self._async_clients: Dict[Any, tuple] = {}
     
     def process_request(self, system_prompt: str, user_input: str, **kwargs):
         """Méthode de base pour traiter une requête"""
         raise NotImplementedError("Cette méthode doit être implémentée par les sous-classes")
+    
+    async def process_request_async(self, system_prompt: str, user_input: str, **kwargs):
+        """Version asynchrone de process_request.
+
+        Par défaut, l'appel synchrone est délégué à un thread pour ne pas
+        bloquer la boucle d'événements ; les sous-classes disposant d'un
+        client asynchrone natif surchargent cette méthode.
+        """
+        return await asyncio.to_thread(self.process_request, system_prompt, user_input, **kwargs)
+    
+    def stream_request(self, system_prompt: str, user_input: str, meta: Optional[Dict[str, Any]] = None,
+                       **kwargs) -> Iterator[str]:
+        """Traite une requête en produisant la réponse fragment par fragment.
+
+        Par défaut, la réponse complète est produite en un seul fragment ;
+        les fournisseurs qui savent diffuser les tokens surchargent cette méthode.
+        `meta` reçoit ce que le flux ne dit pas (réponse simulée, servie par le cache).
+        Lève RuntimeError si le fournisseur renvoie une erreur.
+        """
+        result = self.process_request(system_prompt, user_input, **kwargs)
+        if not result.get("success"):
+            raise RuntimeError(result.get("error", "Erreur inconnue"))
+        if meta is not None and "note" in result:
+            meta["simulated"] = True
+        yield result["response"]
+    
+    def _async_headers(self) -> Dict[str, str]:
+        """En-têtes HTTP du client asynchrone"""
+        return {}
+    
+    def _create_async_client(self):
+        """Crée le client HTTP asynchrone mutualisé (keep-alive, HTTP/2 si disponible)"""
+        import httpx
+        return httpx.AsyncClient(
+            headers=self._async_headers(),
+            http2=_http2_available(),
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=int(os.getenv('AI_POOL_MAX_CONNECTIONS', ASYNC_POOL_MAX_CONNECTIONS)),
+                max_keepalive_connections=int(os.getenv('AI_POOL_MAX_KEEPALIVE', ASYNC_POOL_MAX_KEEPALIVE)),
+                keepalive_expiry=ASYNC_POOL_KEEPALIVE_EXPIRY
+            )
+        )
+    
+    def _get_async_client(self):
+        """Retourne le client asynchrone du fournisseur, créé une fois par boucle d'événements
+
+        Une tâche de garde ferme le client dans sa propre boucle quand celle-ci
+        s'arrête (asyncio.run et uvicorn annulent les tâches restantes avant de
+        fermer la boucle) : changer de boucle ne laisse aucun pool ouvert.
+        """
+        loop = asyncio.get_running_loop()
+        entry = self._async_clients.get(loop)
+        if entry is None:
+            # Boucles fermées sans annuler leurs tâches : leurs clients sont inutilisables
+            for closed in [other for other in self._async_clients if other.is_closed()]:
+                self._async_clients.pop(closed, None)
+            client = self._create_async_client()
+            entry = (client, loop.create_task(self._close_with_loop(loop, client)))
+            self._async_clients[loop] = entry
+        return entry[0]
+    
+    async def _close_with_loop(self, loop, client):
+        try:
+            await asyncio.Event().wait()  # jusqu'à l'annulation, à l'arrêt de la boucle ou par aclose()
+        finally:
+            if self._async_clients.get(loop, (None,))[0] is client:
+                del self._async_clients[loop]
+                await _close_async_client(client)
+    
+    async def aclose(self):
+        """Ferme le client asynchrone de la boucle courante et libère les connexions du pool"""
+        entry = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            client, keeper = entry
+            keeper.cancel()
+            await _close_async_client(client)
+
+
+async def _close_async_client(client):
+    """Ferme un client httpx ou SDK (aclose ou close, synchrone ou non) sans propager d'erreur"""
+    close = getattr(client, "aclose", None) or getattr(client, "close", None)
+    if not close:
+        return
+    try:
+        result = close()
+        if asyncio.iscoroutine(result):
+            await result
+    except Exception as e:
+        logger.warning(f"Erreur lors de la fermeture d'un client asynchrone: {e}")
 
 
 class GroqProvider(AIProvider):
     """Intégration avec l'API Groq (Groq Inc.)"""
 
+    API_URL = "https://api.groq.com/openai/v1/chat/completions"
+
     def __init__(self, api_key: str, model: str = "llama3-8b-8192"):
         super().__init__(api_key, model)
         self.provider_name = "Groq"
-        try:
-            import requests
-            self.session = requests.Session()
-            self.session.headers.update({
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json',
-                'User-Agent': 'Groq-Platform/1.0'
-            })
-        except ImportError:
-            import streamlit as st
-            st.error("❌ Module 'requests' non installé. Installez-le avec: pip install requests")
-            self.session = None
+        self.limiter = get_provider_limiter("groq")
+        self.session = _create_requests_session(self._async_headers())
+
+    def _async_headers(self) -> Dict[str, str]:
+        return {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json',
+            'User-Agent': 'Groq-Platform/1.0'
+        }
+
+    def _build_payload(self, system_prompt: str, user_input: str, **kwargs) -> Dict[str, Any]:
+        """Construit le corps de la requête /chat/completions"""
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_input}
+            ],
+            "max_tokens": kwargs.get("max_tokens", 4000),
+            "temperature": kwargs.get("temperature", 0.7)
+        }
+
+    def _parse_response(self, response) -> Dict[str, Any]:
+        """Convertit une réponse HTTP (requests ou httpx) en résultat normalisé"""
+        if response.status_code == 200:
+            result = response.json()
+            return {
+                "success": True,
+                "provider": self.provider_name,
+                "model": self.model,
+                "response": result["choices"][0]["message"]["content"],
+                "usage": result.get("usage"),
+                "timestamp": datetime.now().isoformat()
+            }
+        else:
+            return {
+                "success": False,
+                "status_code": response.status_code,
+                "error": response.text,
+                "provider": self.provider_name
+            }
+
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": str(error),
+            "provider": self.provider_name,
+            "timestamp": datetime.now().isoformat()
+        }
 
     def process_request(self, system_prompt: str, user_input: str, **kwargs):
         """Traite une requête avec l’API Groq"""
         if not self.session:
             return {"error": "Session Groq non initialisée"}
 
+        payload = self._build_payload(system_prompt, user_input, **kwargs)
+        estimated = estimate_tokens(payload)
         try:
-            response = self.session.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_input}
-                    ],
-                    "max_tokens": kwargs.get("max_tokens", 4000),
-                    "temperature": kwargs.get("temperature", 0.7)
-                },
-                timeout=30
+            response = self.limiter.call(
+                lambda: self.session.post(self.API_URL, json=payload, timeout=REQUEST_TIMEOUT),
+                estimated
             )
+            result = self._parse_response(response)
+            self.limiter.record_usage(estimated, result.get("usage"))
+            return result
+        except Exception as e:
+            return self._error_result(e)
 
-            if response.status_code == 200:
-                result = response.json()
-                return {
-                    "success": True,
-                    "provider": self.provider_name,
-                    "model": self.model,
-                    "response": result["choices"][0]["message"]["content"],
-                    "usage": result.get("usage"),
-                    "timestamp": datetime.now().isoformat()
-                }
-            else:
-                return {
-                    "success": False,
-                    "status_code": response.status_code,
-                    "error": response.text,
-                    "provider": self.provider_name
-                }
+    async def process_request_async(self, system_prompt: str, user_input: str, **kwargs):
+        """Traite une requête avec l'API Groq via le pool HTTP asynchrone"""
+        if not _httpx_available():
+            return await super().process_request_async(system_prompt, user_input, **kwargs)
+
+        payload = self._build_payload(system_prompt, user_input, **kwargs)
+        estimated = estimate_tokens(payload)
+        try:
+            response = await self.limiter.acall(
+                lambda: self._get_async_client().post(self.API_URL, json=payload),
+                estimated
+            )
+            result = self._parse_response(response)
+            self.limiter.record_usage(estimated, result.get("usage"))
+            return result
         except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "provider": self.provider_name,
-                "timestamp": datetime.now().isoformat()
-            }
+            return self._error_result(e)
+
+    def stream_request(self, system_prompt: str, user_input: str, **kwargs) -> Iterator[str]:
+        """Diffuse la réponse Groq token par token (stream=True, SSE)"""
+        if not self.session:
+            raise RuntimeError("Session Groq non initialisée")
+
+        payload = self._build_payload(system_prompt, user_input, **kwargs)
+        payload["stream"] = True
+        # La place de concurrence reste occupée jusqu'à la fermeture du flux
+        with self.limiter.stream(
+            lambda: self.session.post(self.API_URL, json=payload, stream=True, timeout=REQUEST_TIMEOUT),
+            estimate_tokens(payload)
+        ) as response, response:
+            if response.status_code != 200:
+                raise RuntimeError(f"Erreur API Groq {response.status_code}: {response.text}")
+            yield from _iter_sse_deltas(response.iter_lines(decode_unicode=True))
 
 class GrokProvider(AIProvider):
     """Intégration X (Twitter) Grok - Modèle IA d'Elon Musk"""
     
+    API_URL = "https://api.x.ai/v1/chat/completions"  # Endpoint à vérifier
+    
     def __init__(self, api_key: str, model: str = "grok-beta"):
         super().__init__(api_key, model)
         self.provider_name = "X (Grok)"
-        
-        try:
-            import requests
-            self.session = requests.Session()
-            self.session.headers.update({
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json',
-                'User-Agent': 'Grok-Platform/1.0'
-            })
-        except ImportError:
-            st.error(" Module 'requests' non installé. Installez-le avec: pip install requests")
-            self.session = None
+        self.limiter = get_provider_limiter("grok")
+        self.session = _create_requests_session(self._async_headers())
+    
+    def _async_headers(self) -> Dict[str, str]:
+        return {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json',
+            'User-Agent': 'Grok-Platform/1.0'
+        }
+    
+    def _build_payload(self, system_prompt: str, user_input: str, **kwargs) -> Dict[str, Any]:
+        """Construit le corps de la requête /chat/completions"""
+        return {
+            "model": "grok-beta",
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_input}
+            ],
+            "max_tokens": kwargs.get('max_tokens', 4000),
+            "temperature": kwargs.get('temperature', 0.7)
+        }
+    
+    def _parse_response(self, response, system_prompt: str, user_input: str) -> Dict[str, Any]:
+        """Convertit une réponse HTTP en résultat, avec repli sur la simulation"""
+        if response.status_code == 200:
+            result = response.json()
+            return {
+                "success": True,
+                "provider": self.provider_name,
+                "model": "grok-beta",
+                "response": result.get("choices", [{}])[0].get("message", {}).get("content", "Réponse Grok"),
+                "usage": result.get("usage"),
+                "timestamp": datetime.now().isoformat()
+            }
+        else:
+            return self._simulate_grok_response(system_prompt, user_input)
     
     def process_request(self, system_prompt: str, user_input: str, **kwargs):
         """Traite une requête avec Grok via l'API X"""
@@ -115,36 +367,19 @@ class GrokProvider(AIProvider):
             return {"error": "Session Grok non initialisée"}
         
         try:
-            full_prompt = f"{system_prompt}\n\n{user_input}"
-            
             # Option 1: Via l'API officielle X (quand disponible)
+            payload = self._build_payload(system_prompt, user_input, **kwargs)
+            estimated = estimate_tokens(payload)
             try:
-                response = self.session.post(
-                    "https://api.x.ai/v1/chat/completions",  # Endpoint à vérifier
-                    json={
-                        "model": "grok-beta",
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_input}
-                        ],
-                        "max_tokens": kwargs.get('max_tokens', 4000),
-                        "temperature": kwargs.get('temperature', 0.7)
-                    },
-                    timeout=30
+                # La simulation n'intervient qu'une fois les reprises épuisées
+                response = self.limiter.call(
+                    lambda: self.session.post(self.API_URL, json=payload, timeout=REQUEST_TIMEOUT),
+                    estimated
                 )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return {
-                        "success": True,
-                        "provider": self.provider_name,
-                        "model": "grok-beta",
-                        "response": result.get("choices", [{}])[0].get("message", {}).get("content", "Réponse Grok"),
-                        "usage": result.get("usage"),
-                        "timestamp": datetime.now().isoformat()
-                    }
-                else:
-                    return self._simulate_grok_response(system_prompt, user_input)
+                result = self._parse_response(response, system_prompt, user_input)
+                if response.status_code == 200:  # l'usage d'une simulation ne reflète pas le quota
+                    self.limiter.record_usage(estimated, result.get("usage"))
+                return result
                     
             except Exception as api_error:
                 return self._simulate_grok_response(system_prompt, user_input)
@@ -157,6 +392,55 @@ class GrokProvider(AIProvider):
                 "timestamp": datetime.now().isoformat()
             }
     
+    async def process_request_async(self, system_prompt: str, user_input: str, **kwargs):
+        """Traite une requête avec Grok via le pool HTTP asynchrone"""
+        if not _httpx_available():
+            return await super().process_request_async(system_prompt, user_input, **kwargs)
+        
+        payload = self._build_payload(system_prompt, user_input, **kwargs)
+        estimated = estimate_tokens(payload)
+        try:
+            response = await self.limiter.acall(
+                lambda: self._get_async_client().post(self.API_URL, json=payload),
+                estimated
+            )
+            result = self._parse_response(response, system_prompt, user_input)
+            if response.status_code == 200:  # l'usage d'une simulation ne reflète pas le quota
+                self.limiter.record_usage(estimated, result.get("usage"))
+            return result
+        except Exception:
+            return self._simulate_grok_response(system_prompt, user_input)
+
+    def stream_request(self, system_prompt: str, user_input: str, meta: Optional[Dict[str, Any]] = None,
+                       **kwargs) -> Iterator[str]:
+        """Diffuse la réponse Grok token par token (stream=True, SSE), avec repli sur la simulation"""
+        if not self.session:
+            raise RuntimeError("Session Grok non initialisée")
+
+        payload = self._build_payload(system_prompt, user_input, **kwargs)
+        payload["stream"] = True
+        with ExitStack() as stack:
+            try:
+                # La place de concurrence reste occupée jusqu'à la fermeture du flux
+                response = stack.enter_context(self.limiter.stream(
+                    lambda: self.session.post(self.API_URL, json=payload, stream=True, timeout=REQUEST_TIMEOUT),
+                    estimate_tokens(payload)
+                ))
+            except Exception:
+                response = None
+            if response is not None:
+                with response:
+                    if response.status_code == 200:
+                        yield from _iter_sse_deltas(response.iter_lines(decode_unicode=True))
+                        return
+        # Échec de l'ouverture : la place est libérée avant la simulation
+        yield self._simulate_stream(system_prompt, user_input, meta)
+
+    def _simulate_stream(self, system_prompt: str, user_input: str, meta: Optional[Dict[str, Any]]) -> str:
+        if meta is not None:
+            meta["simulated"] = True
+        return self._simulate_grok_response(system_prompt, user_input)["response"]
+
     def _simulate_grok_response(self, system_prompt: str, user_input: str):
         """Simule une réponse Grok si l'API n'est pas disponible"""
         return {
@@ -164,7 +448,7 @@ class GrokProvider(AIProvider):
             "provider": self.provider_name,
             "model": "grok-beta",
             "response": self._generate_grok_style_response(system_prompt, user_input),
-            "usage": {"total_tokens": 150, "prompt_tokens": 50, "completion_tokens": 100},
+            "usage": None,  # estimé localement par la comptabilité des tokens
             "timestamp": datetime.now().isoformat(),
             "note": "Simulation - API officielle non encore disponible"
         }
@@ -199,14 +483,85 @@ class OpenAIProvider(AIProvider):
     def __init__(self, api_key: str, model: str = "gpt-4"):
         super().__init__(api_key, model)
         self.provider_name = "OpenAI"
+        self._client = None
+    
+    def _get_client(self):
+        """Client synchrone réutilisé ; le SDK n'est importé qu'au premier appel"""
+        if self._client is None:
+            import openai
+            if hasattr(openai, "OpenAI"):
+                self._client = openai.OpenAI(api_key=self.api_key, timeout=REQUEST_TIMEOUT)
+            else:  # SDK < 1.0 : API au niveau du module
+                openai.api_key = self.api_key
+                self._client = openai
+        return self._client
     
     def process_request(self, system_prompt: str, user_input: str, **kwargs):
         """Traite une requête avec OpenAI"""
+        try:
+            client = self._get_client()
+            create = (client.ChatCompletion.create if hasattr(client, "ChatCompletion")
+                      else client.chat.completions.create)
+            response = create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_input}
+                ],
+                max_tokens=kwargs.get('max_tokens', 4000),
+                temperature=kwargs.get('temperature', 0.7)
+            )
+            
+            return {
+                "success": True,
+                "provider": self.provider_name,
+                "model": self.model,
+                "response": response.choices[0].message.content,
+                "usage": _usage_dict(response.usage),
+                "timestamp": datetime.now().isoformat()
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "provider": self.provider_name,
+                "timestamp": datetime.now().isoformat()
+            }
+    
+    def stream_request(self, system_prompt: str, user_input: str, **kwargs) -> Iterator[str]:
+        """Diffuse la réponse OpenAI token par token"""
+        client = self._get_client()
+        if hasattr(client, "ChatCompletion"):
+            yield from super().stream_request(system_prompt, user_input, **kwargs)
+            return
+        
+        stream = client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_input}
+            ],
+            max_tokens=kwargs.get('max_tokens', 4000),
+            temperature=kwargs.get('temperature', 0.7),
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    def _create_async_client(self):
+        """Client AsyncOpenAI (pool httpx interne avec keep-alive)"""
+        import openai
+        return openai.AsyncOpenAI(api_key=self.api_key, timeout=REQUEST_TIMEOUT)
+    
+    async def process_request_async(self, system_prompt: str, user_input: str, **kwargs):
+        """Traite une requête avec le client asynchrone OpenAI"""
         try:
             import openai
-            openai.api_key = self.api_key
+            if not hasattr(openai, "AsyncOpenAI"):
+                return await super().process_request_async(system_prompt, user_input, **kwargs)
             
-            response = openai.ChatCompletion.create(
+            response = await self._get_async_client().chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -221,7 +576,7 @@ class OpenAIProvider(AIProvider):
                 "provider": self.provider_name,
                 "model": self.model,
                 "response": response.choices[0].message.content,
-                "usage": response.usage,
+                "usage": _usage_dict(response.usage),
                 "timestamp": datetime.now().isoformat()
             }
         except Exception as e:
@@ -238,29 +593,81 @@ class AnthropicProvider(AIProvider):
     def __init__(self, api_key: str, model: str = "claude-3-sonnet-20240229"):
         super().__init__(api_key, model)
         self.provider_name = "Anthropic"
+        self._client = None
+    
+    def _get_client(self):
+        """Client synchrone réutilisé (pool de connexions) ; SDK importé au premier appel"""
+        if self._client is None:
+            import anthropic
+            self._client = anthropic.Anthropic(api_key=self.api_key, timeout=REQUEST_TIMEOUT)
+        return self._client
     
     def process_request(self, system_prompt: str, user_input: str, **kwargs):
         """Traite une requête avec Anthropic Claude"""
         try:
-            import anthropic
-            
-            client = anthropic.Anthropic(api_key=self.api_key)
-            response = client.messages.create(
+            response = self._get_client().messages.create(
                 model=self.model,
                 max_tokens=kwargs.get('max_tokens', 4000),
                 temperature=kwargs.get('temperature', 0.7),
-                system=system_prompt,
+                system=_anthropic_system(system_prompt),
                 messages=[{"role": "user", "content": user_input}]
             )
             
+            return self._format_response(response)
+        except Exception as e:
             return {
-                "success": True,
+                "success": False,
+                "error": str(e),
                 "provider": self.provider_name,
-                "model": self.model,
-                "response": response.content[0].text,
-                "usage": {"total_tokens": response.usage.input_tokens + response.usage.output_tokens},
                 "timestamp": datetime.now().isoformat()
             }
+    
+    def _format_response(self, response) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "provider": self.provider_name,
+            "model": self.model,
+            "response": response.content[0].text,
+            "usage": {
+                "prompt_tokens": response.usage.input_tokens,
+                "completion_tokens": response.usage.output_tokens,
+                "total_tokens": response.usage.input_tokens + response.usage.output_tokens
+            },
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    def stream_request(self, system_prompt: str, user_input: str, **kwargs) -> Iterator[str]:
+        """Diffuse la réponse Claude token par token"""
+        with self._get_client().messages.stream(
+            model=self.model,
+            max_tokens=kwargs.get('max_tokens', 4000),
+            temperature=kwargs.get('temperature', 0.7),
+            system=_anthropic_system(system_prompt),
+            messages=[{"role": "user", "content": user_input}]
+        ) as stream:
+            yield from stream.text_stream
+    
+    def _create_async_client(self):
+        """Client AsyncAnthropic (pool httpx interne avec keep-alive)"""
+        import anthropic
+        return anthropic.AsyncAnthropic(api_key=self.api_key, timeout=REQUEST_TIMEOUT)
+    
+    async def process_request_async(self, system_prompt: str, user_input: str, **kwargs):
+        """Traite une requête avec le client asynchrone Anthropic"""
+        try:
+            import anthropic
+            if not hasattr(anthropic, "AsyncAnthropic"):
+                return await super().process_request_async(system_prompt, user_input, **kwargs)
+            
+            response = await self._get_async_client().messages.create(
+                model=self.model,
+                max_tokens=kwargs.get('max_tokens', 4000),
+                temperature=kwargs.get('temperature', 0.7),
+                system=_anthropic_system(system_prompt),
+                messages=[{"role": "user", "content": user_input}]
+            )
+            
+            return self._format_response(response)
         except Exception as e:
             return {
                 "success": False,
@@ -275,26 +682,68 @@ class GoogleProvider(AIProvider):
     def __init__(self, api_key: str, model: str = "gemini-pro"):
         super().__init__(api_key, model)
         self.provider_name = "Google"
+        self._model = None
     
-    def process_request(self, system_prompt: str, user_input: str, **kwargs):
-        """Traite une requête avec Google Gemini"""
-        try:
+    def _get_model(self):
+        """Modèle Gemini réutilisé ; le SDK n'est importé et configuré qu'une fois"""
+        if self._model is None:
             import google.generativeai as genai
             
             genai.configure(api_key=self.api_key)
-            model = genai.GenerativeModel(self.model)
+            self._model = genai.GenerativeModel(self.model)
+        return self._model
+    
+    def _format_response(self, response) -> Dict[str, Any]:
+        metadata = getattr(response, "usage_metadata", None)
+        return {
+            "success": True,
+            "provider": self.provider_name,
+            "model": self.model,
+            "response": response.text,
+            "usage": {
+                "prompt_tokens": metadata.prompt_token_count,
+                "completion_tokens": metadata.candidates_token_count,
+                "total_tokens": metadata.total_token_count
+            } if metadata is not None else None,
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    def process_request(self, system_prompt: str, user_input: str, **kwargs):
+        """Traite une requête avec Google Gemini"""
+        try:
+            model = self._get_model()
             
             full_prompt = f"{system_prompt}\n\n{user_input}"
             response = model.generate_content(full_prompt)
             
+            return self._format_response(response)
+        except Exception as e:
             return {
-                "success": True,
+                "success": False,
+                "error": str(e),
                 "provider": self.provider_name,
-                "model": self.model,
-                "response": response.text,
-                "usage": {"total_tokens": len(full_prompt.split())},
                 "timestamp": datetime.now().isoformat()
             }
+    
+    def stream_request(self, system_prompt: str, user_input: str, **kwargs) -> Iterator[str]:
+        """Diffuse la réponse Gemini fragment par fragment"""
+        model = self._get_model()
+        full_prompt = f"{system_prompt}\n\n{user_input}"
+        for chunk in model.generate_content(full_prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+    
+    async def process_request_async(self, system_prompt: str, user_input: str, **kwargs):
+        """Traite une requête avec l'API asynchrone (gRPC) de Gemini"""
+        try:
+            model = self._get_model()
+            if not hasattr(model, "generate_content_async"):
+                return await super().process_request_async(system_prompt, user_input, **kwargs)
+            
+            full_prompt = f"{system_prompt}\n\n{user_input}"
+            response = await model.generate_content_async(full_prompt)
+            
+            return self._format_response(response)
         except Exception as e:
             return {
                 "success": False,
@@ -309,36 +758,61 @@ class MetaProvider(AIProvider):
     def __init__(self, api_key: str, model: str = "meta-llama/Llama-2-7b-chat-hf"):
         super().__init__(api_key, model)
         self.provider_name = "Meta"
+        self.api_url = f"https://api-inference.huggingface.co/models/{self.model}"
+        self.session = _create_requests_session(self._async_headers())
+    
+    def _async_headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"}
+    
+    def _build_prompt(self, system_prompt: str, user_input: str) -> str:
+        return f"<s>[INST] <<SYS>>\n{system_prompt}\n<</SYS>>\n\n{user_input} [/INST]"
+    
+    def _parse_response(self, response) -> Dict[str, Any]:
+        """Convertit une réponse HTTP (requests ou httpx) en résultat normalisé"""
+        if response.status_code == 200:
+            result = response.json()
+            return {
+                "success": True,
+                "provider": self.provider_name,
+                "model": self.model,
+                "response": result[0]["generated_text"],
+                "usage": None,  # l'API d'inférence ne renvoie pas de comptage : estimé localement
+                "timestamp": datetime.now().isoformat()
+            }
+        else:
+            return {
+                "success": False,
+                "error": f"Erreur API: {response.status_code}",
+                "provider": self.provider_name,
+                "timestamp": datetime.now().isoformat()
+            }
     
     def process_request(self, system_prompt: str, user_input: str, **kwargs):
         """Traite une requête avec Meta Llama 2 via Hugging Face"""
+        if not self.session:
+            return {"error": "Session Meta non initialisée"}
+        
         try:
-            import requests
-            
-            API_URL = f"https://api-inference.huggingface.co/models/{self.model}"
-            headers = {"Authorization": f"Bearer {self.api_key}"}
-            
-            prompt = f"<s>[INST] <<SYS>>\n{system_prompt}\n<</SYS>>\n\n{user_input} [/INST]"
-            
-            response = requests.post(API_URL, headers=headers, json={"inputs": prompt})
-            
-            if response.status_code == 200:
-                result = response.json()
-                return {
-                    "success": True,
-                    "provider": self.provider_name,
-                    "model": self.model,
-                    "response": result[0]["generated_text"],
-                    "usage": {"total_tokens": len(prompt.split())},
-                    "timestamp": datetime.now().isoformat()
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": f"Erreur API: {response.status_code}",
-                    "provider": self.provider_name,
-                    "timestamp": datetime.now().isoformat()
-                }
+            prompt = self._build_prompt(system_prompt, user_input)
+            response = self.session.post(self.api_url, json={"inputs": prompt}, timeout=REQUEST_TIMEOUT)
+            return self._parse_response(response)
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "provider": self.provider_name,
+                "timestamp": datetime.now().isoformat()
+            }
+    
+    async def process_request_async(self, system_prompt: str, user_input: str, **kwargs):
+        """Traite une requête avec Meta Llama 2 via le pool HTTP asynchrone"""
+        if not _httpx_available():
+            return await super().process_request_async(system_prompt, user_input, **kwargs)
+        
+        try:
+            prompt = self._build_prompt(system_prompt, user_input)
+            response = await self._get_async_client().post(self.api_url, json={"inputs": prompt})
+            return self._parse_response(response)
         except Exception as e:
             return {
                 "success": False,
@@ -347,83 +821,311 @@ class MetaProvider(AIProvider):
                 "timestamp": datetime.now().isoformat()
             }
 
+class CachedProvider(AIProvider):
+    """Enveloppe un fournisseur et sert les réponses identiques depuis le cache"""
+    
+    # Paramètres qui influencent la réponse et font donc partie de la clé
+    CACHE_PARAMS = ("max_tokens", "temperature")
+    
+    def __init__(self, provider: AIProvider, cache: ResponseCache):
+        self.provider = provider
+        self.cache = cache
+    
+    def __getattr__(self, name):
+        # provider_name, api_key, model, session... sont ceux du fournisseur enveloppé
+        return getattr(self.provider, name)
+    
+    def _cache_key(self, system_prompt: str, user_input: str, kwargs: Dict[str, Any]) -> str:
+        params = {name: kwargs[name] for name in self.CACHE_PARAMS if name in kwargs}
+        return self.cache.make_key(
+            f"{self.provider.provider_name}:{self.provider.model}", system_prompt, user_input, params
+        )
+    
+    def _from_cache(self, key: str) -> Optional[Dict[str, Any]]:
+        cached = self.cache.get(key)
+        if cached is not None:
+            cached["cached"] = True
+        return cached
+    
+    def _store(self, key: str, result: Dict[str, Any]):
+        # Seules les vraies réponses sont mises en cache (ni erreurs, ni simulations)
+        if result.get("success") and "note" not in result:
+            self.cache.set(key, result)
+    
+    def process_request(self, system_prompt: str, user_input: str, use_cache: bool = True, **kwargs):
+        """Traite une requête, en servant la réponse depuis le cache si possible"""
+        if not use_cache:
+            return self.provider.process_request(system_prompt, user_input, **kwargs)
+        
+        key = self._cache_key(system_prompt, user_input, kwargs)
+        cached = self._from_cache(key)
+        if cached is not None:
+            return cached
+        
+        result = self.provider.process_request(system_prompt, user_input, **kwargs)
+        self._store(key, result)
+        return result
+    
+    async def process_request_async(self, system_prompt: str, user_input: str, use_cache: bool = True, **kwargs):
+        """Version asynchrone de process_request avec cache"""
+        if not use_cache:
+            return await self.provider.process_request_async(system_prompt, user_input, **kwargs)
+        
+        key = self._cache_key(system_prompt, user_input, kwargs)
+        cached = self._from_cache(key)
+        if cached is not None:
+            return cached
+        
+        result = await self.provider.process_request_async(system_prompt, user_input, **kwargs)
+        self._store(key, result)
+        return result
+    
+    def stream_request(self, system_prompt: str, user_input: str, use_cache: bool = True,
+                       meta: Optional[Dict[str, Any]] = None, **kwargs) -> Iterator[str]:
+        """Diffuse la réponse ; un hit de cache est servi en un seul fragment (et signalé dans `meta`)"""
+        meta = meta if meta is not None else {}
+        if not use_cache:
+            yield from self.provider.stream_request(system_prompt, user_input, meta=meta, **kwargs)
+            return
+        
+        key = self._cache_key(system_prompt, user_input, kwargs)
+        cached = self._from_cache(key)
+        if cached is not None:
+            meta["cached"] = True
+            yield cached["response"]
+            return
+        
+        chunks = []
+        for chunk in self.provider.stream_request(system_prompt, user_input, meta=meta, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        if meta.get("simulated"):
+            return
+        self._store(key, {
+            "success": True,
+            "provider": self.provider.provider_name,
+            "model": self.provider.model,
+            "response": "".join(chunks),
+            "usage": None,
+            "timestamp": datetime.now().isoformat()
+        })
+    
+    async def aclose(self):
+        await self.provider.aclose()
+
 class AIOrchestrator:
     """Orchestrateur principal pour gérer tous les fournisseurs IA"""
     
     def __init__(self):
-        self.providers = {}
+        self.providers = {}  # fournisseurs déjà construits
+        self._factories: Dict[str, Callable[[], AIProvider]] = {}
+        self._providers_lock = threading.Lock()
+        self.response_cache = create_response_cache()
         self.load_providers()
-        print("touché")
+        self.router = create_model_router(self.get_provider)
+    
+    def _register(self, model_name: str, factory: Callable[[], AIProvider]):
+        self._factories[model_name] = factory
+        logger.info(f"Modèle {model_name} configuré")
     
     def load_providers(self):
-        """Charge tous les fournisseurs IA disponibles"""
+        """Déclare les fournisseurs IA configurés (construits au premier usage)"""
         groq_key = os.getenv('GROQ_API_KEY')
         if groq_key and groq_key != "votre_cle_groq_ici":
-            self.providers['Groq'] = GroqProvider(groq_key, "llama3-8b-8192")
-            print("Groq cel: ", groq_key)
-            st.success(" Modèle Groq détecté et configuré !")
+            self._register('Groq', lambda: GroqProvider(groq_key, "llama3-8b-8192"))
 
         #  GROK - Nouveau modèle d'X (Twitter)
         grok_key = os.getenv('GROK_API_KEY')
         if grok_key and grok_key != "votre_cle_grok_ici":
-            self.providers['Grok Beta'] = GrokProvider(grok_key, "grok-beta")
-            print("Grok cel: ",grok_key)
-            st.success(" Modèle Grok détecté et configuré !")
+            self._register('Grok Beta', lambda: GrokProvider(grok_key, "grok-beta"))
         
         # OpenAI
         openai_key = os.getenv('OPENAI_API_KEY')
         if openai_key and openai_key != "sk-votre_cle_openai_ici":
-            self.providers['GPT-4'] = OpenAIProvider(openai_key, "gpt-4")
-            self.providers['GPT-3.5-turbo'] = OpenAIProvider(openai_key, "gpt-3.5-turbo")
+            self._register('GPT-4', lambda: OpenAIProvider(openai_key, "gpt-4"))
+            self._register('GPT-3.5-turbo', lambda: OpenAIProvider(openai_key, "gpt-3.5-turbo"))
         
         # Anthropic
         anthropic_key = os.getenv('ANTHROPIC_API_KEY')
         if anthropic_key and anthropic_key != "sk-ant-REDACTED":
-            self.providers['Claude-3'] = AnthropicProvider(anthropic_key, "claude-3-sonnet-20240229")
+            self._register('Claude-3', lambda: AnthropicProvider(anthropic_key, "claude-3-sonnet-20240229"))
         
         # Google
         google_key = os.getenv('GOOGLE_API_KEY')
         if google_key and google_key != "votre_cle_google_ici":
-            self.providers['Gemini Pro'] = GoogleProvider(google_key, "gemini-pro")
+            self._register('Gemini Pro', lambda: GoogleProvider(google_key, "gemini-pro"))
         
         # Meta (Llama 2)
         meta_key = os.getenv('META_API_KEY')
         if meta_key and meta_key != "votre_cle_meta_ici":
-            self.providers['Llama 2'] = MetaProvider(meta_key, "meta-llama/Llama-2-7b-chat-hf")
+            self._register('Llama 2', lambda: MetaProvider(meta_key, "meta-llama/Llama-2-7b-chat-hf"))
     
     def get_provider(self, model_name: str):
-        """Récupère un fournisseur par nom de modèle"""
-        return self.providers.get(model_name)
+        """Récupère un fournisseur par nom de modèle, construit au premier appel"""
+        provider = self.providers.get(model_name)
+        if provider is not None or model_name not in self._factories:
+            return provider
+        with self._providers_lock:
+            provider = self.providers.get(model_name)
+            if provider is None:
+                provider = self._factories[model_name]()
+                if self.response_cache is not None:
+                    provider = CachedProvider(provider, self.response_cache)
+                self.providers[model_name] = provider
+        return provider
     
     def list_available_models(self):
         """Liste tous les modèles disponibles"""
-        return list(self.providers.keys())
+        return list(self._factories.keys())
     
-    def process_request(self, model_name: str, system_prompt: str, user_input: str, **kwargs):
-        """Traite une requête avec le modèle spécifié"""
+    @staticmethod
+    def _account(result: Dict[str, Any], model_name: Optional[str], system_prompt: str, user_input: str):
+        """Usage normalisé (tokens réels ou estimés) et coût du modèle effectivement utilisé"""
+        return account_result(result, model_name, f"{system_prompt}\n\n{user_input}")
+    
+    def stream_usage(self, model_name, system_prompt: str, user_input: str, response: str,
+                     meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Usage estimé et coût d'une réponse diffusée (les flux ne renvoient pas de comptage)
+
+        `meta` est celui passé à stream_request : il donne le modèle qui a
+        réellement répondu après une bascule, et une réponse servie par le
+        cache ou simulée ne coûte rien, comme pour account_result.
+        """
+        meta = meta or {}
+        model_name = meta.get("model_name", model_name)
+        if isinstance(model_name, (list, tuple)):
+            model_name = model_name[0] if model_name else None
+        usage = normalize_usage(None, f"{system_prompt}\n\n{user_input}", response)
+        free = meta.get("cached") or meta.get("simulated")
+        cost = 0.0 if free else estimate_cost(model_name, usage)
+        return {"usage": usage, "model_name": model_name, "cost": cost, "cached": bool(meta.get("cached"))}
+    
+    def process_request(self, model_name, system_prompt: str, user_input: str, **kwargs):
+        """Traite une requête avec le modèle spécifié
+
+        `model_name` peut être une liste ordonnée de modèles équivalents :
+        la requête est alors routée vers le plus rapide en bonne santé.
+        """
+        if isinstance(model_name, (list, tuple)):
+            result = self.router.process_request(model_name, system_prompt, user_input, **kwargs)
+            return self._account(result, result.get("routed_model"), system_prompt, user_input)
         provider = self.get_provider(model_name)
         if provider:
-            return provider.process_request(system_prompt, user_input, **kwargs)
+            result = provider.process_request(system_prompt, user_input, **kwargs)
+            return self._account(result, model_name, system_prompt, user_input)
         else:
             return {
                 "success": False,
                 "error": f"Modèle '{model_name}' non disponible",
                 "timestamp": datetime.now().isoformat()
             }
+    
+    async def process_request_async(self, model_name, system_prompt: str, user_input: str, **kwargs):
+        """Traite une requête de manière asynchrone (liste de modèles : routage avec hedging)"""
+        if isinstance(model_name, (list, tuple)):
+            result = await self.router.process_request_async(model_name, system_prompt, user_input, **kwargs)
+            return self._account(result, result.get("routed_model"), system_prompt, user_input)
+        provider = self.get_provider(model_name)
+        if provider:
+            result = await provider.process_request_async(system_prompt, user_input, **kwargs)
+            return self._account(result, model_name, system_prompt, user_input)
+        else:
+            return {
+                "success": False,
+                "error": f"Modèle '{model_name}' non disponible",
+                "timestamp": datetime.now().isoformat()
+            }
+    
+    def stream_request(self, model_name, system_prompt: str, user_input: str,
+                       meta: Optional[Dict[str, Any]] = None, **kwargs) -> Iterator[str]:
+        """Diffuse la réponse du modèle spécifié fragment par fragment (liste de modèles : bascule)
 
-# Instance globale de l'orchestrateur
-ai_orchestrator = AIOrchestrator()
+        `meta` (optionnel) reçoit le modèle qui a servi et l'origine de la
+        réponse (cache, simulation), à transmettre ensuite à stream_usage.
+        """
+        if isinstance(model_name, (list, tuple)):
+            return self.router.stream_request(model_name, system_prompt, user_input, meta=meta, **kwargs)
+        provider = self.get_provider(model_name)
+        if not provider:
+            raise ValueError(f"Modèle '{model_name}' non disponible")
+        if meta is not None:
+            meta["model_name"] = model_name
+        return provider.stream_request(system_prompt, user_input, meta=meta, **kwargs)
+    
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Statistiques du cache de réponses (None si désactivé)"""
+        return self.response_cache.stats() if self.response_cache is not None else None
+    
+    def has_provider(self, model_names) -> bool:
+        """Indique si au moins un des modèles (nom ou liste) est configuré, sans le construire"""
+        if isinstance(model_names, str):
+            model_names = [model_names]
+        return any(name in self._factories for name in model_names)
+    
+    def router_stats(self) -> Dict[str, Any]:
+        """Latences, taux d'erreur et disjoncteurs des modèles routés"""
+        return self.router.stats()
+    
+    def limiter_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Concurrence, budgets restants et reprises des fournisseurs limités"""
+        return limiter_stats()
+    
+    async def aclose(self):
+        """Ferme les pools de connexions asynchrones de tous les fournisseurs"""
+        await asyncio.gather(*(provider.aclose() for provider in self.providers.values()))
+
+_orchestrator: Optional[AIOrchestrator] = None
+_orchestrator_lock = threading.Lock()
+
+
+def load_environment():
+    """Charge config.env (sans écraser les variables déjà définies)"""
+    from dotenv import load_dotenv
+    load_dotenv(CONFIG_FILE)
+
+
+def get_orchestrator() -> AIOrchestrator:
+    """Orchestrateur partagé du processus, construit au premier appel"""
+    global _orchestrator
+    if _orchestrator is None:
+        with _orchestrator_lock:
+            if _orchestrator is None:
+                load_environment()
+                _orchestrator = AIOrchestrator()
+    return _orchestrator
+
+
+def peek_orchestrator() -> Optional[AIOrchestrator]:
+    """Orchestrateur du processus s'il a déjà été construit, None sinon (sans le construire)"""
+    return _orchestrator
+
+
+async def aclose_orchestrator():
+    """Ferme les pools de connexions de l'orchestrateur, s'il a été construit"""
+    if _orchestrator is not None:
+        await _orchestrator.aclose()
+
+
+def __getattr__(name):
+    # Compatibilité : `ai_integration.ai_orchestrator` construit l'instance à la première lecture
+    if name == "ai_orchestrator":
+        return get_orchestrator()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def display_model_status():
     """Affiche le statut des modèles IA disponibles"""
+    import streamlit as st
+    
+    ai_orchestrator = get_orchestrator()
     st.markdown("### Statut des Modèles IA")
     
-    if not ai_orchestrator.providers:
+    if not ai_orchestrator.list_available_models():
         st.warning(" Aucun modèle IA configuré. Configurez vos clés API dans config.env")
         return
     
     # Afficher le statut de chaque modèle
-    for model_name, provider in ai_orchestrator.providers.items():
+    for model_name in ai_orchestrator.list_available_models():
+        provider = ai_orchestrator.get_provider(model_name)
         col1, col2, col3 = st.columns([2, 1, 1])
         
         with col1:
@@ -452,6 +1154,14 @@ def display_model_status():
         
         st.markdown("---")
     
+    cache_stats = ai_orchestrator.cache_stats()
+    if cache_stats:
+        st.caption(
+            f"🗃️ Cache des réponses : {cache_stats['entries']} entrées, "
+            f"{cache_stats['hits']} hits / {cache_stats['misses']} misses "
+            f"({cache_stats['hit_rate']:.0%})"
+        )
+    
     # Instructions de configuration
     st.info("💡 **Pour configurer de nouveaux modèles :**")
     st.markdown("""
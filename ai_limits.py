@@ -0,0 +1,413 @@
+"""
+🚥 Limites des fournisseurs IA
+Concurrence bornée, budgets requêtes/tokens par minute et reprises
+avec attente exponentielle (respect de Retry-After) pour rester sous
+les quotas des fournisseurs au lieu de provoquer des rafales de 429.
+"""
+
+import os
+import time
+import random
+import asyncio
+import threading
+import weakref
+from contextlib import contextmanager, asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Callable, Awaitable
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Statuts HTTP temporaires : quota dépassé ou indisponibilité du fournisseur
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BASE_DELAY = 0.5   # secondes
+DEFAULT_MAX_DELAY = 30.0   # secondes
+
+# Quotas par défaut (offres gratuites) ; 0 désactive le budget correspondant
+PROVIDER_DEFAULTS = {
+    "groq": {"concurrency": 8, "rpm": 30, "tpm": 30000},
+    "grok": {"concurrency": 8, "rpm": 60, "tpm": 100000},
+}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Convertit un en-tête Retry-After (secondes ou date HTTP) en secondes"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Convertit une durée x-ratelimit-reset-* (ex: '1m2.5s', '450ms', '7.66s') en secondes"""
+    if not value:
+        return None
+    value = value.strip()
+    total, number = 0.0, ""
+    i = 0
+    try:
+        while i < len(value):
+            char = value[i]
+            if char.isdigit() or char == ".":
+                number += char
+            elif value.startswith("ms", i):
+                total += float(number) / 1000
+                number = ""
+                i += 1
+            elif char in "hms":
+                total += float(number) * {"h": 3600, "m": 60, "s": 1}[char]
+                number = ""
+            else:
+                return None
+            i += 1
+        if number:
+            total += float(number)
+    except ValueError:
+        return None
+    return total
+
+
+def estimate_tokens(payload: Dict[str, Any]) -> int:
+    """Estime les tokens d'une requête /chat/completions (≈ 4 caractères par token + réponse maximale)"""
+    chars = sum(len(message.get("content") or "") for message in payload.get("messages", ()))
+    return chars // 4 + int(payload.get("max_tokens") or 0)
+
+
+class _Bucket:
+    """Seau à jetons d'un budget par minute (non verrouillé : protégé par le limiteur)"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.refill_rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    def wait_for(self, cost: float) -> float:
+        # Une requête plus grosse que le budget entier passe dès que le seau est plein
+        cost = min(cost, self.capacity)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.refill_rate
+
+
+class ProviderLimiter:
+    """Limiteur d'un fournisseur IA
+
+    - sémaphore de concurrence (un pour les threads, un par boucle d'événements) ;
+    - budgets requêtes/minute et tokens/minute en seaux à jetons, recalés sur
+      les en-têtes x-ratelimit-* renvoyés par le fournisseur ;
+    - pause commune à tous les appelants après un 429, pour ne pas relancer
+      toutes les requêtes en attente au même instant.
+    """
+
+    def __init__(self, name: str, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_retries: int = DEFAULT_MAX_RETRIES, base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._requests = _Bucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._tokens = _Bucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._async_semaphores: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self.counters = {"requests": 0, "retries": 0, "rate_limited": 0, "server_errors": 0,
+                         "budget_waits": 0, "in_flight": 0}
+
+    # --- Budgets ---
+
+    def reserve(self, estimated_tokens: int = 0) -> float:
+        """Réserve une requête et ses tokens estimés
+
+        Retourne 0 si la réservation est faite, sinon le nombre de secondes à
+        attendre avant de réessayer (rien n'est alors consommé).
+        """
+        now = time.monotonic()
+        with self._lock:
+            wait = self._paused_until - now
+            for bucket, cost in ((self._requests, 1), (self._tokens, estimated_tokens)):
+                if bucket is not None:
+                    bucket.refill(now)
+                    wait = max(wait, bucket.wait_for(cost))
+            if wait > 0:
+                self.counters["budget_waits"] += 1
+                return wait
+            if self._requests is not None:
+                self._requests.tokens -= 1
+            if self._tokens is not None:
+                self._tokens.tokens -= min(estimated_tokens, self._tokens.capacity)
+            return 0.0
+
+    def record_usage(self, estimated_tokens: int, usage: Optional[Dict[str, Any]]):
+        """Corrige le budget de tokens avec la consommation réelle renvoyée par le fournisseur"""
+        if self._tokens is None or not isinstance(usage, dict) or not usage.get("total_tokens"):
+            return
+        estimated = min(estimated_tokens, self._tokens.capacity)
+        with self._lock:
+            # Une dette (consommation sous-estimée) est autorisée : elle retarde les requêtes suivantes
+            self._tokens.tokens = min(self._tokens.capacity,
+                                      self._tokens.tokens + estimated - usage["total_tokens"])
+
+    def update_from_headers(self, headers):
+        """Recale les budgets sur les quotas restants annoncés par le fournisseur"""
+        now = time.monotonic()
+        with self._lock:
+            for bucket, suffix in ((self._requests, "requests"), (self._tokens, "tokens")):
+                remaining = headers.get(f"x-ratelimit-remaining-{suffix}")
+                if bucket is None or remaining is None:
+                    continue
+                try:
+                    remaining = float(remaining)
+                except ValueError:
+                    continue
+                bucket.refill(now)
+                bucket.tokens = min(bucket.tokens, remaining)
+
+    def pause(self, seconds: float):
+        """Suspend toutes les requêtes vers ce fournisseur pendant `seconds`"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    # --- Reprises ---
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Délai avant la tentative suivante : Retry-After s'il est fourni, sinon attente exponentielle à gigue complète"""
+        if retry_after is not None:
+            # Petite gigue pour étaler les appelants qui ont reçu le même Retry-After
+            return min(self.max_delay, retry_after) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _retry_delay(self, response, attempt: int) -> Optional[float]:
+        """Retourne le délai avant de réessayer, ou None si la réponse est définitive"""
+        headers = getattr(response, "headers", None) or {}
+        self.update_from_headers(headers)
+        status = response.status_code
+        if status not in RETRYABLE_STATUS:
+            return None
+
+        if status == 429:
+            self._count("rate_limited")
+        elif status >= 500:
+            self._count("server_errors")
+        if attempt >= self.max_retries:
+            return None
+
+        retry_after = parse_retry_after(headers.get("retry-after"))
+        if retry_after is None and status == 429:
+            retry_after = (parse_reset_duration(headers.get("x-ratelimit-reset-tokens"))
+                           or parse_reset_duration(headers.get("x-ratelimit-reset-requests")))
+        delay = self.backoff_delay(attempt, retry_after)
+        if status == 429:
+            self.pause(delay)
+        self._count("retries")
+        logger.warning(f"{self.name}: statut {status}, nouvelle tentative dans {delay:.2f}s "
+                       f"({attempt + 1}/{self.max_retries})")
+        return delay
+
+    def _transport_retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        if attempt >= self.max_retries:
+            return None
+        self._count("retries")
+        delay = self.backoff_delay(attempt)
+        logger.warning(f"{self.name}: erreur réseau ({error}), nouvelle tentative dans {delay:.2f}s")
+        return delay
+
+    # --- Appels synchrones ---
+
+    @contextmanager
+    def slot(self, estimated_tokens: int = 0):
+        """Attend le budget puis occupe une place de concurrence le temps du bloc"""
+        while True:
+            wait = self.reserve(estimated_tokens)
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        with self._semaphore:
+            self._enter()
+            try:
+                yield
+            finally:
+                self._exit()
+
+    def call(self, send: Callable[[], Any], estimated_tokens: int = 0):
+        """Exécute `send()` (qui renvoie une réponse HTTP) sous les limites, avec reprises
+
+        Retourne la dernière réponse obtenue ; lève l'exception réseau si
+        toutes les tentatives ont échoué.
+        """
+        attempt = 0
+        while True:
+            try:
+                with self.slot(estimated_tokens):
+                    response = send()
+            except Exception as e:
+                delay = self._transport_retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            else:
+                delay = self._retry_delay(response, attempt)
+                if delay is None:
+                    return response
+                close = getattr(response, "close", None)
+                if close:
+                    close()
+            time.sleep(delay)
+            attempt += 1
+
+    @contextmanager
+    def stream(self, send: Callable[[], Any], estimated_tokens: int = 0):
+        """Comme call(), mais la place de concurrence reste occupée jusqu'à la fin du bloc
+
+        Pour les réponses diffusées, la requête ne se termine qu'à la
+        fermeture du flux : max_concurrency borne ainsi les flux ouverts.
+        Les reprises ne portent que sur l'ouverture, et l'attente entre deux
+        tentatives se fait hors de la place.
+        """
+        attempt = 0
+        while True:
+            with self.slot(estimated_tokens):
+                try:
+                    response = send()
+                except Exception as e:
+                    delay = self._transport_retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._retry_delay(response, attempt)
+                    if delay is None:
+                        yield response
+                        return
+                    close = getattr(response, "close", None)
+                    if close:
+                        close()
+            time.sleep(delay)
+            attempt += 1
+
+    # --- Appels asynchrones ---
+
+    def _get_async_semaphore(self) -> asyncio.Semaphore:
+        """Sémaphore propre à la boucle d'événements courante"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._async_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._async_semaphores[loop] = semaphore
+        return semaphore
+
+    @asynccontextmanager
+    async def aslot(self, estimated_tokens: int = 0):
+        """Version asynchrone de slot(), sans bloquer la boucle d'événements"""
+        while True:
+            wait = self.reserve(estimated_tokens)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        async with self._get_async_semaphore():
+            self._enter()
+            try:
+                yield
+            finally:
+                self._exit()
+
+    async def acall(self, send: Callable[[], Awaitable[Any]], estimated_tokens: int = 0):
+        """Version asynchrone de call()"""
+        attempt = 0
+        while True:
+            try:
+                async with self.aslot(estimated_tokens):
+                    response = await send()
+            except Exception as e:
+                delay = self._transport_retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            else:
+                delay = self._retry_delay(response, attempt)
+                if delay is None:
+                    return response
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    # --- Statistiques ---
+
+    def _enter(self):
+        with self._lock:
+            self.counters["requests"] += 1
+            self.counters["in_flight"] += 1
+
+    def _exit(self):
+        with self._lock:
+            self.counters["in_flight"] -= 1
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs et budgets restants du limiteur"""
+        now = time.monotonic()
+        with self._lock:
+            budgets = {}
+            for bucket, label in ((self._requests, "requests"), (self._tokens, "tokens")):
+                if bucket is not None:
+                    bucket.refill(now)
+                    budgets[label] = {"remaining": round(bucket.tokens, 1), "per_minute": bucket.capacity}
+            return dict(self.counters, provider=self.name, max_concurrency=self.max_concurrency,
+                        budgets=budgets, paused_for=round(max(0.0, self._paused_until - now), 2))
+
+
+_limiters: Dict[str, ProviderLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_provider_limiter(name: str) -> ProviderLimiter:
+    """Limiteur partagé d'un fournisseur (tous les modèles d'une même clé API partagent le quota)
+
+    Configuration par variables d'environnement : <NOM>_MAX_CONCURRENCY,
+    <NOM>_RPM, <NOM>_TPM, et AI_MAX_RETRIES, AI_RETRY_BASE_DELAY, AI_RETRY_MAX_DELAY.
+    """
+    key = name.lower()
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            defaults = PROVIDER_DEFAULTS.get(key, {"concurrency": DEFAULT_MAX_CONCURRENCY, "rpm": 0, "tpm": 0})
+            prefix = key.upper()
+            limiter = ProviderLimiter(
+                name,
+                max_concurrency=int(os.getenv(f'{prefix}_MAX_CONCURRENCY', defaults["concurrency"])),
+                requests_per_minute=float(os.getenv(f'{prefix}_RPM', defaults["rpm"])),
+                tokens_per_minute=float(os.getenv(f'{prefix}_TPM', defaults["tpm"])),
+                max_retries=int(os.getenv('AI_MAX_RETRIES', DEFAULT_MAX_RETRIES)),
+                base_delay=float(os.getenv('AI_RETRY_BASE_DELAY', DEFAULT_BASE_DELAY)),
+                max_delay=float(os.getenv('AI_RETRY_MAX_DELAY', DEFAULT_MAX_DELAY))
+            )
+            _limiters[key] = limiter
+        return limiter
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Statistiques de tous les limiteurs de fournisseurs du processus"""
+    with _limiters_lock:
+        limiters = list(_limiters.items())
+    return {key: limiter.stats() for key, limiter in limiters}
@@ -0,0 +1,422 @@
+"""
+🧭 Routage multi-fournisseurs
+Choisit, parmi une liste ordonnée de modèles équivalents, le plus rapide
+en bonne santé ; double les requêtes lentes (hedging) et coupe les
+fournisseurs défaillants (disjoncteur).
+"""
+
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable, Iterator, List, Sequence, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATENCY_WINDOW = 100       # dernières requêtes prises en compte par modèle
+MIN_LATENCY_SAMPLES = 5            # en dessous, la latence d'un modèle est inconnue
+DEFAULT_FAILURE_THRESHOLD = 5      # échecs consécutifs avant ouverture du disjoncteur
+DEFAULT_ERROR_RATE_THRESHOLD = 0.5
+DEFAULT_BREAKER_COOLDOWN = 30.0    # secondes avant une requête de sonde
+DEFAULT_HEDGE_DELAY = 2.0          # secondes, tant que la latence du modèle est inconnue
+MIN_HEDGE_DELAY = 0.5
+
+ModelList = Union[str, Sequence[str]]
+
+
+def _close(stream: Iterator[str]):
+    """Ferme un flux de fournisseur abandonné (libère sa connexion et sa place de concurrence)"""
+    close = getattr(stream, "close", None)
+    if close is not None:
+        close()
+
+
+def agent_models(agent: Dict[str, Any]) -> List[str]:
+    """Liste ordonnée des modèles d'un agent : modèle principal puis `fallback_models`
+
+    Les modèles de repli sont lus à la racine de l'agent (agents JSON) ou
+    dans sa configuration JSON (agents de la base).
+    """
+    primary = agent.get("model") or agent.get("model_type")
+    fallbacks = agent.get("fallback_models")
+    if fallbacks is None:
+        configuration = agent.get("configuration")
+        if isinstance(configuration, str):
+            try:
+                configuration = json.loads(configuration or "{}")
+            except ValueError:
+                configuration = {}
+        fallbacks = (configuration or {}).get("fallback_models") if isinstance(configuration, dict) else None
+    models = [primary] if primary else []
+    models += [model for model in (fallbacks or []) if model and model != primary]
+    return models
+
+
+def _percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class ModelHealth:
+    """Latences glissantes, taux d'erreur et disjoncteur d'un modèle
+
+    États du disjoncteur : closed (trafic normal), open (modèle écarté
+    pendant `cooldown`), half_open (une seule requête de sonde autorisée ;
+    son succès referme le disjoncteur, son échec le rouvre).
+    """
+
+    def __init__(self, name: str, window: int = DEFAULT_LATENCY_WINDOW,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 error_rate_threshold: float = DEFAULT_ERROR_RATE_THRESHOLD,
+                 cooldown: float = DEFAULT_BREAKER_COOLDOWN):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._latencies = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)  # True = succès
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Indique si une requête peut être envoyée (réserve la sonde en half_open)"""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self, latency: Optional[float] = None):
+        with self._lock:
+            if latency is not None:
+                self._latencies.append(latency)
+            self._outcomes.append(True)
+            self.consecutive_failures = 0
+            if self.state != "closed":
+                logger.info(f"Disjoncteur refermé pour {self.name}")
+                self.state = "closed"
+                self._probe_in_flight = False
+                self._outcomes.clear()  # les échecs d'avant la panne ne comptent plus
+
+    def record_failure(self):
+        with self._lock:
+            self._outcomes.append(False)
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold \
+                    or (len(self._outcomes) >= MIN_LATENCY_SAMPLES * 2
+                        and self._error_rate() >= self.error_rate_threshold):
+                if self.state != "open":
+                    logger.warning(f"Disjoncteur ouvert pour {self.name} ({self.cooldown:.0f}s)")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def record_cancelled(self):
+        """Requête abandonnée (hedging) : ni succès ni échec, libère la sonde éventuelle"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _error_rate(self) -> float:
+        return self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0
+
+    def latency(self, q: float) -> Optional[float]:
+        """Percentile de latence (secondes), ou None si trop peu de mesures"""
+        with self._lock:
+            if len(self._latencies) < MIN_LATENCY_SAMPLES:
+                return None
+            return _percentile(sorted(self._latencies), q)
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95 = self.latency(50), self.latency(95)
+        with self._lock:
+            return {
+                "state": self.state,
+                "samples": len(self._latencies),
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "error_rate": round(self._error_rate(), 3),
+                "consecutive_failures": self.consecutive_failures
+            }
+
+
+class ModelRouter:
+    """Routeur de requêtes sur une liste ordonnée de modèles équivalents
+
+    - les modèles dont la latence est encore inconnue sont essayés dans
+      l'ordre déclaré, puis le plus rapide (p50) est privilégié ;
+    - un modèle en échec passe la main au suivant (bascule) ;
+    - en asynchrone, une requête sans réponse après le délai de hedging
+      est doublée sur le modèle suivant ; la première réponse gagne.
+    """
+
+    def __init__(self, get_provider: Callable[[str], Any], hedge_delay: Optional[float] = None,
+                 max_hedges: int = 1, **health_options):
+        self.get_provider = get_provider
+        # None : délai adaptatif (p95 du modèle), 0 : hedging désactivé
+        self.hedge_delay = hedge_delay
+        self.max_hedges = max_hedges
+        self.health_options = health_options
+        self.hedged = 0
+        self.failovers = 0
+        self._health: Dict[str, ModelHealth] = {}
+        self._lock = threading.Lock()
+
+    def health(self, model: str) -> ModelHealth:
+        with self._lock:
+            health = self._health.get(model)
+            if health is None:
+                health = self._health[model] = ModelHealth(model, **self.health_options)
+            return health
+
+    def rank(self, models: ModelList) -> List[str]:
+        """Ordonne les modèles disponibles : inconnus dans l'ordre déclaré, puis par latence médiane
+
+        Les modèles dont le disjoncteur est ouvert passent en dernier.
+        """
+        if isinstance(models, str):
+            models = [models]
+        candidates = [model for model in dict.fromkeys(models) if self.get_provider(model)]
+
+        def key(item):
+            index, model = item
+            health = self.health(model)
+            p50 = health.latency(50)
+            return (health.state == "open", p50 is not None, p50 or 0.0, index)
+
+        return [model for _, model in sorted(enumerate(candidates), key=key)]
+
+    def _hedge_delay_for(self, model: str) -> Optional[float]:
+        if self.hedge_delay is not None:
+            return self.hedge_delay or None
+        p95 = self.health(model).latency(95)
+        return max(MIN_HEDGE_DELAY, p95) if p95 is not None else DEFAULT_HEDGE_DELAY
+
+    @staticmethod
+    def _unavailable(models: ModelList) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": f"Aucun modèle disponible parmi {models} (non configurés ou disjoncteurs ouverts)",
+            "timestamp": datetime.now().isoformat()
+        }
+
+    @staticmethod
+    def _annotate(result: Dict[str, Any], model: Optional[str], attempted: List[str]) -> Dict[str, Any]:
+        result = dict(result)
+        if model is not None:
+            result["routed_model"] = model
+        result["attempted_models"] = list(attempted)
+        return result
+
+    @staticmethod
+    def _simulated(result: Dict[str, Any]) -> bool:
+        """Réponse de repli locale (API injoignable) : utilisable, mais le fournisseur est défaillant"""
+        return bool(result.get("simulated") or "note" in result)
+
+    def _record(self, model: str, result: Dict[str, Any], elapsed: float):
+        health = self.health(model)
+        if not result.get("success") or self._simulated(result):
+            health.record_failure()
+        else:
+            # Un hit de cache ne mesure pas le fournisseur
+            health.record_success(None if result.get("cached") else elapsed)
+
+    def _next_allowed(self, candidates: Iterator[str]) -> Optional[str]:
+        for model in candidates:
+            if self.health(model).allow():
+                return model
+        return None
+
+    def process_request(self, models: ModelList, system_prompt: str, user_input: str, **kwargs) -> Dict[str, Any]:
+        """Traite une requête avec bascule séquentielle sur les modèles suivants en cas d'échec"""
+        candidates = iter(self.rank(models))
+        attempted, last, simulated = [], None, None
+        while True:
+            model = self._next_allowed(candidates)
+            if model is None:
+                break
+            if attempted:
+                self.failovers += 1
+            attempted.append(model)
+            started = time.perf_counter()
+            try:
+                result = self.get_provider(model).process_request(system_prompt, user_input, **kwargs)
+            except Exception as e:
+                result = {"success": False, "error": str(e), "timestamp": datetime.now().isoformat()}
+            self._record(model, result, time.perf_counter() - started)
+            if result.get("success") and self._simulated(result):
+                # Une simulation ne sert qu'à défaut de tout autre modèle
+                simulated = simulated or (model, result)
+            elif result.get("success"):
+                return self._annotate(result, model, attempted)
+            else:
+                last = result
+        if simulated:
+            return self._annotate(simulated[1], simulated[0], attempted)
+        return self._annotate(last or self._unavailable(models), None, attempted)
+
+    async def _timed_request_async(self, model: str, system_prompt: str, user_input: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = await self.get_provider(model).process_request_async(system_prompt, user_input, **kwargs)
+        except asyncio.CancelledError:
+            self.health(model).record_cancelled()
+            raise
+        except Exception as e:
+            result = {"success": False, "error": str(e), "timestamp": datetime.now().isoformat()}
+        self._record(model, result, time.perf_counter() - started)
+        return result
+
+    async def process_request_async(self, models: ModelList, system_prompt: str, user_input: str,
+                                    **kwargs) -> Dict[str, Any]:
+        """Traite une requête avec hedging des réponses lentes et bascule en cas d'échec"""
+        candidates = iter(self.rank(models))
+        attempted: List[str] = []
+        pending: Dict[asyncio.Future, str] = {}
+        hedges, last, simulated = 0, None, None
+
+        def launch() -> bool:
+            model = self._next_allowed(candidates)
+            if model is None:
+                return False
+            attempted.append(model)
+            task = asyncio.ensure_future(self._timed_request_async(model, system_prompt, user_input, **kwargs))
+            pending[task] = model
+            return True
+
+        can_hedge = launch()
+        try:
+            while pending:
+                timeout = None
+                if can_hedge and hedges < self.max_hedges:
+                    timeout = self._hedge_delay_for(attempted[-1])
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Réponse trop lente : la même requête part en parallèle sur le modèle suivant
+                    can_hedge = launch()
+                    if can_hedge:
+                        hedges += 1
+                        self.hedged += 1
+                        logger.info(f"Hedging : requête doublée sur {attempted[-1]}")
+                    continue
+
+                for task in done:
+                    model = pending.pop(task)
+                    result = task.result()
+                    if result.get("success") and self._simulated(result):
+                        simulated = simulated or (model, result)
+                    elif result.get("success"):
+                        return self._annotate(result, model, attempted)
+                    else:
+                        last = result
+                if not pending and launch():
+                    self.failovers += 1
+        finally:
+            for task in pending:
+                task.cancel()
+        if simulated:
+            return self._annotate(simulated[1], simulated[0], attempted)
+        return self._annotate(last or self._unavailable(models), None, attempted)
+
+    def stream_request(self, models: ModelList, system_prompt: str, user_input: str,
+                       meta: Optional[Dict[str, Any]] = None, **kwargs) -> Iterator[str]:
+        """Diffuse la réponse ; la bascule n'est possible qu'avant le premier fragment
+
+        `meta` reçoit le modèle qui a servi (`model_name`) et les indications
+        de ce seul fournisseur, pas celles des tentatives abandonnées.
+        Une réponse simulée compte comme un échec et n'est diffusée qu'à
+        défaut de tout autre modèle.
+        """
+        candidates = iter(self.rank(models))
+        last_error: Optional[Exception] = None
+        simulated = None
+        while True:
+            model = self._next_allowed(candidates)
+            if model is None:
+                if simulated is None:
+                    break
+                model, attempt, first, stream = simulated
+                simulated = None
+            else:
+                attempt, first, stream = {}, None, None
+            if stream is None:
+                stream = iter(self.get_provider(model).stream_request(system_prompt, user_input, meta=attempt,
+                                                                      **kwargs))
+                try:
+                    first = next(stream, None)
+                except Exception as e:
+                    self.health(model).record_failure()
+                    self.failovers += 1
+                    last_error = e
+                    logger.warning(f"Échec de {model} avant le premier fragment, bascule: {e}")
+                    continue
+                if attempt.get("simulated"):
+                    # API injoignable : la simulation est gardée en réserve, le modèle suivant est essayé
+                    self.health(model).record_failure()
+                    self.failovers += 1
+                    logger.warning(f"{model} a répondu par une simulation, bascule")
+                    if simulated is None:
+                        simulated = (model, attempt, first, stream)
+                    else:
+                        _close(stream)
+                    continue
+            if simulated is not None:
+                _close(simulated[3])
+            # Durées de flux non comparables aux requêtes complètes : seul le résultat est compté,
+            # une fois le flux terminé (une coupure en cours de diffusion est un échec)
+            if meta is not None:
+                meta.update(attempt, model_name=model)
+            health = self.health(model)
+            try:
+                if first is not None:
+                    yield first
+                yield from stream
+            except GeneratorExit:
+                if not attempt.get("simulated"):
+                    health.record_cancelled()
+                raise
+            except Exception:
+                health.record_failure()
+                raise
+            if not attempt.get("simulated"):
+                health.record_success()
+            return
+        raise last_error or RuntimeError(self._unavailable(models)["error"])
+
+    def stats(self) -> Dict[str, Any]:
+        """Santé de chaque modèle routé et compteurs de hedging / bascule"""
+        with self._lock:
+            models = dict(self._health)
+        return {
+            "hedged_requests": self.hedged,
+            "failovers": self.failovers,
+            "models": {name: health.stats() for name, health in models.items()}
+        }
+
+
+def create_model_router(get_provider: Callable[[str], Any]) -> ModelRouter:
+    """Crée le routeur configuré par AI_HEDGE_DELAY (auto, 0 ou secondes) et AI_BREAKER_*"""
+    hedge = os.getenv('AI_HEDGE_DELAY', 'auto').lower()
+    return ModelRouter(
+        get_provider,
+        hedge_delay=None if hedge == 'auto' else float(hedge),
+        max_hedges=int(os.getenv('AI_MAX_HEDGES', 1)),
+        failure_threshold=int(os.getenv('AI_BREAKER_FAILURES', DEFAULT_FAILURE_THRESHOLD)),
+        error_rate_threshold=float(os.getenv('AI_BREAKER_ERROR_RATE', DEFAULT_ERROR_RATE_THRESHOLD)),
+        cooldown=float(os.getenv('AI_BREAKER_COOLDOWN', DEFAULT_BREAKER_COOLDOWN)),
+        window=int(os.getenv('AI_LATENCY_WINDOW', DEFAULT_LATENCY_WINDOW))
+    )
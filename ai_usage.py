@@ -0,0 +1,154 @@
+"""
+🪙 Comptabilité des tokens
+Normalise l'usage renvoyé par chaque fournisseur (tokens du prompt et de la
+réponse), l'estime localement quand le fournisseur ne le donne pas, et
+calcule le coût de chaque exécution.
+"""
+
+import os
+import json
+import math
+from functools import lru_cache
+from typing import Dict, Any, Iterable, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Prix publics en dollars par million de tokens (entrée, sortie), surchargés par AI_MODEL_PRICING
+MODEL_PRICING: Dict[str, Tuple[float, float]] = {
+    "GPT-4": (30.0, 60.0),
+    "GPT-3.5-turbo": (0.5, 1.5),
+    "Claude-3": (3.0, 15.0),
+    "Gemini Pro": (0.5, 1.5),
+    "Groq": (0.05, 0.08),
+    "Grok Beta": (5.0, 15.0),
+    "Llama 2": (0.0, 0.0),
+}
+
+# Noms de champs d'usage selon les fournisseurs : OpenAI/Groq/Grok, Anthropic, Gemini
+PROMPT_FIELDS = ("prompt_tokens", "input_tokens", "prompt_token_count")
+COMPLETION_FIELDS = ("completion_tokens", "output_tokens", "candidates_token_count")
+TOTAL_FIELDS = ("total_tokens", "total_token_count")
+
+
+@lru_cache(maxsize=1)
+def _tiktoken_encoding():
+    """Encodeur tiktoken (cl100k_base) si le paquet est installé, sinon None"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # paquet absent ou vocabulaire non téléchargeable
+        return None
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """Compte les tokens d'un texte : tiktoken si disponible, sinon estimation rapide
+
+    L'estimation retient le maximum entre le nombre de mots et un token
+    pour 4 caractères, ce qui reste proche des tokenizers BPE en français.
+    """
+    if not text:
+        return 0
+    encoding = _tiktoken_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(len(text.split()), math.ceil(len(text) / 4))
+
+
+def _field(usage: Any, names: Tuple[str, ...]) -> Optional[int]:
+    for name in names:
+        value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+        if isinstance(value, (int, float)):
+            return int(value)
+    return None
+
+
+def normalize_usage(usage: Any, prompt_text: str = "", completion_text: str = "") -> Dict[str, Any]:
+    """Usage uniforme {prompt_tokens, completion_tokens, total_tokens, estimated}
+
+    `usage` peut être le dictionnaire ou l'objet renvoyé par le SDK ; les
+    valeurs absentes sont estimées à partir des textes.
+    """
+    prompt_tokens = _field(usage, PROMPT_FIELDS) if usage is not None else None
+    completion_tokens = _field(usage, COMPLETION_FIELDS) if usage is not None else None
+    total_tokens = _field(usage, TOTAL_FIELDS) if usage is not None else None
+    estimated = False
+
+    if prompt_tokens is None and completion_tokens is None and total_tokens is not None:
+        # Seul le total est connu : la réponse est comptée localement, le prompt par différence
+        completion_tokens = min(total_tokens, count_tokens(completion_text))
+        prompt_tokens = total_tokens - completion_tokens
+        estimated = True
+    if prompt_tokens is None:
+        prompt_tokens = count_tokens(prompt_text)
+        estimated = True
+    if completion_tokens is None:
+        completion_tokens = count_tokens(completion_text)
+        estimated = True
+
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "estimated": estimated
+    }
+
+
+def sum_usage(usages: Iterable[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Additionne des usages normalisés (plusieurs appels pour une même exécution)"""
+    total = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "estimated": False}
+    for usage in usages:
+        if not usage:
+            continue
+        for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            total[field] += usage.get(field) or 0
+        total["estimated"] = total["estimated"] or bool(usage.get("estimated"))
+    return total
+
+
+@lru_cache(maxsize=1)
+def get_pricing() -> Dict[str, Tuple[float, float]]:
+    """Grille tarifaire ; AI_MODEL_PRICING='{"GPT-4": [30, 60]}' ajoute ou remplace des modèles"""
+    pricing = dict(MODEL_PRICING)
+    override = os.getenv('AI_MODEL_PRICING')
+    if override:
+        try:
+            pricing.update({model: tuple(prices) for model, prices in json.loads(override).items()})
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.error(f"AI_MODEL_PRICING invalide, grille par défaut utilisée: {e}")
+    return pricing
+
+
+def estimate_cost(model: Optional[str], usage: Dict[str, Any]) -> Optional[float]:
+    """Coût en dollars d'un usage normalisé (None si le modèle n'a pas de tarif)"""
+    prices = get_pricing().get(model)
+    if prices is None:
+        return None
+    input_price, output_price = prices
+    cost = (usage["prompt_tokens"] * input_price + usage["completion_tokens"] * output_price) / 1_000_000
+    return round(cost, 8)
+
+
+def account_result(result: Dict[str, Any], model: Optional[str], prompt_text: str) -> Dict[str, Any]:
+    """Ajoute à un résultat de fournisseur l'usage normalisé, le modèle et le coût
+
+    Une réponse servie par le cache ou simulée ne coûte rien.
+    """
+    if not result.get("success"):
+        return result
+    usage = normalize_usage(result.get("usage"), prompt_text, result.get("response") or "")
+    free = result.get("cached") or "note" in result
+    return dict(result, usage=usage, model_name=model, cost=0.0 if free else estimate_cost(model, usage))
+
+
+def usage_columns(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Colonnes de la table executions à partir d'un résultat comptabilisé"""
+    usage = result.get("usage") if isinstance(result.get("usage"), dict) else {}
+    return {
+        "model": result.get("model_name"),
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "completion_tokens": usage.get("completion_tokens"),
+        "total_tokens": usage.get("total_tokens"),
+        "cost": result.get("cost"),
+        "tokens_estimated": int(bool(usage.get("estimated"))) if usage else None
+    }
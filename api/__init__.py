@@ -1,9 +1,12 @@
 # 🌐 Module API REST
 # API REST professionnelle avec FastAPI
 
-from .rest_api import app
-
 __all__ = ['app']
 
 
-
+def __getattr__(name):
+    # Import différé : les sous-modules (ex: api.rate_limit) s'importent sans démarrer l'API
+    if name == 'app':
+        from .rest_api import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -9,6 +9,7 @@ from auth.authentication import auth_manager
 from models.user import User
 from models.agent import Agent
 from config.database import db_config
+from api.rate_limit import RateLimitMiddleware, throttling_stats
 import logging
 
 # Configuration du logging
@@ -24,6 +25,11 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Limitation de débit (par IP, utilisateur et route ; budget partagé entre workers)
+# Ajoutée avant CORS pour que les réponses 429 portent aussi les en-têtes CORS ;
+# les utilisateurs sont mis en cache par jti, pas par token brut
+app.add_middleware(RateLimitMiddleware, principal_key=auth_manager.cache_key)
+
 # Configuration CORS
 app.add_middleware(
     CORSMiddleware,
@@ -54,6 +60,10 @@ class AgentCreate(BaseModel):
     model: str
     system_prompt: str
 
+class UserStatusUpdate(BaseModel):
+    is_active: Optional[bool] = None
+    is_admin: Optional[bool] = None
+
 class AgentResponse(BaseModel):
     id: int
     name: str
@@ -65,29 +75,23 @@ class AgentResponse(BaseModel):
 
 # Dépendances
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Vérifie le token et retourne l'utilisateur"""
-    try:
-        payload = User.verify_token(credentials.credentials)
-        if not payload:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token invalide ou expiré"
-            )
-        
-        with db_config.get_session() as session:
-            user = session.query(User).filter(User.id == payload['user_id']).first()
-            if not user:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Utilisateur non trouvé"
-                )
-            return user
-    except Exception as e:
-        logger.error(f"❌ Erreur d'authentification: {e}")
+    """Vérifie le token et retourne l'utilisateur (mis en cache par jti, sans requête en base)"""
+    user = auth_manager.get_principal(credentials.credentials)
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Erreur d'authentification"
+            detail="Token invalide, expiré ou révoqué"
         )
+    return user
+
+def require_admin(current_user: User = Depends(get_current_user)):
+    """Réservé aux administrateurs"""
+    if not getattr(current_user, "is_admin", False):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Droits administrateur requis"
+        )
+    return current_user
 
 # Routes d'authentification
 @app.post("/auth/register", response_model=dict)
@@ -158,6 +162,27 @@ async def login_user(user_data: UserLogin):
             detail="Erreur interne du serveur"
         )
 
+@app.post("/auth/logout", response_model=dict)
+async def logout_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: User = Depends(get_current_user)
+):
+    """Révoque le token courant"""
+    auth_manager.revoke_token(credentials.credentials)
+    logger.info(f"✅ Utilisateur {current_user.username} déconnecté")
+    return {"message": "Déconnexion réussie"}
+
+@app.patch("/users/{user_id}", response_model=dict)
+async def update_user_status(user_id: int, update: UserStatusUpdate, admin: User = Depends(require_admin)):
+    """Active/désactive un utilisateur ou change ses droits (ses tokens en cache sont invalidés)"""
+    if not auth_manager.update_user_status(user_id, is_active=update.is_active, is_admin=update.is_admin):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Utilisateur introuvable"
+        )
+    logger.info(f"✅ Utilisateur {user_id} mis à jour par {admin.username}")
+    return {"message": "Utilisateur mis à jour"}
+
 # Routes des agents
 @app.get("/agents", response_model=List[AgentResponse])
 async def get_agents(current_user: User = Depends(get_current_user)):
@@ -203,6 +228,11 @@ async def create_agent(
             detail="Erreur interne du serveur"
         )
 
+@app.get("/metrics/throttling")
+async def get_throttling_metrics(admin: User = Depends(require_admin)):
+    """Compteurs de limitation de débit (requêtes autorisées et refusées par règle)"""
+    return {"workers": throttling_stats()}
+
 # Route de santé
 @app.get("/health")
 async def health_check():
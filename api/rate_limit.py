@@ -0,0 +1,327 @@
+# 🚦 Limitation de Débit
+# Seaux à jetons par IP, par utilisateur et par route, partagés entre workers uvicorn
+import os
+import json
+import asyncio
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Any, Optional, Tuple, Callable
+import logging
+
+from auth.principal_cache import principal_cache
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# /dev/shm est un tmpfs : le fichier SQLite partagé y reste en mémoire
+DEFAULT_SHARED_PATH = ("/dev/shm/ai_platform_rate_limits.db" if os.path.isdir("/dev/shm")
+                       else "data/rate_limits.db")
+
+# Attente maximale du verrou SQLite partagé : au-delà, la requête passe sans être comptée
+DEFAULT_LOCK_TIMEOUT = 0.1
+# Purge des seaux inactifs (un seau inactif assez longtemps est plein : le supprimer ne change rien)
+DEFAULT_PURGE_INTERVAL = 300
+DEFAULT_MAX_IDLE = 3600
+
+
+class RateLimitBackend:
+    """Classe de base du stockage des seaux à jetons"""
+
+    # Un acquire bloquant (verrou inter-processus) est exécuté hors de la boucle asyncio
+    blocking = False
+
+    def acquire(self, key: str, capacity: float, refill_rate: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """Consomme `cost` jetons du seau `key`
+
+        Retourne (autorisé, secondes avant qu'assez de jetons soient disponibles).
+        """
+        raise NotImplementedError("Cette méthode doit être implémentée par les sous-classes")
+
+    def purge_idle(self, max_idle: float = DEFAULT_MAX_IDLE) -> int:
+        """Supprime les seaux inutilisés depuis `max_idle` secondes ; retourne leur nombre"""
+        return 0
+
+    @staticmethod
+    def _refill(tokens: float, updated_at: float, now: float, capacity: float, refill_rate: float) -> float:
+        return min(capacity, tokens + (now - updated_at) * refill_rate)
+
+    @staticmethod
+    def _decide(tokens: float, capacity: float, refill_rate: float, cost: float) -> Tuple[bool, float, float]:
+        if tokens >= cost:
+            return True, tokens - cost, 0.0
+        wait = (cost - tokens) / refill_rate if refill_rate > 0 else float("inf")
+        return False, tokens, wait
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Seaux en mémoire (un seul processus)"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, capacity: float, refill_rate: float, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = self._refill(tokens, updated_at, now, capacity, refill_rate)
+            allowed, tokens, wait = self._decide(tokens, capacity, refill_rate, cost)
+            self._buckets[key] = (tokens, now)
+        return allowed, wait
+
+    def purge_idle(self, max_idle: float = DEFAULT_MAX_IDLE) -> int:
+        threshold = time.monotonic() - max_idle
+        with self._lock:
+            idle = [key for key, (_, updated_at) in self._buckets.items() if updated_at < threshold]
+            for key in idle:
+                del self._buckets[key]
+        return len(idle)
+
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """Seaux dans un fichier SQLite partagé : un budget global pour tous les workers de la machine"""
+
+    blocking = True
+
+    def __init__(self, db_path: str = DEFAULT_SHARED_PATH, lock_timeout: float = DEFAULT_LOCK_TIMEOUT):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        # isolation_level=None : transactions explicites (BEGIN IMMEDIATE) pour un lire-modifier-écrire atomique
+        # Attente du verrou courte : mieux vaut laisser passer une requête que bloquer un worker
+        self._conn = sqlite3.connect(db_path, timeout=lock_timeout, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")  # état éphémère : aucune durabilité requise
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def acquire(self, key: str, capacity: float, refill_rate: float, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.time()  # horloge murale : partagée entre processus
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens = self._refill(*row, now, capacity, refill_rate) if row else capacity
+                allowed, tokens, wait = self._decide(tokens, capacity, refill_rate, cost)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                    (key, tokens, now)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return allowed, wait
+
+    def purge_idle(self, max_idle: float = DEFAULT_MAX_IDLE) -> int:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM rate_limit_buckets WHERE updated_at < ?",
+                                        (time.time() - max_idle,))
+            return cursor.rowcount
+
+
+class RateLimitRule:
+    """Règle de limitation : un seau par clé (IP, utilisateur ou route) pour les chemins ciblés"""
+
+    SCOPES = ("ip", "user", "route")
+
+    def __init__(self, name: str, scope: str, capacity: float, per_minute: float,
+                 path_prefixes: Tuple[str, ...] = ("/",), methods: Optional[Tuple[str, ...]] = None):
+        if scope not in self.SCOPES:
+            raise ValueError(f"Portée de limitation inconnue: {scope}")
+        self.name = name
+        self.scope = scope
+        self.capacity = capacity
+        self.refill_rate = per_minute / 60.0
+        self.path_prefixes = path_prefixes
+        self.methods = methods
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.methods and method not in self.methods:
+            return False
+        return any(path.startswith(prefix) for prefix in self.path_prefixes)
+
+
+def _env_number(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def default_rules() -> List[RateLimitRule]:
+    """Règles par défaut, ajustables par variables d'environnement"""
+    return [
+        # Connexions : protège le pool bcrypt contre les rafales et le bourrage d'identifiants
+        RateLimitRule("login_ip", "ip", _env_number("RATE_LIMIT_LOGIN_BURST", 10),
+                      _env_number("RATE_LIMIT_LOGIN_PER_MINUTE", 20),
+                      ("/auth/login", "/auth/register"), ("POST",)),
+        # Garde-fou général par IP, vérifié avant les budgets partagés
+        RateLimitRule("global_ip", "ip", _env_number("RATE_LIMIT_IP_BURST", 200),
+                      _env_number("RATE_LIMIT_IP_PER_MINUTE", 1200)),
+        # Exécutions : budget par utilisateur et budget global de la route (quotas des fournisseurs)
+        RateLimitRule("execute_user", "user", _env_number("RATE_LIMIT_EXECUTE_BURST", 20),
+                      _env_number("RATE_LIMIT_EXECUTE_PER_MINUTE", 60), ("/execute",), ("POST",)),
+        RateLimitRule("execute_route", "route", _env_number("RATE_LIMIT_EXECUTE_ROUTE_BURST", 100),
+                      _env_number("RATE_LIMIT_EXECUTE_ROUTE_PER_MINUTE", 600), ("/execute",), ("POST",))
+    ]
+
+
+def create_rate_limit_backend(backend: Optional[str] = None) -> RateLimitBackend:
+    """Crée le stockage configuré par RATE_LIMIT_BACKEND (shared ou memory)"""
+    backend = (backend or os.getenv('RATE_LIMIT_BACKEND', 'shared')).lower()
+    if backend == 'memory':
+        return MemoryRateLimitBackend()
+    if backend != 'shared':
+        logger.warning(f"Backend de limitation inconnu '{backend}', utilisation du fichier partagé")
+    return SQLiteRateLimitBackend(os.getenv('RATE_LIMIT_DB_PATH', DEFAULT_SHARED_PATH),
+                                  float(os.getenv('RATE_LIMIT_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT)))
+
+
+class RateLimitMiddleware:
+    """Middleware ASGI d'admission : 429 + Retry-After quand un seau est vide
+
+    Les compteurs (autorisées / refusées par règle) sont propres au processus ;
+    les seaux eux-mêmes sont partagés si le backend l'est.
+    """
+
+    instances: List["RateLimitMiddleware"] = []
+
+    def __init__(self, app, rules: Optional[List[RateLimitRule]] = None,
+                 backend: Optional[RateLimitBackend] = None, trust_proxy: Optional[bool] = None,
+                 principal_key: Optional[Callable[[str], Optional[str]]] = None):
+        self.app = app
+        # Clé du cache des utilisateurs pour un token : le token lui-même (sessions) ou son jti (JWT)
+        self.principal_key = principal_key or (lambda token: token)
+        self.rules = rules if rules is not None else default_rules()
+        self.backend = backend or create_rate_limit_backend()
+        # X-Forwarded-For n'est fiable que derrière un proxy qui le réécrit
+        self.trust_proxy = (trust_proxy if trust_proxy is not None
+                            else os.getenv('RATE_LIMIT_TRUST_PROXY', 'false').lower() == 'true')
+        self.counters = {rule.name: {"allowed": 0, "throttled": 0} for rule in self.rules}
+        self.errors = 0
+        self.purge_interval = float(os.getenv('RATE_LIMIT_PURGE_INTERVAL', DEFAULT_PURGE_INTERVAL))
+        self.max_idle = float(os.getenv('RATE_LIMIT_MAX_IDLE', DEFAULT_MAX_IDLE))
+        self._next_purge = time.monotonic() + self.purge_interval
+        self.purged = 0
+        RateLimitMiddleware.instances.append(self)
+
+    def _client_ip(self, scope) -> str:
+        if self.trust_proxy:
+            for name, value in scope.get("headers", ()):
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def _user_key(self, scope) -> Optional[str]:
+        """Identifie l'utilisateur par le cache des tokens déjà validés (sans requête en base)
+
+        Un token inconnu ou invalide ne crée pas de seau : il est limité par IP,
+        sinon chaque token fantaisiste disposerait d'un budget neuf.
+        """
+        for name, value in scope.get("headers", ()):
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() != "bearer" or not token.strip():
+                    return None
+                try:
+                    key = self.principal_key(token.strip())
+                except Exception:
+                    return None
+                principal = principal_cache.peek(key) if key else None
+                if isinstance(principal, dict):
+                    return principal.get("username")
+                return getattr(principal, "username", None)
+        return None
+
+    def _bucket_key(self, rule: RateLimitRule, scope) -> Optional[str]:
+        if rule.scope == "ip":
+            return f"{rule.name}:ip:{self._client_ip(scope)}"
+        if rule.scope == "user":
+            user = self._user_key(scope)
+            # Sans token reconnu (absent, invalide ou pas encore validé) : limite par IP
+            return f"{rule.name}:user:{user}" if user else f"{rule.name}:ip:{self._client_ip(scope)}"
+        return f"{rule.name}:route:{scope['path']}"
+
+    def _purge_if_due(self):
+        """Purge périodique des seaux inactifs (sinon le stockage croît avec chaque IP vue)"""
+        now = time.monotonic()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + self.purge_interval
+        try:
+            self.purged += self.backend.purge_idle(self.max_idle)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Erreur lors de la purge des seaux de limitation: {e}")
+
+    def check(self, scope) -> Tuple[bool, float, Optional[str]]:
+        """Applique toutes les règles concernées ; retourne (autorisé, Retry-After, règle bloquante)"""
+        self._purge_if_due()
+        method, path = scope.get("method", "GET"), scope["path"]
+        for rule in self.rules:
+            if not rule.matches(method, path):
+                continue
+            try:
+                allowed, wait = self.backend.acquire(self._bucket_key(rule, scope),
+                                                     rule.capacity, rule.refill_rate)
+            except Exception as e:
+                # Un incident du stockage ne doit pas rendre l'API indisponible
+                self.errors += 1
+                logger.error(f"Erreur de limitation de débit ({rule.name}): {e}")
+                continue
+            if not allowed:
+                self.counters[rule.name]["throttled"] += 1
+                return False, wait, rule.name
+            self.counters[rule.name]["allowed"] += 1
+        return True, 0.0, None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self.backend.blocking:
+            # Verrou du fichier partagé : la boucle d'événements continue de servir les autres requêtes
+            allowed, wait, rule_name = await asyncio.to_thread(self.check, scope)
+        else:
+            allowed, wait, rule_name = self.check(scope)
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = max(1, int(wait + 0.999))
+        body = json.dumps({
+            "detail": "Trop de requêtes, veuillez réessayer plus tard",
+            "rule": rule_name,
+            "retry_after": retry_after
+        }, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"retry-after", str(retry_after).encode("ascii")),
+                (b"content-length", str(len(body)).encode("ascii"))
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs de limitation du processus courant"""
+        return {"pid": os.getpid(), "rules": self.counters, "backend_errors": self.errors,
+                "purged_buckets": self.purged}
+
+
+def throttling_stats() -> List[Dict[str, Any]]:
+    """Compteurs de tous les middlewares de limitation du processus"""
+    return [middleware.stats() for middleware in RateLimitMiddleware.instances]
@@ -1,11 +1,16 @@
 # 🌐 API REST Professionnelle avec FastAPI
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import uvicorn
 import json
+import csv
+import io
+import time
+import asyncio
 import logging
 from datetime import datetime
 
@@ -15,7 +20,17 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database.db_manager import DatabaseManager
+from database.user_repository import UserRepository
 from auth.auth_manager import AuthManager
+from auth.principal_cache import principal_cache
+from api.rate_limit import RateLimitMiddleware, throttling_stats
+from ai_integration import get_orchestrator, peek_orchestrator, aclose_orchestrator, load_environment
+from ai_router import agent_models
+from ai_limits import limiter_stats
+from ai_usage import usage_columns
+
+# config.env est lu au démarrage ; l'orchestrateur IA n'est construit qu'à la première exécution
+load_environment()
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
@@ -30,6 +45,10 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Limitation de débit (par IP, utilisateur et route ; budget partagé entre workers)
+# Ajoutée avant CORS pour que les réponses 429 portent aussi les en-têtes CORS
+app.add_middleware(RateLimitMiddleware)
+
 # Middleware CORS
 app.add_middleware(
     CORSMiddleware,
@@ -39,15 +58,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Exécutions groupées : nombre de lignes écrites par transaction
+BATCH_WRITE_CHUNK_SIZE = 200
+
+# Historique : taille de page maximale et colonnes exportées
+HISTORY_MAX_PAGE_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+EXPORT_COLUMNS = [
+    "id", "agent_id", "workflow_id", "workflow_key", "status", "started_at", "completed_at",
+    "execution_time", "created_by", "model", "prompt_tokens", "completion_tokens", "total_tokens",
+    "cost", "input_data", "output_data", "metadata"
+]
+
 # Initialisation des gestionnaires
 db_manager = DatabaseManager()
-auth_manager = AuthManager()
+auth_manager = AuthManager(user_repository=UserRepository(db_manager))
 security = HTTPBearer()
 
 # Modèles Pydantic
 class UserCreate(BaseModel):
     username: str = Field(..., min_length=3, max_length=50)
-    email: str = Field(..., regex=r"^[^@]+@[^@]+\.[^@]+$")
+    email: str = Field(..., pattern=r"^[^@]+@[^@]+\.[^@]+$")
     password: str = Field(..., min_length=6)
     role: str = Field(default="user")
 
@@ -72,31 +103,59 @@ class ExecutionRequest(BaseModel):
     input_data: str
     workflow_id: Optional[int] = None
 
+class BatchExecutionRequest(BaseModel):
+    agent_id: int
+    inputs: List[str] = Field(..., min_length=1, max_length=10000)
+    workflow_id: Optional[int] = None
+    max_concurrency: int = Field(default=16, ge=1, le=256)
+
 # Dépendances
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
-    """Valide le token d'authentification et retourne l'utilisateur"""
+    """Valide le token d'authentification et retourne l'utilisateur
+    
+    La session est toujours relue dans le stockage partagé (lecture par clé) :
+    une déconnexion traitée par un autre worker est refusée aussitôt. Seul
+    l'utilisateur résolu (identifiant SQL) est mis en cache par session.
+    """
+    session_id = credentials.credentials
+    user = principal_cache.get(session_id)
+    
     try:
-        session_id = credentials.credentials
         session = auth_manager.validate_session(session_id)
-        if not session:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Session invalide ou expirée"
-            )
-        return session
     except Exception as e:
         logger.error(f"Erreur d'authentification: {e}")
+        session = None
+    if not session:
+        if user is not None:
+            principal_cache.invalidate(session_id)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token d'authentification invalide"
+            detail="Session invalide ou expirée"
         )
+    if user is not None:
+        return user
+    
+    user = dict(session, session_id=session_id, user_id=db_manager.get_user_id(session["username"]))
+    principal_cache.set(session_id, user, user_key=session["username"],
+                        expires_at=datetime.fromisoformat(session["expires_at"]).timestamp())
+    return user
+
+def _get_system_prompt(agent: Dict[str, Any]) -> str:
+    """Extrait le prompt système d'un agent (colonne dédiée ou configuration JSON)"""
+    if agent.get("system_prompt"):
+        return agent["system_prompt"]
+    try:
+        configuration = json.loads(agent.get("configuration") or "{}")
+    except (TypeError, ValueError):
+        configuration = {}
+    return configuration.get("system_prompt") or agent.get("description") or ""
 
 # Routes d'authentification
 @app.post("/auth/register", response_model=Dict[str, Any])
 async def register_user(user_data: UserCreate):
     """Enregistre un nouvel utilisateur"""
     try:
-        success = auth_manager.register_user(
+        success = await auth_manager.register_user_async(
             user_data.username,
             user_data.password,
             user_data.email,
@@ -125,14 +184,9 @@ async def register_user(user_data: UserCreate):
 async def login_user(user_data: UserLogin):
     """Authentifie un utilisateur"""
     try:
-        user = auth_manager.authenticate_user(user_data.username, user_data.password)
+        user = await auth_manager.authenticate_user_async(user_data.username, user_data.password)
         
         if user:
-            # Mettre à jour la base de données
-            user_id = db_manager.get_user_id(user_data.username)
-            if user_id:
-                db_manager.update_user_last_login(user_id)
-            
             return {
                 "success": True,
                 "message": "Connexion réussie",
@@ -194,7 +248,7 @@ async def create_agent(
 ):
     """Crée un nouvel agent"""
     try:
-        user_id = db_manager.get_user_id(current_user["username"])
+        user_id = current_user.get("user_id")
         if not user_id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -236,13 +290,20 @@ async def execute_agent(
 ):
     """Exécute un agent"""
     try:
-        user_id = db_manager.get_user_id(current_user["username"])
+        user_id = current_user.get("user_id")
         if not user_id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Utilisateur non trouvé"
             )
         
+        agent = db_manager.get_agent_by_id(execution_data.agent_id)
+        if not agent:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Agent non trouvé"
+            )
+        
         # Créer l'exécution
         execution_id = db_manager.insert_execution(
             execution_data.agent_id,
@@ -254,24 +315,43 @@ async def execute_agent(
         )
         
         if execution_id:
-            # Ici, tu peux ajouter la logique d'exécution réelle de l'agent
-            # Pour l'instant, on simule un résultat
-            simulated_output = f"Résultat simulé pour l'agent {execution_data.agent_id}"
+            # Appel non bloquant : la boucle d'événements reste libre pendant l'appel au fournisseur
+            started = time.perf_counter()
+            result = await get_orchestrator().process_request_async(
+                agent_models(agent),
+                _get_system_prompt(agent),
+                execution_data.input_data
+            )
+            elapsed = time.perf_counter() - started
             
-            # Mettre à jour le statut
-            db_manager.update_execution_status(execution_id, "completed", simulated_output)
+            if result.get("success"):
+                output = result["response"]
+                db_manager.update_execution_status(execution_id, "completed", output,
+                                                   usage=usage_columns(result), execution_time=elapsed)
+                return {
+                    "success": True,
+                    "message": "Exécution terminée avec succès",
+                    "execution_id": execution_id,
+                    "output": output,
+                    "usage": result.get("usage"),
+                    "cost": result.get("cost")
+                }
             
+            error = result.get("error", "Erreur inconnue")
+            db_manager.update_execution_status(execution_id, "failed", error, execution_time=elapsed)
             return {
-                "success": True,
-                "message": "Exécution terminée avec succès",
+                "success": False,
+                "message": "Échec de l'exécution",
                 "execution_id": execution_id,
-                "output": simulated_output
+                "error": error
             }
         else:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Erreur lors de la création de l'exécution"
             )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erreur lors de l'exécution: {e}")
         raise HTTPException(
@@ -279,6 +359,314 @@ async def execute_agent(
             detail="Erreur interne du serveur"
         )
 
+def _sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Formate un événement Server-Sent Events"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/execute/stream")
+async def execute_agent_stream(
+    execution_data: ExecutionRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Exécute un agent et diffuse les tokens au fil de l'eau (Server-Sent Events)"""
+    user_id = current_user.get("user_id")
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Utilisateur non trouvé"
+        )
+    
+    agent = db_manager.get_agent_by_id(execution_data.agent_id)
+    if not agent:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Agent non trouvé"
+        )
+    if not get_orchestrator().has_provider(agent_models(agent)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Modèle '{agent['model_type']}' non disponible"
+        )
+    
+    execution_id = db_manager.insert_execution(
+        execution_data.agent_id,
+        execution_data.input_data,
+        "",
+        "running",
+        user_id,
+        execution_data.workflow_id
+    )
+    if not execution_id:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erreur lors de la création de l'exécution"
+        )
+    
+    models, system_prompt = agent_models(agent), _get_system_prompt(agent)
+    
+    def event_stream():
+        # Générateur synchrone : Starlette l'itère dans son pool de threads
+        chunks = []
+        meta: Dict[str, Any] = {}
+        started = time.perf_counter()
+        try:
+            yield _sse_event({"execution_id": execution_id}, event="start")
+            for delta in get_orchestrator().stream_request(
+                models, system_prompt, execution_data.input_data, meta=meta
+            ):
+                chunks.append(delta)
+                yield _sse_event({"delta": delta})
+        except GeneratorExit:
+            # Client déconnecté en cours de diffusion
+            db_manager.update_execution_status(execution_id, "cancelled", "".join(chunks) or None)
+            raise
+        except Exception as e:
+            logger.error(f"Erreur lors de l'exécution en streaming: {e}")
+            db_manager.update_execution_status(execution_id, "failed", str(e))
+            yield _sse_event({"execution_id": execution_id, "error": str(e)}, event="error")
+            return
+        
+        output = "".join(chunks)
+        # Les flux ne renvoient pas de comptage : usage estimé localement
+        usage = get_orchestrator().stream_usage(models, system_prompt, execution_data.input_data, output,
+                                                meta=meta)
+        db_manager.update_execution_status(execution_id, "completed", output, usage=usage_columns(usage),
+                                           execution_time=time.perf_counter() - started)
+        yield _sse_event({"execution_id": execution_id, "usage": usage["usage"], "cost": usage["cost"]},
+                         event="done")
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _persist_batch_rows(rows: List[Dict[str, Any]], counts: Dict[str, int]) -> Optional[str]:
+    """Enregistre des exécutions d'un lot ; retourne une ligne NDJSON d'erreur si certaines sont perdues
+
+    Les transactions validées forment un préfixe des lignes : seule la suite
+    est retentée, une fois, sans créer de doublons.
+    """
+    inserted = await asyncio.to_thread(db_manager.bulk_insert_executions, rows)
+    if inserted < len(rows):
+        logger.warning(f"Lot : {len(rows) - inserted} exécutions non enregistrées, nouvelle tentative")
+        inserted += await asyncio.to_thread(db_manager.bulk_insert_executions, rows[inserted:])
+    lost = len(rows) - inserted
+    if not lost:
+        return None
+    counts["unsaved"] += lost
+    logger.error(f"Lot : {lost} exécutions n'ont pas pu être enregistrées")
+    return json.dumps({"error": "Exécutions non enregistrées dans l'historique", "unsaved": lost},
+                      ensure_ascii=False) + "\n"
+
+@app.post("/execute/batch")
+async def execute_agent_batch(
+    batch_data: BatchExecutionRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Exécute un agent sur plusieurs entrées et diffuse les résultats en NDJSON"""
+    user_id = current_user.get("user_id")
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Utilisateur non trouvé"
+        )
+    
+    agent = db_manager.get_agent_by_id(batch_data.agent_id)
+    if not agent:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Agent non trouvé"
+        )
+    
+    system_prompt = _get_system_prompt(agent)
+    models = agent_models(agent)
+    semaphore = asyncio.Semaphore(batch_data.max_concurrency)
+    
+    async def run_one(index: int, input_data: str):
+        async with semaphore:
+            started = time.perf_counter()
+            result = await get_orchestrator().process_request_async(
+                models, system_prompt, input_data
+            )
+            return index, input_data, result, time.perf_counter() - started
+    
+    async def stream_results():
+        tasks = [asyncio.create_task(run_one(index, input_data))
+                 for index, input_data in enumerate(batch_data.inputs)]
+        pending_rows = []
+        counts = {"completed": 0, "failed": 0, "unsaved": 0}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, input_data, result, elapsed = await next_done
+                success = bool(result.get("success"))
+                execution_status = "completed" if success else "failed"
+                output = result.get("response") if success else result.get("error", "Erreur inconnue")
+                counts[execution_status] += 1
+                
+                pending_rows.append({
+                    "agent_id": batch_data.agent_id,
+                    "workflow_id": batch_data.workflow_id,
+                    "input_data": input_data,
+                    "output_data": output,
+                    "status": execution_status,
+                    "execution_time": elapsed,
+                    "created_by": user_id,
+                    **usage_columns(result)
+                })
+                if len(pending_rows) >= BATCH_WRITE_CHUNK_SIZE:
+                    error_line = await _persist_batch_rows(pending_rows, counts)
+                    pending_rows = []
+                    if error_line:
+                        yield error_line
+                
+                item = {"index": index, "status": execution_status, "execution_time": round(elapsed, 3),
+                        "total_tokens": (result.get("usage") or {}).get("total_tokens"), "cost": result.get("cost")}
+                item["output" if success else "error"] = output
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+            
+            if pending_rows:
+                error_line = await _persist_batch_rows(pending_rows, counts)
+                pending_rows = []
+                if error_line:
+                    yield error_line
+            
+            yield json.dumps({"done": True, "total": len(tasks), **counts}) + "\n"
+        finally:
+            # Client déconnecté : on annule le reste et on conserve ce qui est terminé
+            for task in tasks:
+                task.cancel()
+            if pending_rows:
+                await _persist_batch_rows(pending_rows, counts)
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+# Routes de l'historique des exécutions
+def _require_admin(current_user: Dict[str, Any]):
+    """Refuse la requête si l'utilisateur connecté n'est pas administrateur (rôle lu en base)"""
+    user = auth_manager.user_repository.get(current_user.get("username"))
+    if not user or user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Réservé aux administrateurs"
+        )
+
+def _history_filters(current_user: Dict[str, Any], agent_id: Optional[int], workflow_key: Optional[str],
+                     since: Optional[str], until: Optional[str]) -> Dict[str, Any]:
+    """Filtres de l'historique, limités aux exécutions de l'utilisateur connecté"""
+    user_id = current_user.get("user_id")
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Utilisateur non trouvé"
+        )
+    return {"created_by": user_id, "agent_id": agent_id, "workflow_key": workflow_key,
+            "since": since, "until": until}
+
+@app.get("/usage", response_model=Dict[str, Any])
+async def get_usage(
+    group_by: str = Query("model", pattern="^(agent|user|model|day)$"),
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    agent_id: Optional[int] = None,
+    all_users: bool = False,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Tokens, coût et débit (tokens/s) agrégés ; `all_users` est réservé aux administrateurs"""
+    filters = _history_filters(current_user, agent_id, None, since, until)
+    if all_users:
+        _require_admin(current_user)
+        filters["created_by"] = None
+    rows = await asyncio.to_thread(
+        db_manager.get_usage_summary, group_by, filters["since"], filters["until"],
+        filters["created_by"], filters["agent_id"]
+    )
+    totals = {
+        "executions": sum(row["executions"] for row in rows),
+        "total_tokens": sum(row["total_tokens"] or 0 for row in rows),
+        "cost": round(sum(row["cost"] or 0 for row in rows), 6)
+    }
+    return {"group_by": group_by, "groups": rows, "totals": totals}
+
+@app.get("/executions", response_model=Dict[str, Any])
+async def list_executions(
+    limit: int = Query(50, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    agent_id: Optional[int] = None,
+    workflow_key: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Historique paginé par curseur : passer `next_cursor` pour obtenir la page suivante"""
+    filters = _history_filters(current_user, agent_id, workflow_key, since, until)
+    try:
+        return await asyncio.to_thread(db_manager.get_executions_page, limit, cursor, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def _export_rows(filters: Dict[str, Any], export_format: str):
+    """Génère l'export ligne par ligne depuis un curseur SQLite (mémoire constante)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == "csv":
+        writer.writerow(EXPORT_COLUMNS)
+    
+    for execution in db_manager.iter_executions(batch_size=EXPORT_BATCH_SIZE, **filters):
+        if export_format == "ndjson":
+            yield json.dumps(execution, ensure_ascii=False, default=str) + "\n"
+            continue
+        execution["metadata"] = json.dumps(execution["metadata"], ensure_ascii=False)
+        writer.writerow([execution.get(column) for column in EXPORT_COLUMNS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@app.get("/executions/export")
+async def export_executions(
+    format: str = Query("ndjson", pattern="^(csv|ndjson)$"),
+    agent_id: Optional[int] = None,
+    workflow_key: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Exporte tout l'historique filtré en CSV ou NDJSON, diffusé au fil de la lecture"""
+    filters = _history_filters(current_user, agent_id, workflow_key, since, until)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"executions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    return StreamingResponse(
+        _export_rows(filters, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.on_event("shutdown")
+async def close_ai_clients():
+    """Ferme les pools de connexions des fournisseurs IA"""
+    await aclose_orchestrator()
+
+@app.get("/metrics/throttling")
+async def get_throttling_metrics(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Compteurs de limitation de débit (requêtes autorisées et refusées par règle), réservés aux administrateurs"""
+    _require_admin(current_user)
+    # Limiteurs déjà créés seulement : la lecture des métriques ne construit pas l'orchestrateur
+    return {"workers": throttling_stats(), "providers": limiter_stats()}
+
+@app.get("/metrics/routing")
+async def get_routing_metrics(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Latences p50/p95, taux d'erreur et état des disjoncteurs par modèle routé, réservés aux administrateurs"""
+    _require_admin(current_user)
+    orchestrator = peek_orchestrator()
+    # Aucun appel routé tant que l'orchestrateur n'est pas construit
+    if orchestrator is None:
+        return {"hedged_requests": 0, "failovers": 0, "models": {}}
+    return orchestrator.router_stats()
+
 # Route de santé
 @app.get("/health")
 async def health_check():
@@ -11,9 +11,11 @@ import base64
 # Import des nouveaux modules d'authentification et base de données
 from auth.auth_manager import AuthManager
 from database.db_manager import DatabaseManager
+from database.agent_repository import AgentRepository
+from database.user_repository import UserRepository
 from agents.email_agent import email_agent
 from agents.planner_agent import planner_agent
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Configuration de la page - DOIT être en premier !
 st.set_page_config(
@@ -23,9 +25,37 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialisation des gestionnaires
-auth_manager = AuthManager()
-db_manager = DatabaseManager()
+# Nombre d'exécutions affichées dans l'historique d'un workflow
+WORKFLOW_HISTORY_PAGE_SIZE = 20
+# Nombre d'utilisateurs affichés par page dans l'administration
+USERS_PAGE_SIZE = 200
+# Période couverte par le tableau de bord des tokens et coûts (jours)
+USAGE_WINDOW_DAYS = 30
+
+# Initialisation des gestionnaires (une seule fois par processus, pas à chaque rerun)
+@st.cache_resource
+def get_db_manager():
+    """Base partagée entre les reruns (un seul pool de connexions)"""
+    return DatabaseManager()
+
+@st.cache_resource
+def get_auth_manager():
+    """Authentification partagée entre les reruns (stockage des sessions, pool de hachage)"""
+    return AuthManager(user_repository=UserRepository(get_db_manager()))
+
+db_manager = get_db_manager()
+auth_manager = get_auth_manager()
+
+@st.cache_resource
+def get_agent_repository():
+    """Dépôt des agents partagé entre les reruns, avec import unique d'agents.json"""
+    repository = AgentRepository(get_db_manager())
+    if repository.count() == 0:
+        repository.import_from_json("agents.json")
+    repository.migrate_embedded_executions()
+    return repository
+
+agent_repository = get_agent_repository()
 
 # Import du module d'intégration IA
 try:
@@ -44,10 +74,7 @@ def generate_workflow_id():
 
 def load_agents():
     try:
-        if os.path.exists("agents.json"):
-            with open("agents.json", "r", encoding="utf-8") as f:
-                return json.load(f)
-        return []
+        return agent_repository.list_agents()
     except Exception as e:
         st.error(f"Erreur lors du chargement des agents: {e}")
         return []
@@ -64,7 +91,6 @@ def ensure_system_agents(agents_list):
             "system_prompt": "Agent système de planification (date/heure, week-ends, saisons, conditions).",
             "status": "active",
             "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "executions": [],
             "system": True
         },
         "email_agent_system": {
@@ -76,27 +102,17 @@ def ensure_system_agents(agents_list):
             "system_prompt": "Agent système d'envoi par email des résultats d'agents/workflows (config SMTP par utilisateur).",
             "status": "active",
             "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "executions": [],
             "system": True
         }
     }
     existing_ids = {a.get("id") for a in agents_list}
-    added = False
     for sys_id, agent in system_agents.items():
-        if sys_id not in existing_ids:
-            agents_list.append(agent)
-            added = True
-    if added:
-        save_agents(agents_list)
+        if sys_id not in existing_ids and agent_repository.create(agent):
+            created = agent_repository.get(sys_id)
+            if created:
+                agents_list.append(created)
     return agents_list
 
-def save_agents(agents):
-    try:
-        with open("agents.json", "w", encoding="utf-8") as f:
-            json.dump(agents, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        st.error(f"Erreur lors de la sauvegarde des agents: {e}")
-
 def load_models():
     try:
         if os.path.exists("models.json"):
@@ -118,12 +134,32 @@ def load_workflows():
     try:
         if os.path.exists("workflows.json"):
             with open("workflows.json", "r", encoding="utf-8") as f:
-                return json.load(f)
+                return migrate_workflow_executions(json.load(f))
         return []
     except Exception as e:
         st.error(f"Erreur lors du chargement des workflows: {e}")
         return []
 
+def migrate_workflow_executions(workflows):
+    """Déplace l'historique embarqué dans workflows.json vers la table executions"""
+    executions = [
+        {
+            "workflow_key": workflow["id"],
+            "status": record.get("status", "completed"),
+            "started_at": record.get("start_time"),
+            "metadata": record
+        }
+        for workflow in workflows
+        for record in workflow.get("executions", [])
+    ]
+    if any("executions" in workflow for workflow in workflows):
+        if db_manager.bulk_insert_executions(executions) != len(executions):
+            return workflows
+        for workflow in workflows:
+            workflow.pop("executions", None)
+        save_workflows(workflows)
+    return workflows
+
 def save_workflows(workflows):
     try:
         with open("workflows.json", "w", encoding="utf-8") as f:
@@ -510,7 +546,7 @@ def show_main_app():
             st.markdown(f"""
             <div class="metric-card">
                 <h3>📈 Exécutions</h3>
-                <h2 style="color: #ffc107;">{sum(len(agent.get('executions', [])) for agent in agents)}</h2>
+                <h2 style="color: #ffc107;">{db_manager.count_executions()}</h2>
                 <p>total</p>
             </div>
             """, unsafe_allow_html=True)
@@ -698,12 +734,10 @@ def show_main_app():
                                 "model": model,
                                 "system_prompt": system_prompt,
                                 "status": "active",
-                                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                "executions": []
+                                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                             }
                             
-                            agents.append(new_agent)
-                            save_agents(agents)
+                            agent_repository.create(new_agent)
                             st.success(f"✅ Agent '{name}' créé avec succès !")
                             st.session_state.show_create_form = False
                             st.rerun()
@@ -754,8 +788,7 @@ def show_main_app():
                         st.caption("Agent système non supprimable")
                     else:
                         if st.button(f"🗑️ Supprimer", key=f"delete_{agent['id']}"):
-                            agents.remove(agent)
-                            save_agents(agents)
+                            agent_repository.delete(agent['id'])
                             st.success(f"✅ Agent '{agent.get('name', 'N/A')}' supprimé avec succès !")
                             st.rerun()
 
@@ -796,14 +829,13 @@ def show_main_app():
                         col1, col2 = st.columns(2)
                         with col1:
                             if st.form_submit_button("💾 Sauvegarder", type="primary"):
-                                agent.update({
+                                agent_repository.update(agent['id'], {
                                     "name": edit_name,
                                     "domain": edit_domain,
                                     "type": edit_type,
                                     "status": edit_status,
                                     "system_prompt": edit_prompt
                                 })
-                                save_agents(agents)
                                 st.success("Agent mis à jour avec succès !")
                                 st.session_state.editing_agent = None
                                 st.rerun()
@@ -1038,8 +1070,7 @@ def show_main_app():
                                 "type": workflow_type,
                                 "steps": workflow_steps,
                                 "status": "active",
-                                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                "executions": []
+                                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                             }
                             
                             workflows.append(new_workflow)
@@ -1264,38 +1295,45 @@ def show_main_app():
                         "summary": results_summary
                     }
                     
-                    if 'executions' not in workflow:
-                        workflow['executions'] = []
-                    workflow['executions'].append(execution_record)
-                    save_workflows(workflows)
+                    db_manager.log_execution(
+                        workflow_key=workflow['id'],
+                        status=execution_record["status"],
+                        started_at=execution_record["start_time"],
+                        metadata=execution_record
+                    )
                     
                     # Réinitialiser l'état d'exécution
                     st.session_state.workflow_executing = False
                     
-                    # Afficher l'historique des exécutions
-                    if workflow.get('executions'):
+                    # Afficher l'historique des exécutions (page la plus récente uniquement)
+                    total_executions = db_manager.count_executions(workflow_key=workflow['id'])
+                    if total_executions:
                         st.markdown("### 📚 Historique des Exécutions")
                         
-                        # Créer un DataFrame de l'historique
+                        recent_executions = db_manager.get_executions(
+                            workflow_key=workflow['id'], limit=WORKFLOW_HISTORY_PAGE_SIZE
+                        )
                         history_data = []
-                        for exec_record in workflow.get('executions', []):
+                        for execution in recent_executions:
+                            exec_record = execution["metadata"]
                             history_data.append({
                                 "ID": exec_record.get('id', 'N/A'),
-                                "Date": exec_record.get('start_time', 'N/A'),
-                                "Statut": exec_record.get('status', 'N/A'),
+                                "Date": exec_record.get('start_time', execution.get('started_at', 'N/A')),
+                                "Statut": execution.get('status', 'N/A'),
                                 "Étapes": len(exec_record.get('summary', []))
                             })
                         
                         if history_data:
                             history_df = pd.DataFrame(history_data)
                             st.dataframe(history_df, use_container_width=True)
+                            if total_executions > len(history_data):
+                                st.caption(f"{len(history_data)} exécutions les plus récentes sur {total_executions}")
                             
                             # Bouton pour voir les détails de la dernière exécution
                             if st.button(" Voir Détails de la Dernière Exécution", key="view_last_exec"):
                                 st.markdown("###  Détails de la Dernière Exécution")
-                                executions = workflow.get('executions', [])
-                                if executions:
-                                    last_exec = executions[-1]
+                                if recent_executions:
+                                    last_exec = recent_executions[0]["metadata"]
                                     
                                     col1, col2 = st.columns(2)
                                     with col1:
@@ -1368,15 +1406,15 @@ def show_main_app():
             st.markdown("### 📊 Détails des Agents")
             
             # Créer un DataFrame pour les analyses
+            execution_counts = db_manager.count_executions_by_agent()
             agent_data = []
             for agent in agents:
-                executions = agent.get('executions', [])
                 agent_data.append({
                     'Nom': agent.get('name', 'N/A'),
                     'Domaine': agent.get('domain', 'N/A'),
                     'Type': agent.get('type', 'N/A'),
                     'Statut': agent.get('status', 'N/A'),
-                    'Exécutions': len(executions),
+                    'Exécutions': execution_counts.get(agent.get('db_id'), 0),
                     'Créé le': agent.get('created_at', 'N/A')
                 })
             
@@ -1387,7 +1425,7 @@ def show_main_app():
                 # Ajouter des colonnes calculées
                 st.markdown("### 📈 Métriques Avancées")
                 
-                total_executions = sum(len(agent.get('executions', [])) for agent in agents)
+                total_executions = sum(execution_counts.get(agent.get('db_id'), 0) for agent in agents)
                 avg_executions = total_executions / len(agents) if agents else 0
                 
                 col1, col2, col3 = st.columns(3)
@@ -1399,6 +1437,51 @@ def show_main_app():
                     st.metric("Agents Actifs", active_agents_count)
             else:
                 st.info("Aucune donnée disponible pour l'analyse")
+            
+            # Consommation de tokens et coûts (agrégés en SQL sur la table executions)
+            st.markdown(f"### 🪙 Tokens et Coûts ({USAGE_WINDOW_DAYS} derniers jours)")
+            usage_since = datetime.now() - timedelta(days=USAGE_WINDOW_DAYS)
+            usage_by_model = db_manager.get_usage_summary("model", since=usage_since)
+            
+            if usage_by_model:
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Tokens consommés", f"{sum(row['total_tokens'] or 0 for row in usage_by_model):,}")
+                with col2:
+                    st.metric("Coût estimé", f"${sum(row['cost'] or 0 for row in usage_by_model):.4f}")
+                with col3:
+                    st.metric("Exécutions comptabilisées", sum(row['executions'] for row in usage_by_model))
+                
+                st.dataframe(pd.DataFrame([{
+                    'Modèle': row['label'] or 'N/A',
+                    'Exécutions': row['executions'],
+                    'Tokens prompt': row['prompt_tokens'],
+                    'Tokens réponse': row['completion_tokens'],
+                    'Dont estimés': row['estimated_tokens'],
+                    'Coût ($)': row['cost'],
+                    'Tokens/s': round(row['tokens_per_second'], 1) if row['tokens_per_second'] else None
+                } for row in usage_by_model]), use_container_width=True)
+                
+                col1, col2 = st.columns(2)
+                with col1:
+                    usage_by_agent = db_manager.get_usage_summary("agent", since=usage_since)
+                    fig = px.bar(
+                        x=[row['label'] or f"#{row['key']}" for row in usage_by_agent],
+                        y=[row['cost'] for row in usage_by_agent],
+                        title="Coût par Agent ($)"
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
+                with col2:
+                    usage_by_day = sorted(db_manager.get_usage_summary("day", since=usage_since),
+                                          key=lambda row: row['key'])
+                    fig = px.line(
+                        x=[row['key'] for row in usage_by_day],
+                        y=[row['total_tokens'] for row in usage_by_day],
+                        title="Tokens par Jour"
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("Aucune consommation de tokens enregistrée sur la période")
         
         else:
             st.info("🤖 Aucun agent créé pour le moment. Les statistiques seront disponibles une fois que vous aurez créé des agents.")
@@ -1450,32 +1533,33 @@ def show_main_app():
                                 )
                                 
                                 if success:
-                                    # Ajouter à la base de données
-                                    user_id = db_manager.insert_user(
-                                        new_username,
-                                        new_email,
-                                        auth_manager.users[new_username]["password_hash"],
-                                        new_role
-                                    )
-                                    
-                                    if user_id:
-                                        st.success(f"✅ Utilisateur '{new_username}' créé avec succès ! (ID: {user_id})")
-                                    else:
-                                        st.warning(f"⚠️ Utilisateur créé dans l'auth mais erreur dans la base de données")
-                                    
+                                    user_id = db_manager.get_user_id(new_username)
+                                    st.success(f"✅ Utilisateur '{new_username}' créé avec succès ! (ID: {user_id})")
                                     st.rerun()
                                 else:
-                                    st.error("❌ Nom d'utilisateur déjà existant")
+                                    st.error("❌ Nom d'utilisateur ou email déjà existant")
                         else:
                             st.error("❌ Tous les champs sont obligatoires")
             
             # Liste des utilisateurs existants
             st.markdown("###  Utilisateurs Existants")
             
-            if auth_manager.users:
+            user_repository = auth_manager.user_repository
+            total_users = user_repository.count()
+            if total_users:
+                # Page d'utilisateurs (les comptes ne sont jamais tous chargés)
+                page_count = (total_users - 1) // USERS_PAGE_SIZE + 1
+                page = st.number_input("Page", min_value=1, max_value=page_count, value=1,
+                                       key="admin_users_page") if page_count > 1 else 1
+                page_users = {
+                    user["username"]: user
+                    for user in user_repository.list_users(limit=USERS_PAGE_SIZE,
+                                                           offset=(page - 1) * USERS_PAGE_SIZE)
+                }
+                
                 # Créer un DataFrame pour l'affichage
                 users_data = []
-                for username, user_data in auth_manager.users.items():
+                for username, user_data in page_users.items():
                     users_data.append({
                         "Nom d'utilisateur": username,
                         "Email": user_data.get('email', 'N/A'),
@@ -1487,18 +1571,20 @@ def show_main_app():
                 
                 users_df = pd.DataFrame(users_data)
                 st.dataframe(users_df, use_container_width=True)
+                if page_count > 1:
+                    st.caption(f"Page {page}/{page_count} — {total_users} utilisateurs")
                 
                 # Actions sur les utilisateurs
                 st.markdown("### 🎯 Actions sur les Utilisateurs")
                 
                 selected_user = st.selectbox(
                     "Sélectionner un utilisateur",
-                    options=list(auth_manager.users.keys()),
+                    options=list(page_users.keys()),
                     key="admin_user_selector"
                 )
                 
                 if selected_user and selected_user != st.session_state.current_user.get('username'):
-                    user_data = auth_manager.users[selected_user]
+                    user_data = page_users[selected_user]
                     
                     col1, col2, col3 = st.columns(3)
                     
@@ -1509,11 +1595,8 @@ def show_main_app():
                     with col2:
                         if st.button(" Désactiver", key=f"deactivate_{selected_user}"):
                             # Désactiver l'utilisateur
-                            if 'is_active' not in user_data:
-                                user_data['is_active'] = True
-                            
                             user_data['is_active'] = not user_data['is_active']
-                            auth_manager._save_users()
+                            auth_manager.update_user_profile(selected_user, is_active=user_data['is_active'])
                             
                             status = "activé" if user_data['is_active'] else "désactivé"
                             st.success(f"✅ Utilisateur '{selected_user}' {status} avec succès !")
@@ -1523,8 +1606,7 @@ def show_main_app():
                         if st.button("️ Supprimer", key=f"delete_user_{selected_user}"):
                             # Demander confirmation
                             if st.checkbox(f"Confirmer la suppression de '{selected_user}' ?", key=f"confirm_delete_{selected_user}"):
-                                del auth_manager.users[selected_user]
-                                auth_manager._save_users()
+                                auth_manager.delete_user(selected_user)
                                 st.success(f"✅ Utilisateur '{selected_user}' supprimé avec succès !")
                                 st.rerun()
                     
@@ -1542,8 +1624,7 @@ def show_main_app():
                         col1, col2 = st.columns(2)
                         with col1:
                             if st.button("💾 Sauvegarder", key=f"save_role_{selected_user}"):
-                                user_data['role'] = new_role
-                                auth_manager._save_users()
+                                auth_manager.update_user_profile(selected_user, role=new_role)
                                 st.success(f"✅ Rôle de '{selected_user}' modifié en '{new_role}' !")
                                 st.session_state.editing_user_role = None
                                 st.rerun()
@@ -1579,11 +1660,11 @@ def show_main_app():
             """)
             
             # Statistiques des permissions
-            if auth_manager.users:
-                admin_count = len([u for u in auth_manager.users.values() if u.get('role') == 'admin'])
-                user_count = len([u for u in auth_manager.users.values() if u.get('role') == 'user'])
-                active_count = len([u for u in auth_manager.users.values() if u.get('is_active', True)])
-                inactive_count = len([u for u in auth_manager.users.values() if not u.get('is_active', True)])
+            if auth_manager.user_repository.count():
+                admin_count = auth_manager.user_repository.count(role='admin')
+                user_count = auth_manager.user_repository.count(role='user')
+                active_count = auth_manager.user_repository.count(is_active=True)
+                inactive_count = auth_manager.user_repository.count(is_active=False)
                 
                 col1, col2, col3, col4 = st.columns(4)
                 
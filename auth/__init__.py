@@ -2,5 +2,6 @@
 # Gestionnaire d'authentification sécurisé
 
 from .auth_manager import AuthManager
+from .session_store import SessionStore, create_session_store
 
-__all__ = ['AuthManager']
+__all__ = ['AuthManager', 'SessionStore', 'create_session_store']
@@ -1,181 +1,216 @@
 # 🔐 Gestionnaire d'Authentification Professionnel
-import streamlit as st
-import bcrypt
 import json
 import os
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from itertools import islice
+from typing import Optional, Dict, Any, Iterable
 import logging
 
+from .session_store import SessionStore, create_session_store
+from .principal_cache import principal_cache
+from .password_hasher import PasswordHasher
+from database.user_repository import UserRepository
+
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SESSION_DURATION = timedelta(hours=24)
+
 class AuthManager:
     """Gestionnaire d'authentification professionnel et sécurisé"""
     
-    def __init__(self):
+    def __init__(self, session_store: Optional[SessionStore] = None,
+                 password_hasher: Optional[PasswordHasher] = None,
+                 user_repository: Optional[UserRepository] = None):
         self.users_file = "data/users.json"
         self.sessions_file = "data/sessions.json"
+        self.password_hasher = password_hasher or PasswordHasher()
         self._ensure_data_directory()
+        self.user_repository = user_repository or UserRepository()
         self._load_users()
-        self._load_sessions()
+        self.session_store = session_store or create_session_store()
+        self._migrate_legacy_sessions()
     
     def _ensure_data_directory(self):
         """Crée le répertoire de données s'il n'existe pas"""
         os.makedirs("data", exist_ok=True)
     
     def _load_users(self):
-        """Charge les utilisateurs depuis le fichier JSON"""
+        """Reprend une seule fois l'ancien fichier users.json, ou crée l'admin par défaut"""
         try:
             if os.path.exists(self.users_file):
-                with open(self.users_file, 'r', encoding='utf-8') as f:
-                    self.users = json.load(f)
-            else:
+                self._migrate_legacy_users()
+            elif self.user_repository.count() == 0:
                 # Créer un utilisateur admin par défaut
-                self.users = {
-                    "admin": {
-                        "username": "Triolo",
-                        "password_hash": self._hash_password("admin123"),
-                        "email": "admin@example.com",
-                        "role": "First2001@",
-                        "created_at": datetime.now().isoformat(),
-                        "last_login": None
-                    }
-                }
-                self._save_users()
+                self.user_repository.create("admin", "admin@example.com", self._hash_password("admin123"),
+                                            "First2001@")
         except Exception as e:
             logger.error(f"Erreur lors du chargement des utilisateurs: {e}")
-            self.users = {}
     
-    def _save_users(self):
-        """Sauvegarde les utilisateurs dans le fichier JSON"""
-        try:
-            with open(self.users_file, 'w', encoding='utf-8') as f:
-                json.dump(self.users, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"Erreur lors de la sauvegarde des utilisateurs: {e}")
+    def _migrate_legacy_users(self):
+        """Importe users.json ; le fichier n'est renommé que si tous ses comptes sont en base"""
+        with open(self.users_file, 'r', encoding='utf-8') as f:
+            usernames = list(json.load(f))
+        imported = self.user_repository.import_from_json(self.users_file)
+        if imported != len(usernames):
+            # Comptes déjà repris lors d'un démarrage précédent interrompu : seuls les absents manquent
+            missing = [username for username in usernames if not self.user_repository.exists(username)]
+            if missing:
+                logger.error(f"Import de {self.users_file} incomplet ({imported}/{len(usernames)} comptes, "
+                             f"manquants: {', '.join(missing[:10])}) : fichier conservé")
+                return
+        os.replace(self.users_file, self.users_file + ".migrated")
     
     def _hash_password(self, password: str) -> str:
         """Hash un mot de passe avec bcrypt"""
-        salt = bcrypt.gensalt()
-        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+        return self.password_hasher.hash(password)
     
     def verify_password(self, password: str, hashed: str) -> bool:
         """Vérifie un mot de passe"""
-        try:
-            return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
-        except Exception:
-            return False
+        return self.password_hasher.verify(password, hashed)
     
     def register_user(self, username: str, password: str, email: str, role: str = "user") -> bool:
         """Enregistre un nouvel utilisateur"""
-        if username in self.users:
+        if self.user_repository.exists(username):
+            return False
+        return self._create_user(username, self._hash_password(password), email, role)
+    
+    async def register_user_async(self, username: str, password: str, email: str, role: str = "user") -> bool:
+        """Enregistre un nouvel utilisateur, le hachage s'exécutant sur le pool de threads"""
+        if self.user_repository.exists(username):
             return False
+        password_hash = await self.password_hasher.hash_async(password)
+        return self._create_user(username, password_hash, email, role)
+    
+    def import_users(self, users: Iterable[Dict[str, Any]], chunk_size: int = 1000) -> int:
+        """Importe des comptes en masse (provisionnement)
         
-        self.users[username] = {
-            "username": username,
-            "password_hash": self._hash_password(password),
-            "email": email,
-            "role": role,
-            "created_at": datetime.now().isoformat(),
-            "last_login": None
-        }
-        self._save_users()
+        Chaque compte fournit soit `password_hash`, soit `password` (haché en
+        parallèle sur le pool). Les comptes existants sont ignorés ; l'écriture
+        se fait par transactions groupées. Retourne le nombre de comptes créés.
+        """
+        def hashed_users():
+            iterator = iter(users)
+            while True:
+                chunk = list(islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                to_hash = [user for user in chunk if not user.get("password_hash")]
+                for user, password_hash in zip(to_hash, self.password_hasher.hash_many(
+                        user["password"] for user in to_hash)):
+                    user["password_hash"] = password_hash
+                yield from chunk
+        
+        imported = self.user_repository.bulk_import(hashed_users(), chunk_size)
+        logger.info(f"{imported} utilisateurs importés")
+        return imported
+    
+    def _create_user(self, username: str, password_hash: str, email: str, role: str) -> bool:
+        # Les contraintes UNIQUE tranchent si le nom ou l'email a été pris entre-temps
+        if self.user_repository.create(username, email, password_hash, role) is None:
+            return False
         logger.info(f"Nouvel utilisateur enregistré: {username}")
         return True
     
     def authenticate_user(self, username: str, password: str) -> Optional[Dict[str, Any]]:
-        """Authentifie un utilisateur"""
-        if username not in self.users:
+        """Authentifie un utilisateur actif"""
+        user = self.user_repository.get(username)
+        if not user or not user["is_active"]:
             return None
         
-        user = self.users[username]
-        if self.verify_password(password, user["password_hash"]):
-            # Mettre à jour la dernière connexion
-            user["last_login"] = datetime.now().isoformat()
-            self._save_users()
-            
-            # Créer une session
-            session_id = self._create_session(username)
-            return {
-                "username": username,
-                "role": user["role"],
-                "session_id": session_id,
-                "user_data": user
-            }
-        return None
+        if not self.verify_password(password, user["password_hash"]):
+            return None
+        if self.password_hasher.needs_rehash(user["password_hash"]):
+            user["password_hash"] = self._hash_password(password)
+        return self._complete_login(user)
+    
+    async def authenticate_user_async(self, username: str, password: str) -> Optional[Dict[str, Any]]:
+        """Authentifie un utilisateur actif, bcrypt s'exécutant sur le pool de threads"""
+        user = self.user_repository.get(username)
+        if not user or not user["is_active"]:
+            return None
+        
+        if not await self.password_hasher.verify_async(password, user["password_hash"]):
+            return None
+        if self.password_hasher.needs_rehash(user["password_hash"]):
+            user["password_hash"] = await self.password_hasher.hash_async(password)
+        return self._complete_login(user)
+    
+    def _complete_login(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        """Met à jour la dernière connexion (et un éventuel nouveau hash) puis crée la session"""
+        user["last_login"] = datetime.now().isoformat()
+        self.user_repository.update(user["username"], {
+            "last_login": user["last_login"],
+            "password_hash": user["password_hash"]
+        })
+        
+        session_id = self._create_session(user["username"])
+        return {
+            "username": user["username"],
+            "role": user["role"],
+            "session_id": session_id,
+            "user_data": user
+        }
     
     def _create_session(self, username: str) -> str:
         """Crée une nouvelle session utilisateur"""
-        session_id = f"session_{username}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        now = datetime.now()
+        session_id = f"session_{username}_{now.strftime('%Y%m%d_%H%M%S')}"
+        expires_at = now + SESSION_DURATION
         session_data = {
             "username": username,
-            "created_at": datetime.now().isoformat(),
-            "expires_at": (datetime.now() + timedelta(hours=24)).isoformat()
+            "created_at": now.isoformat(),
+            "expires_at": expires_at.isoformat()
         }
         
-        if not hasattr(self, 'sessions'):
-            self.sessions = {}
-        
-        self.sessions[session_id] = session_data
-        self._save_sessions()
+        self.session_store.create(session_id, session_data, expires_at.timestamp())
         return session_id
     
-    def _load_sessions(self):
-        """Charge les sessions depuis le fichier JSON"""
+    def _migrate_legacy_sessions(self):
+        """Reprend une seule fois les sessions encore valides de l'ancien fichier JSON"""
+        if not os.path.exists(self.sessions_file):
+            return
         try:
-            if os.path.exists(self.sessions_file):
-                with open(self.sessions_file, 'r', encoding='utf-8') as f:
-                    self.sessions = json.load(f)
-            else:
-                self.sessions = {}
+            with open(self.sessions_file, 'r', encoding='utf-8') as f:
+                sessions = json.load(f)
+            now = datetime.now()
+            for session_id, session in sessions.items():
+                expires_at = datetime.fromisoformat(session["expires_at"])
+                if expires_at > now:
+                    self.session_store.create(session_id, session, expires_at.timestamp())
+            os.replace(self.sessions_file, self.sessions_file + ".migrated")
+            logger.info(f"Sessions migrées depuis {self.sessions_file}")
         except Exception as e:
-            logger.error(f"Erreur lors du chargement des sessions: {e}")
-            self.sessions = {}
-    
-    def _save_sessions(self):
-        """Sauvegarde les sessions dans le fichier JSON"""
-        try:
-            with open(self.sessions_file, 'w', encoding='utf-8') as f:
-                json.dump(self.sessions, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"Erreur lors de la sauvegarde des sessions: {e}")
+            logger.error(f"Erreur lors de la migration des sessions: {e}")
     
     def validate_session(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Valide une session utilisateur"""
-        if session_id not in self.sessions:
-            return None
-        
-        session = self.sessions[session_id]
-        expires_at = datetime.fromisoformat(session["expires_at"])
-        
-        if datetime.now() > expires_at:
-            # Session expirée, la supprimer
-            del self.sessions[session_id]
-            self._save_sessions()
-            return None
-        
-        return session
+        """Valide une session utilisateur (les sessions expirées ne sont jamais retournées)"""
+        return self.session_store.get(session_id)
     
     def logout_user(self, session_id: str):
         """Déconnecte un utilisateur"""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
-            self._save_sessions()
+        self.session_store.delete(session_id)
+        principal_cache.invalidate(session_id)
     
     def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
         """Récupère un utilisateur par son nom d'utilisateur"""
-        return self.users.get(username)
+        return self.user_repository.get(username)
     
     def update_user_profile(self, username: str, **kwargs) -> bool:
-        """Met à jour le profil d'un utilisateur"""
-        if username not in self.users:
+        """Met à jour le profil d'un utilisateur (email, rôle, activation)"""
+        if not self.user_repository.exists(username):
             return False
         
-        for key, value in kwargs.items():
-            if key in ["email", "role"] and key != "password_hash":
-                self.users[username][key] = value
-        
-        self._save_users()
-        return True
\ No newline at end of file
+        fields = {key: value for key, value in kwargs.items() if key in ["email", "role", "is_active"]}
+        if not self.user_repository.update(username, fields):
+            return False
+        principal_cache.invalidate_user(username)
+        return True
+    
+    def delete_user(self, username: str) -> bool:
+        """Supprime un utilisateur"""
+        if not self.user_repository.delete(username):
+            return False
+        principal_cache.invalidate_user(username)
+        return True
@@ -4,19 +4,36 @@ from functools import wraps
 import jwt
 import datetime
 import os
+import time
+import hashlib
+from types import SimpleNamespace
+from typing import Optional
 from models.user import User
 from config.database import db_config
+from .principal_cache import principal_cache
+from .session_store import SessionStore, create_session_store
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Préfixe des révocations de tokens dans le stockage des sessions (partagé entre workers)
+REVOKED_PREFIX = "revoked:"
+
 class AuthenticationManager:
     """Gestionnaire d'authentification centralisé"""
     
-    def __init__(self):
+    def __init__(self, session_store: Optional[SessionStore] = None):
         self.secret_key = os.getenv('JWT_SECRET_KEY', 'your-secret-key')
         self.algorithm = 'HS256'
         self.token_expiry = 3600  # 1 heure
+        self._session_store = session_store
+    
+    @property
+    def session_store(self) -> SessionStore:
+        """Stockage des révocations, lu par tous les workers (créé au premier usage)"""
+        if self._session_store is None:
+            self._session_store = create_session_store()
+        return self._session_store
     
     def login_user(self, username: str, password: str):
         """Authentifie un utilisateur et génère un token"""
@@ -50,6 +67,9 @@ class AuthenticationManager:
     
     def logout_user(self):
         """Déconnecte l'utilisateur"""
+        token = st.session_state.get('user_token')
+        if token:
+            self.revoke_token(token)
         for key in ['user_token', 'user_id', 'username', 'is_admin']:
             if key in st.session_state:
                 del st.session_state[key]
@@ -60,17 +80,99 @@ class AuthenticationManager:
         token = st.session_state.get('user_token')
         if not token:
             return None
+        return self.get_principal(token)
+    
+    @staticmethod
+    def _token_key(token: str, payload: dict) -> str:
+        """Clé de cache d'un token : son jti, ou son empreinte pour les anciens tokens"""
+        return payload.get('jti') or hashlib.sha256(token.encode('utf-8')).hexdigest()
+    
+    def get_principal(self, token: str):
+        """Retourne l'utilisateur d'un token JWT valide, sans requête en base s'il est en cache
+        
+        L'objet retourné est un instantané (attributs de User.to_dict), pas une
+        instance SQLAlchemy liée à une session.
+        """
+        payload = User.verify_token(token)
+        if not payload:
+            return None
+        
+        key = self._token_key(token, payload)
+        if self._is_revoked(key, payload):
+            return None
+        principal = principal_cache.get(key)
+        if principal is not None:
+            return principal
         
         try:
-            payload = User.verify_token(token)
-            if payload:
-                with db_config.get_session() as session:
-                    user = session.query(User).filter(User.id == payload['user_id']).first()
-                    return user
+            with db_config.get_session() as session:
+                user = session.query(User).filter(User.id == payload['user_id']).first()
+                if not user or not user.is_active:
+                    return None
+                principal = SimpleNamespace(**user.to_dict())
         except Exception as e:
             logger.error(f"❌ Erreur lors de la récupération de l'utilisateur: {e}")
+            return None
+        
+        principal_cache.set(key, principal, user_key=principal.id, expires_at=payload.get('exp'))
+        return principal
+    
+    def cache_key(self, token: str) -> Optional[str]:
+        """Clé de cache (jti) d'un token valide, ou None ; utilisée par le limiteur de débit"""
+        payload = User.verify_token(token)
+        return self._token_key(token, payload) if payload else None
+    
+    def _is_revoked(self, key: str, payload: dict) -> bool:
+        """Révocation connue de ce processus, sinon enregistrée par un autre worker"""
+        if principal_cache.is_revoked(key):
+            return True
+        try:
+            revoked = self.session_store.get(REVOKED_PREFIX + key) is not None
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la vérification de révocation: {e}")
+            return True
+        if revoked:
+            principal_cache.revoke(key, until=payload['exp'])
+        return revoked
+    
+    def revoke_token(self, token: str):
+        """Révoque un token jusqu'à son expiration, pour tous les workers"""
+        payload = User.verify_token(token)
+        if not payload:
+            return
+        key = self._token_key(token, payload)
+        principal_cache.revoke(key, until=payload['exp'])
+        try:
+            self.session_store.create(REVOKED_PREFIX + key, {"revoked_at": time.time()}, payload['exp'])
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de l'enregistrement de la révocation: {e}")
+    
+    def invalidate_user(self, user_id: int):
+        """À appeler après un changement de rôle ou une désactivation"""
+        principal_cache.invalidate_user(user_id)
+    
+    def update_user_status(self, user_id: int, is_active: Optional[bool] = None,
+                           is_admin: Optional[bool] = None) -> bool:
+        """Active/désactive un utilisateur ou change ses droits, puis retire ses entrées du cache
         
-        return None
+        Les autres workers prennent le changement en compte à l'expiration de leur
+        cache (PRINCIPAL_CACHE_TTL).
+        """
+        try:
+            with db_config.get_session() as session:
+                user = session.query(User).filter(User.id == user_id).first()
+                if not user:
+                    return False
+                if is_active is not None:
+                    user.is_active = is_active
+                if is_admin is not None:
+                    user.is_admin = is_admin
+                session.commit()
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la mise à jour de l'utilisateur: {e}")
+            return False
+        self.invalidate_user(user_id)
+        return True
     
     def require_auth(self, func):
         """Décorateur pour protéger les pages"""
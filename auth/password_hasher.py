@@ -0,0 +1,64 @@
+# 🔑 Hachage des Mots de Passe
+# bcrypt exécuté sur un pool de threads borné, coût configurable
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
+import logging
+
+import bcrypt
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROUNDS = 12
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+
+class PasswordHasher:
+    """Hachage et vérification bcrypt hors de la boucle d'événements
+
+    bcrypt libère le GIL pendant le calcul : un pool de threads suffit, et sa
+    taille plafonne le nombre de hachages simultanés lors des pics de connexions.
+    """
+
+    def __init__(self, rounds: Optional[int] = None, max_workers: Optional[int] = None):
+        self.rounds = rounds or int(os.getenv('BCRYPT_ROUNDS', DEFAULT_ROUNDS))
+        workers = max_workers or int(os.getenv('PASSWORD_HASH_WORKERS', DEFAULT_WORKERS))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hasher")
+
+    def hash(self, password: str) -> str:
+        """Hash un mot de passe avec le coût configuré"""
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+    def verify(self, password: str, hashed: str) -> bool:
+        """Vérifie un mot de passe"""
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+        except Exception:
+            return False
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """Indique si le hash a été calculé avec un autre coût que celui configuré"""
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    async def hash_async(self, password: str) -> str:
+        """Hash un mot de passe sur le pool, sans bloquer la boucle d'événements"""
+        return await asyncio.wrap_future(self._executor.submit(self.hash, password))
+
+    async def verify_async(self, password: str, hashed: str) -> bool:
+        """Vérifie un mot de passe sur le pool, sans bloquer la boucle d'événements"""
+        return await asyncio.wrap_future(self._executor.submit(self.verify, password, hashed))
+
+    def hash_many(self, passwords: Iterable[str]) -> Iterator[str]:
+        """Hash une série de mots de passe en parallèle sur le pool (ordre conservé)"""
+        return self._executor.map(self.hash, passwords)
+
+    def shutdown(self):
+        """Arrête le pool de threads"""
+        self._executor.shutdown(wait=False)
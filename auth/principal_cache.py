@@ -0,0 +1,139 @@
+# 🪪 Cache des Utilisateurs Authentifiés
+# Évite une requête en base par appel authentifié (clé : jti du token ou identifiant de session)
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Set
+import logging
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 60  # secondes : borne le délai de prise en compte d'un changement fait par un autre processus
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class PrincipalCache:
+    """Cache LRU borné avec TTL des utilisateurs authentifiés
+
+    Chaque entrée est rattachée à un utilisateur pour pouvoir invalider
+    toutes ses entrées d'un coup (changement de rôle, désactivation).
+    Les tokens révoqués (déconnexion JWT) restent refusés jusqu'à leur expiration.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._keys_by_user: Dict[Any, Set[str]] = {}
+        self._revoked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Retourne l'utilisateur en cache, ou None si absent, expiré ou révoqué"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, _, principal = entry
+            if time.time() > expires_at:
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return principal
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Comme get, sans toucher aux statistiques ni à l'ordre LRU (lecture par le limiteur de débit)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() > entry[0]:
+                return None
+            return entry[2]
+
+    def set(self, key: str, principal: Any, user_key: Any, expires_at: Optional[float] = None):
+        """Met en cache un utilisateur, au plus jusqu'à l'expiration de son token"""
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            if key in self._revoked:
+                return
+            self._remove(key)
+            self._entries[key] = (deadline, user_key, principal)
+            self._keys_by_user.setdefault(user_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, key: str):
+        """Retire une entrée (déconnexion d'une session)"""
+        with self._lock:
+            self._remove(key)
+
+    def invalidate_user(self, user_key: Any):
+        """Retire toutes les entrées d'un utilisateur (changement de rôle, désactivation)"""
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_key, ())):
+                self._remove(key)
+
+    def revoke(self, key: str, until: float):
+        """Refuse un token jusqu'à son expiration (les JWT restent valides sans état serveur)"""
+        now = time.time()
+        with self._lock:
+            self._remove(key)
+            self._revoked[key] = until
+            if len(self._revoked) > self.max_entries:
+                self._revoked = {k: v for k, v in self._revoked.items() if v > now}
+
+    def is_revoked(self, key: str) -> bool:
+        with self._lock:
+            until = self._revoked.get(key)
+            if until is not None and time.time() > until:
+                del self._revoked[key]
+                return False
+            return until is not None
+
+    def clear(self):
+        """Vide le cache (les révocations sont conservées)"""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._keys_by_user.get(entry[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[entry[1]]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistiques du cache"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "revoked": len(self._revoked),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+# Instance partagée par les gestionnaires d'authentification d'un même processus
+principal_cache = PrincipalCache(
+    ttl=float(os.getenv('PRINCIPAL_CACHE_TTL', DEFAULT_TTL)),
+    max_entries=int(os.getenv('PRINCIPAL_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+)
@@ -0,0 +1,248 @@
+# 🎫 Stockage des Sessions
+# Backends de sessions (mémoire, SQLite, Redis) avec expiration indexée
+import os
+import json
+import time
+import heapq
+import sqlite3
+import threading
+from typing import Dict, Any, Optional
+import logging
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SWEEP_INTERVAL = 300  # secondes entre deux purges des sessions expirées
+
+
+class SessionStore:
+    """Classe de base des stockages de sessions
+
+    Chaque backend stocke des sessions (dictionnaires JSON) avec une date
+    d'expiration en timestamp ; une session expirée n'est jamais retournée.
+    """
+
+    name = "session_store"
+
+    def create(self, session_id: str, data: Dict[str, Any], expires_at: float):
+        """Enregistre (ou remplace) une session"""
+        raise NotImplementedError("Cette méthode doit être implémentée par les sous-classes")
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Retourne la session, ou None si absente ou expirée"""
+        raise NotImplementedError("Cette méthode doit être implémentée par les sous-classes")
+
+    def delete(self, session_id: str):
+        """Supprime une session"""
+        raise NotImplementedError("Cette méthode doit être implémentée par les sous-classes")
+
+    def purge_expired(self) -> int:
+        """Supprime les sessions expirées et retourne leur nombre"""
+        raise NotImplementedError("Cette méthode doit être implémentée par les sous-classes")
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions en mémoire, expirations rangées dans un tas (purge en O(k log n))"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._sessions: Dict[str, tuple] = {}
+        self._expiry_heap = []  # (expires_at, session_id), entrées périmées ignorées à la purge
+        self._lock = threading.Lock()
+
+    def create(self, session_id: str, data: Dict[str, Any], expires_at: float):
+        with self._lock:
+            self._sessions[session_id] = (expires_at, data)
+            heapq.heappush(self._expiry_heap, (expires_at, session_id))
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if time.time() > expires_at:
+                del self._sessions[session_id]
+                return None
+            return data
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        purged = 0
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expires_at, session_id = heapq.heappop(self._expiry_heap)
+                entry = self._sessions.get(session_id)
+                # La session a pu être supprimée ou recréée depuis : on ne retire que l'entrée correspondante
+                if entry is not None and entry[0] == expires_at:
+                    del self._sessions[session_id]
+                    purged += 1
+        return purged
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions persistantes dans SQLite, purge par l'index sur expires_at"""
+
+    name = "sqlite"
+
+    def __init__(self, db_path: str = "data/sessions.db"):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_sessions (
+                session_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_user_sessions_expires_at ON user_sessions (expires_at)")
+        self._conn.commit()
+
+    def create(self, session_id: str, data: Dict[str, Any], expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO user_sessions (session_id, data, expires_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data, ensure_ascii=False), expires_at)
+            )
+            self._conn.commit()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM user_sessions WHERE session_id = ? AND expires_at > ?",
+                (session_id, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM user_sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM user_sessions WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def close(self):
+        """Ferme la connexion SQLite"""
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM user_sessions").fetchone()[0]
+
+
+class RedisSessionStore(SessionStore):
+    """Sessions dans Redis, expirées par le serveur (TTL natif)
+
+    Tout client exposant get/set(ex=)/delete convient (redis-py ou un
+    équivalent local compatible).
+    """
+
+    name = "redis"
+
+    def __init__(self, client=None, url: Optional[str] = None, prefix: str = "session:"):
+        if client is None:
+            if redis is None:
+                raise ImportError("Le paquet 'redis' est requis pour SESSION_BACKEND=redis")
+            client = redis.Redis.from_url(url or "redis://localhost:6379/0")
+        self.client = client
+        self.prefix = prefix
+
+    def create(self, session_id: str, data: Dict[str, Any], expires_at: float):
+        ttl = max(1, int(expires_at - time.time()))
+        self.client.set(self.prefix + session_id, json.dumps(data, ensure_ascii=False), ex=ttl)
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        value = self.client.get(self.prefix + session_id)
+        return json.loads(value) if value else None
+
+    def delete(self, session_id: str):
+        self.client.delete(self.prefix + session_id)
+
+    def purge_expired(self) -> int:
+        return 0  # Redis supprime lui-même les clés expirées
+
+
+class SessionSweeper:
+    """Thread de fond qui purge périodiquement les sessions expirées"""
+
+    _registry: Dict[str, "SessionSweeper"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, store: SessionStore, interval: float = DEFAULT_SWEEP_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                purged = self.store.purge_expired()
+                if purged:
+                    logger.info(f"{purged} sessions expirées purgées")
+            except Exception as e:
+                logger.error(f"Erreur lors de la purge des sessions: {e}")
+
+    def start(self) -> "SessionSweeper":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Arrête le thread de purge"""
+        self._stop.set()
+
+    @classmethod
+    def ensure(cls, store: SessionStore, key: str, interval: float = DEFAULT_SWEEP_INTERVAL) -> "SessionSweeper":
+        """Démarre un seul sweeper par stockage (les reruns Streamlit recréent les gestionnaires)"""
+        with cls._registry_lock:
+            sweeper = cls._registry.get(key)
+            if sweeper is not None and sweeper._thread.is_alive():
+                sweeper.store = store
+                return sweeper
+            sweeper = cls(store, interval).start()
+            cls._registry[key] = sweeper
+            return sweeper
+
+
+def create_session_store(backend: Optional[str] = None) -> SessionStore:
+    """Crée le stockage configuré par SESSION_BACKEND (sqlite, memory ou redis)"""
+    backend = (backend or os.getenv('SESSION_BACKEND', 'sqlite')).lower()
+
+    if backend == 'memory':
+        store = MemorySessionStore()
+    elif backend == 'redis':
+        store = RedisSessionStore(url=os.getenv('SESSION_REDIS_URL'))
+    else:
+        if backend != 'sqlite':
+            logger.warning(f"Backend de sessions inconnu '{backend}', utilisation de SQLite")
+        store = SQLiteSessionStore(os.getenv('SESSION_DB_PATH', 'data/sessions.db'))
+
+    interval = float(os.getenv('SESSION_SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL))
+    if interval > 0 and store.name != 'redis':
+        key = f"sqlite:{store.db_path}" if store.name == 'sqlite' else f"memory:{id(store)}"
+        SessionSweeper.ensure(store, key, interval)
+    return store
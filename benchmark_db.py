@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de l'historique des exécutions
+Remplit une base temporaire, mesure les requêtes d'historique et vérifie
+(EXPLAIN QUERY PLAN) qu'elles passent par un index.
+
+Usage:
+  python benchmark_db.py                  # 200 000 exécutions
+  python benchmark_db.py --rows 2000000   # volume de production
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from database.db_manager import DatabaseManager, QUERY_PLAN_CHECKS
+
+USERS = 50
+AGENTS = 200
+
+
+def seed(db: DatabaseManager, rows: int):
+    """Insère des utilisateurs, des agents et `rows` exécutions réparties sur un an"""
+    db.execute_many(
+        "INSERT INTO users (username, email, password_hash) VALUES (?, ?, 'x')",
+        ((f"user_{i}", f"user_{i}@example.com") for i in range(USERS))
+    )
+    db.bulk_insert_agents({"agent_key": f"agent_{i}", "name": f"Agent {i}", "created_by": i % USERS + 1}
+                          for i in range(AGENTS))
+    start = datetime(2025, 1, 1)
+    db.bulk_insert_executions(
+        {
+            "agent_id": i % AGENTS + 1,
+            "created_by": i % USERS + 1,
+            "workflow_key": f"wf_{i % 20}",
+            "started_at": start + timedelta(seconds=i * 31536000 // rows)
+        }
+        for i in range(rows)
+    )
+    db.execute_update("ANALYZE")
+
+
+def run(rows: int, repeat: int = 20) -> bool:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, "benchmark.db"))
+
+        started = time.perf_counter()
+        seed(db, rows)
+        print(f"📥 {rows} exécutions insérées en {time.perf_counter() - started:.2f}s")
+
+        report = db.check_query_plans()
+        for name, (query, params) in QUERY_PLAN_CHECKS.items():
+            started = time.perf_counter()
+            for _ in range(repeat):
+                db.execute_query(query, params)
+            elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+            status = "✅" if report[name]["ok"] else "❌"
+            print(f"{status} {name}: {elapsed_ms:.2f} ms")
+            for detail in report[name]["plan"]:
+                print(f"     {detail}")
+
+        db.close()
+        return all(check["ok"] for check in report.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de l'historique des exécutions")
+    parser.add_argument("--rows", type=int, default=200000, help="nombre d'exécutions à générer")
+    args = parser.parse_args()
+
+    print("🧪 Benchmark de l'historique des exécutions")
+    print("=" * 40)
+    sys.exit(0 if run(args.rows) else 1)
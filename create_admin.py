@@ -1,5 +1,6 @@
 # Script de Création du Premier Administrateur
 # Exécutez ce script une seule fois au premier déploiement
+# Import en masse : python create_admin.py --import utilisateurs.csv (ou .json)
 
 import os
 import sys
@@ -9,8 +10,9 @@ from datetime import datetime
 # Ajouter le répertoire parent au path pour les imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+import csv
+
 from auth.auth_manager import AuthManager
-from database.db_manager import DatabaseManager
 
 def create_first_admin():
     """Crée le premier compte administrateur de la plateforme"""
@@ -21,7 +23,6 @@ def create_first_admin():
     try:
         # Initialiser les gestionnaires
         auth_manager = AuthManager()
-        db_manager = DatabaseManager()
         
         # Demander les informations de l'administrateur
         print("\n📝 Veuillez saisir les informations de l'administrateur :")
@@ -67,32 +68,34 @@ def create_first_admin():
             print(f"📧 Email: {email}")
             print(f" Rôle: Administrateur")
             print(f" Créé le: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            
-            # Créer l'utilisateur dans la base de données
-            user_id = db_manager.insert_user(
-                username=username,
-                email=email,
-                password_hash=auth_manager.users[username]["password_hash"],
-                role="admin"
-            )
-            
-            if user_id:
-                print(f"️ Utilisateur ajouté à la base de données (ID: {user_id})")
-            else:
-                print("⚠️ Utilisateur créé dans l'auth mais erreur dans la base de données")
+            print(f"️ Utilisateur ajouté à la base de données (ID: {auth_manager.get_user_by_username(username)['id']})")
             
             print("\n🎉 Configuration terminée !")
             print("Vous pouvez maintenant vous connecter à la plateforme avec ce compte.")
             return True
             
         else:
-            print("❌ Erreur lors de la création du compte administrateur !")
+            print("❌ Erreur lors de la création du compte administrateur (email déjà utilisé ?) !")
             return False
             
     except Exception as e:
         print(f"❌ Erreur: {e}")
         return False
 
+def import_users(path: str):
+    """Importe des comptes depuis un fichier CSV ou JSON (username, email, password ou password_hash, role)"""
+    print(f"📥 Import des utilisateurs depuis {path}")
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.endswith('.csv'):
+            users = list(csv.DictReader(f))
+        else:
+            users = json.load(f)
+            if isinstance(users, dict):  # format data/users.json
+                users = [dict(user, username=username) for username, user in users.items()]
+    
+    imported = AuthManager().import_users(users)
+    print(f"✅ {imported} utilisateurs créés ({len(users) - imported} déjà existants ou invalides)")
+
 def main():
     """Fonction principale"""
     print("🚀 Plateforme Agents IA - Création du Premier Administrateur")
@@ -101,7 +104,7 @@ def main():
     # Vérifier si un administrateur existe déjà
     try:
         auth_manager = AuthManager()
-        admin_users = [user for user in auth_manager.users.values() if user.get('role') == 'admin']
+        admin_users = auth_manager.user_repository.list_users(role='admin', limit=20)
         
         if admin_users:
             print("⚠️ Un compte administrateur existe déjà !")
@@ -129,4 +132,7 @@ def main():
         print("Vérifiez que tous les modules sont correctement installés.")
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) == 3 and sys.argv[1] == "--import":
+        import_users(sys.argv[2])
+    else:
+        main()
@@ -2,8 +2,11 @@
 # Gestionnaire de base de données professionnel et évolutif
 
 from .db_manager import DatabaseManager
+from .agent_repository import AgentRepository
+from .user_repository import UserRepository
+from .task_repository import TaskRepository
 
-__all__ = ['DatabaseManager']
+__all__ = ['DatabaseManager', 'AgentRepository', 'UserRepository', 'TaskRepository']
 
 
 
@@ -0,0 +1,241 @@
+# 🤖 Dépôt des Agents
+# Catalogue des agents de l'interface stocké dans la table SQLite `agents`
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+import logging
+
+from .db_manager import DatabaseManager
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Champs d'un agent (format agents.json) -> colonnes de la table agents
+FIELD_COLUMNS = {
+    "name": "name",
+    "description": "description",
+    "domain": "domain",
+    "type": "agent_type",
+    "model": "model_type",
+    "system_prompt": "system_prompt",
+    "status": "status",
+    "created_at": "created_at"
+}
+
+# Champs jamais stockés dans les métadonnées (l'historique va dans la table executions)
+RESERVED_FIELDS = {"id", "db_id", "executions"}
+
+
+class AgentRepository:
+    """Accès indexé aux agents : lectures et mises à jour ponctuelles"""
+
+    INSERT_QUERY = """
+        INSERT OR IGNORE INTO agents (agent_key, name, description, domain, agent_type, model_type,
+                                      system_prompt, status, created_at, metadata)
+        VALUES (:agent_key, :name, :description, :domain, :agent_type, :model_type,
+                :system_prompt, :status, :created_at, :metadata)
+    """
+
+    def __init__(self, db_manager: Optional[DatabaseManager] = None):
+        self.db = db_manager or DatabaseManager()
+
+    def _row_to_agent(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Convertit une ligne SQL en dictionnaire au format agents.json"""
+        agent = json.loads(row.get("metadata") or "{}")
+        agent["id"] = row["agent_key"]
+        for field, column in FIELD_COLUMNS.items():
+            if row.get(column) is not None:
+                agent[field] = row[column]
+        agent["db_id"] = row["id"]
+        return agent
+
+    def _split_fields(self, agent: Dict[str, Any]):
+        """Sépare les champs indexés (colonnes) des champs libres (métadonnées)"""
+        columns = {FIELD_COLUMNS[k]: v for k, v in agent.items() if k in FIELD_COLUMNS}
+        metadata = {k: v for k, v in agent.items() if k not in FIELD_COLUMNS and k not in RESERVED_FIELDS}
+        return columns, metadata
+
+    def _insert_params(self, agent: Dict[str, Any]) -> Dict[str, Any]:
+        columns, metadata = self._split_fields(agent)
+        return {
+            "agent_key": agent["id"],
+            "name": columns.get("name", ""),
+            "description": columns.get("description", ""),
+            "domain": columns.get("domain"),
+            "agent_type": columns.get("agent_type"),
+            "model_type": columns.get("model_type") or "",
+            "system_prompt": columns.get("system_prompt", ""),
+            "status": columns.get("status", "active"),
+            "created_at": columns.get("created_at") or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "metadata": json.dumps(metadata, ensure_ascii=False)
+        }
+
+    def get(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """Récupère un agent par son identifiant"""
+        query = "SELECT * FROM agents WHERE agent_key = ? AND is_active = 1"
+        results = self.db.execute_query(query, (agent_id,))
+        return self._row_to_agent(results[0]) if results else None
+
+    def get_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        """Récupère un agent par son nom"""
+        query = "SELECT * FROM agents WHERE name = ? AND agent_key IS NOT NULL AND is_active = 1 LIMIT 1"
+        results = self.db.execute_query(query, (name,))
+        return self._row_to_agent(results[0]) if results else None
+
+    def list_agents(self, domain: Optional[str] = None, agent_type: Optional[str] = None,
+                    status: Optional[str] = None, limit: Optional[int] = None,
+                    offset: int = 0) -> List[Dict[str, Any]]:
+        """Liste les agents, filtrés sur les colonnes indexées"""
+        query, params = self._filtered_query("SELECT *", domain, agent_type, status)
+        query += " ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params += (limit, offset)
+        return [self._row_to_agent(row) for row in self.db.execute_query(query, params)]
+
+    def count(self, domain: Optional[str] = None, agent_type: Optional[str] = None,
+              status: Optional[str] = None) -> int:
+        """Compte les agents sans les charger"""
+        query, params = self._filtered_query("SELECT COUNT(*) AS total", domain, agent_type, status)
+        results = self.db.execute_query(query, params)
+        return results[0]["total"] if results else 0
+
+    def _filtered_query(self, select: str, domain: Optional[str], agent_type: Optional[str],
+                        status: Optional[str]):
+        query = f"{select} FROM agents WHERE agent_key IS NOT NULL AND is_active = 1"
+        params = ()
+        for column, value in (("domain", domain), ("agent_type", agent_type), ("status", status)):
+            if value is not None:
+                query += f" AND {column} = ?"
+                params += (value,)
+        return query, params
+
+    def create(self, agent: Dict[str, Any]) -> bool:
+        """Ajoute un agent au catalogue"""
+        return self.db.execute_update(self.INSERT_QUERY, self._insert_params(agent))
+
+    def update(self, agent_id: str, fields: Dict[str, Any]) -> bool:
+        """Met à jour uniquement les champs fournis d'un agent"""
+        columns, metadata = self._split_fields(fields)
+        assignments = [f"{column} = :{column}" for column in columns]
+        params = dict(columns, agent_key=agent_id)
+
+        if metadata:
+            current = self.get(agent_id)
+            if current is None:
+                return False
+            merged = {k: v for k, v in current.items() if k not in FIELD_COLUMNS and k not in RESERVED_FIELDS}
+            merged.update(metadata)
+            assignments.append("metadata = :metadata")
+            params["metadata"] = json.dumps(merged, ensure_ascii=False)
+
+        if not assignments:
+            return True
+
+        query = f"""
+            UPDATE agents SET {', '.join(assignments)}, updated_at = CURRENT_TIMESTAMP
+            WHERE agent_key = :agent_key AND is_active = 1
+        """
+        return self.db.execute_update(query, params)
+
+    def delete(self, agent_id: str) -> bool:
+        """Supprime un agent (désactivation, l'historique reste rattaché)"""
+        query = "UPDATE agents SET is_active = 0, updated_at = CURRENT_TIMESTAMP WHERE agent_key = ?"
+        return self.db.execute_update(query, (agent_id,))
+
+    def import_from_json(self, json_path: str = "agents.json") -> int:
+        """Importe en une fois les agents d'un fichier agents.json (idempotent)"""
+        if not os.path.exists(json_path):
+            return 0
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                agents = json.load(f)
+        except Exception as e:
+            logger.error(f"Erreur lors de la lecture de {json_path}: {e}")
+            return 0
+
+        imported = self.import_agents(agents)
+        logger.info(f"{imported} agents importés depuis {json_path}")
+        return imported
+
+    def import_agents(self, agents: List[Dict[str, Any]], replace: bool = False) -> int:
+        """Importe des agents par lots ; avec replace, le catalogue existant est remplacé"""
+        agents = [agent for agent in agents if agent.get("id")]
+        existing_keys = self._agent_ids()
+        if replace:
+            self.db.execute_update("UPDATE agents SET is_active = 0 WHERE agent_key IS NOT NULL")
+        imported = self.db.bulk_insert_agents((self._insert_params(agent) for agent in agents), upsert=replace)
+
+        # L'historique embarqué n'est repris que pour les agents nouvellement importés
+        db_ids = self._agent_ids()
+        executions = [
+            self._execution_from_record(db_ids[agent["id"]], record)
+            for agent in agents if agent["id"] not in existing_keys and agent["id"] in db_ids
+            for record in agent.get("executions", [])
+        ]
+        pending = self._insert_executions(executions)
+        if pending:
+            # Conservées dans les métadonnées : migrate_embedded_executions les reprendra
+            metadata_by_id = {}
+            for db_id in {execution["agent_id"] for execution in pending}:
+                results = self.db.execute_query("SELECT metadata FROM agents WHERE id = ?", (db_id,))
+                metadata_by_id[db_id] = json.loads(results[0]["metadata"] or "{}") if results else {}
+            self._rewrite_metadata(metadata_by_id, pending)
+        return imported
+
+    def migrate_embedded_executions(self) -> int:
+        """Déplace l'historique encore stocké dans les métadonnées vers la table executions"""
+        query = "SELECT id, metadata FROM agents WHERE metadata LIKE '%\"executions\"%'"
+        executions, metadata_by_id = [], {}
+        for row in self.db.execute_query(query):
+            metadata = json.loads(row["metadata"])
+            records = metadata.pop("executions", None)
+            if records is None:
+                continue
+            executions.extend(self._execution_from_record(row["id"], record) for record in records)
+            metadata_by_id[row["id"]] = metadata
+
+        if not metadata_by_id:
+            return 0
+        pending = self._insert_executions(executions)
+        self._rewrite_metadata(metadata_by_id, pending)
+        return len(executions) - len(pending)
+
+    def _insert_executions(self, executions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insère l'historique ; retourne les exécutions non enregistrées
+
+        Les lots validés par execute_many forment un préfixe de la liste :
+        seules les suivantes sont à conserver, sans doublon à la reprise.
+        """
+        inserted = self.db.bulk_insert_executions(executions)
+        if inserted != len(executions):
+            logger.error(f"{len(executions) - inserted} exécutions sur {len(executions)} non enregistrées, "
+                         f"conservées dans les métadonnées des agents")
+        return executions[inserted:]
+
+    def _rewrite_metadata(self, metadata_by_id: Dict[int, Dict[str, Any]], pending: List[Dict[str, Any]]):
+        """Réécrit les métadonnées des agents en y laissant leurs exécutions non enregistrées"""
+        for execution in pending:
+            metadata_by_id[execution["agent_id"]].setdefault("executions", []).append(execution["metadata"])
+        self.db.execute_many("UPDATE agents SET metadata = ? WHERE id = ?",
+                             [(json.dumps(metadata, ensure_ascii=False), db_id)
+                              for db_id, metadata in metadata_by_id.items()])
+
+    def _agent_ids(self) -> Dict[str, int]:
+        """Correspondance identifiant d'agent -> clé primaire SQL"""
+        query = "SELECT id, agent_key FROM agents WHERE agent_key IS NOT NULL"
+        return {row["agent_key"]: row["id"] for row in self.db.execute_query(query)}
+
+    @staticmethod
+    def _execution_from_record(db_id: int, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Convertit une exécution au format agents.json en ligne de la table executions"""
+        return {
+            "agent_id": db_id,
+            "status": record.get("status", "completed"),
+            "input_data": record.get("user_prompt", ""),
+            "started_at": record.get("timestamp"),
+            "metadata": record
+        }
@@ -2,8 +2,11 @@
 import sqlite3
 import json
 import os
+import queue
+import base64
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from itertools import islice
+from typing import Dict, List, Any, Callable, Iterable, Iterator, Optional, Tuple
 import logging
 from contextlib import contextmanager
 
@@ -11,11 +14,73 @@ from contextlib import contextmanager
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Réglages des connexions SQLite
+DEFAULT_POOL_SIZE = 8
+BUSY_TIMEOUT_SECONDS = 30
+CACHE_SIZE_KIB = 20000  # ~20 Mo de cache de pages par connexion
+STATEMENT_CACHE_SIZE = 256  # requêtes préparées conservées par connexion
+BULK_CHUNK_SIZE = 1000  # lignes par transaction pour les écritures groupées
+
+# Valeurs par défaut des colonnes pour les insertions groupées d'agents
+AGENT_DEFAULTS = {
+    "agent_key": None, "name": "", "description": "", "domain": None, "agent_type": None,
+    "model_type": "", "api_key": None, "configuration": None, "system_prompt": "",
+    "status": "active", "metadata": None, "created_by": None
+}
+
+# Comptabilité des tokens enregistrée avec chaque exécution (voir ai_usage.usage_columns)
+USAGE_COLUMNS = ("model", "prompt_tokens", "completion_tokens", "total_tokens", "cost", "tokens_estimated")
+
+# Regroupements du tableau de bord de consommation : clé, libellé, jointure
+USAGE_GROUPS = {
+    "agent": ("e.agent_id", "a.name", "LEFT JOIN agents a ON a.id = e.agent_id"),
+    "user": ("e.created_by", "u.username", "LEFT JOIN users u ON u.id = e.created_by"),
+    "model": ("e.model", "e.model", ""),
+    "day": ("date(e.started_at)", "date(e.started_at)", "")
+}
+
+def encode_cursor(execution: Dict[str, Any]) -> str:
+    """Curseur opaque de pagination à partir de la dernière exécution d'une page"""
+    key = json.dumps([execution["started_at"], execution["id"]])
+    return base64.urlsafe_b64encode(key.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Décode un curseur de pagination (ValueError s'il est invalide)"""
+    try:
+        started_at, execution_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(started_at), int(execution_id)
+    except Exception as e:
+        raise ValueError(f"Curseur de pagination invalide: {cursor}") from e
+
+# Requêtes chaudes dont le plan doit rester indexé (O(log n) quel que soit le volume)
+QUERY_PLAN_CHECKS = {
+    "execution_history": ("""
+        SELECT e.*, a.name as agent_name FROM executions e JOIN agents a ON e.agent_id = a.id
+        WHERE e.created_by = ? AND (e.started_at, e.id) < (?, ?)
+        ORDER BY e.started_at DESC, e.id DESC LIMIT ?
+    """, (1, "2025-07-01 00:00:00", 100000, 50)),
+    "agent_executions": (
+        "SELECT * FROM executions WHERE agent_id = ? AND (started_at, id) < (?, ?) "
+        "ORDER BY started_at DESC, id DESC LIMIT ? OFFSET ?",
+        (1, "2025-07-01 00:00:00", 100000, 50, 0)
+    ),
+    "workflow_executions": (
+        "SELECT * FROM executions WHERE workflow_key = ? ORDER BY started_at DESC, id DESC LIMIT ? OFFSET ?",
+        ("wf", 50, 0)
+    ),
+    "recent_executions": (
+        "SELECT * FROM executions ORDER BY started_at DESC, id DESC LIMIT ? OFFSET ?", (50, 0)
+    ),
+    "session_lookup": ("SELECT * FROM sessions WHERE session_id = ?", ("session",)),
+    "agent_by_name": ("SELECT id FROM agents WHERE name = ?", ("Agent",))
+}
+
 class DatabaseManager:
     """Gestionnaire de base de données SQLite professionnel et évolutif"""
     
-    def __init__(self, db_path: str = "data/ai_platform.db"):
+    def __init__(self, db_path: str = "data/ai_platform.db", pool_size: int = DEFAULT_POOL_SIZE):
         self.db_path = db_path
+        self._pool = queue.LifoQueue(maxsize=pool_size)
         self._ensure_data_directory()
         self._init_database()
     
@@ -107,21 +172,178 @@ class DatabaseManager:
                     )
                 """)
                 
+                self._upgrade_schema(cursor)
+                
                 conn.commit()
                 logger.info("Base de données initialisée avec succès")
                 
         except Exception as e:
             logger.error(f"Erreur lors de l'initialisation de la base de données: {e}")
     
+    def _ensure_columns(self, cursor, table: str, columns: Dict[str, str]):
+        """Ajoute les colonnes manquantes à une table existante"""
+        existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+    
+    def _upgrade_schema(self, cursor):
+        """Applique les migrations dont le numéro dépasse PRAGMA user_version"""
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(self._migrations(), start=1):
+            if number > version:
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {number}")
+                logger.info(f"Migration du schéma appliquée: v{number} ({migration.__name__})")
+    
+    def _migrations(self) -> List[Callable]:
+        """Migrations du schéma, dans l'ordre (ne jamais réordonner, seulement ajouter)"""
+        return [self._migrate_ui_catalogue, self._migrate_history_indexes, self._migrate_keyset_indexes,
+                self._migrate_user_store, self._migrate_token_accounting, self._migrate_planned_tasks,
+                self._migrate_task_leases]
+    
+    def get_schema_version(self) -> int:
+        """Version du schéma de la base (PRAGMA user_version)"""
+        with self._get_connection() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+    
+    def _migrate_ui_catalogue(self, cursor):
+        """v1 : catalogue des agents et journal des exécutions de l'interface"""
+        # Catalogue des agents de l'interface (anciennement agents.json)
+        self._ensure_columns(cursor, "agents", {
+            "agent_key": "TEXT",
+            "domain": "TEXT",
+            "agent_type": "TEXT",
+            "status": "TEXT DEFAULT 'active'",
+            "system_prompt": "TEXT",
+            "metadata": "TEXT"
+        })
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_agents_agent_key ON agents (agent_key)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_agents_name ON agents (name)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_agents_domain ON agents (domain)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_agents_agent_type ON agents (agent_type)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_agents_status ON agents (status)")
+        
+        # Journal des exécutions (anciennement dans agents.json / workflows.json)
+        self._ensure_columns(cursor, "executions", {
+            "workflow_key": "TEXT",
+            "metadata": "TEXT"
+        })
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_executions_workflow_key ON executions (workflow_key, started_at)")
+    
+    def _migrate_history_indexes(self, cursor):
+        """v2 : index composites de l'historique des exécutions
+        
+        sessions(session_id) est déjà indexé par sa contrainte UNIQUE et
+        agents(name) par la v1 : aucun index redondant n'est ajouté.
+        L'index par utilisateur est défini une seule fois, par la v3.
+        """
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_executions_agent_id_started_at ON executions (agent_id, started_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_executions_started_at ON executions (started_at)")
+    
+    def _migrate_keyset_indexes(self, cursor):
+        """v3 : index de l'historique par utilisateur compatible avec la pagination par clé
+        
+        L'ordre (started_at DESC, id DESC) se lit à rebours d'un index ascendant ;
+        avec started_at DESC, le rowid implicite restait ascendant et forçait un tri.
+        """
+        # Index descendant créé par les premières versions de la v2, remplacé par celui-ci
+        cursor.execute("DROP INDEX IF EXISTS idx_executions_created_by_started_at")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_executions_created_by_keyset
+            ON executions (created_by, started_at)
+        """)
+    
+    def _migrate_user_store(self, cursor):
+        """v4 : la table users devient l'unique stockage des comptes (anciennement data/users.json)
+        
+        username et email sont déjà indexés par leurs contraintes UNIQUE.
+        """
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users (role, is_active)")
+    
+    def _migrate_token_accounting(self, cursor):
+        """v5 : tokens (réels ou estimés), modèle et coût de chaque exécution"""
+        self._ensure_columns(cursor, "executions", {
+            "model": "TEXT",
+            "prompt_tokens": "INTEGER",
+            "completion_tokens": "INTEGER",
+            "total_tokens": "INTEGER",
+            "cost": "REAL",
+            "tokens_estimated": "BOOLEAN"
+        })
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_executions_model_started_at ON executions (model, started_at)")
+    
+    def _migrate_planned_tasks(self, cursor):
+        """v6 : tâches du planificateur, une ligne par tâche (anciennement data/planned_tasks.json)"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS planned_tasks (
+                task_key TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                task_type TEXT,
+                schedule_type TEXT,
+                status TEXT,
+                enabled BOOLEAN DEFAULT 1,
+                next_execution TEXT,
+                data TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_planned_tasks_enabled ON planned_tasks (enabled, status)")
+    
+    def _migrate_task_leases(self, cursor):
+        """v7 : baux d'exécution des tâches planifiées partagés entre processus
+        
+        lease_due identifie l'échéance réclamée, lease_until l'expiration du bail
+        (NULL une fois l'exécution terminée) ; updated_at indexé pour la synchronisation.
+        """
+        self._ensure_columns(cursor, "planned_tasks", {
+            "lease_owner": "TEXT",
+            "lease_due": "REAL",
+            "lease_until": "REAL"
+        })
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_planned_tasks_updated_at ON planned_tasks (updated_at)")
+    
+    def _create_connection(self) -> sqlite3.Connection:
+        """Ouvre une connexion configurée (WAL, cache, requêtes préparées)"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_SECONDS,
+            check_same_thread=False,  # une connexion n'est utilisée que par un thread à la fois
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = sqlite3.Row  # Permet d'accéder aux colonnes par nom
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+    
     @contextmanager
     def _get_connection(self):
-        """Contexte pour gérer les connexions à la base de données"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Permet d'accéder aux colonnes par nom
+        """Emprunte une connexion au pool et la restitue après usage"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._create_connection()
+        
         try:
             yield conn
         finally:
-            conn.close()
+            if conn.in_transaction:
+                conn.rollback()  # ne jamais rendre au pool une transaction entamée
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+    
+    def close(self):
+        """Ferme toutes les connexions du pool"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
     
     def execute_query(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
         """Exécute une requête SELECT et retourne les résultats"""
@@ -147,15 +369,60 @@ class DatabaseManager:
             logger.error(f"Erreur lors de l'exécution de la mise à jour: {e}")
             return False
     
+    def execute_rowcount(self, query: str, params: tuple = ()) -> int:
+        """Exécute une requête UPDATE/DELETE et retourne le nombre de lignes modifiées (0 en cas d'erreur)
+        
+        Sert aux mises à jour conditionnelles atomiques (« compare-and-set ») :
+        une seule des connexions concurrentes obtient 1.
+        """
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.execute(query, params)
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Erreur lors de l'exécution de la mise à jour: {e}")
+            return 0
+    
+    def execute_insert(self, query: str, params: tuple = ()) -> Optional[int]:
+        """Exécute un INSERT et retourne l'ID de la ligne créée"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.execute(query, params)
+                conn.commit()
+                return cursor.lastrowid
+        except Exception as e:
+            logger.error(f"Erreur lors de l'exécution de l'insertion: {e}")
+            return None
+    
+    def execute_many(self, query: str, rows: Iterable[Any], chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        """Exécute une requête pour chaque ligne, par transactions de chunk_size lignes
+        
+        Retourne le nombre de lignes modifiées dans les transactions validées ;
+        en cas d'erreur, seule la transaction en cours est annulée.
+        """
+        total = 0
+        try:
+            with self._get_connection() as conn:
+                iterator = iter(rows)
+                while True:
+                    chunk = list(islice(iterator, chunk_size))
+                    if not chunk:
+                        break
+                    with conn:  # une transaction (un seul fsync) par lot
+                        cursor = conn.executemany(query, chunk)
+                    total += cursor.rowcount
+        except Exception as e:
+            logger.error(f"Erreur lors de l'écriture groupée ({total} lignes validées): {e}")
+        return total
+    
     def insert_user(self, username: str, email: str, password_hash: str, role: str = "user") -> Optional[int]:
         """Insère un nouvel utilisateur"""
         query = """
             INSERT INTO users (username, email, password_hash, role)
             VALUES (?, ?, ?, ?)
         """
-        if self.execute_update(query, (username, email, password_hash, role)):
-            return self.get_user_id(username)
-        return None
+        return self.execute_insert(query, (username, email, password_hash, role))
     
     def get_user_id(self, username: str) -> Optional[int]:
         """Récupère l'ID d'un utilisateur par son nom d'utilisateur"""
@@ -181,9 +448,7 @@ class DatabaseManager:
             INSERT INTO agents (name, description, model_type, api_key, configuration, created_by)
             VALUES (?, ?, ?, ?, ?, ?)
         """
-        if self.execute_update(query, (name, description, model_type, api_key, configuration, created_by)):
-            return self.get_agent_id(name)
-        return None
+        return self.execute_insert(query, (name, description, model_type, api_key, configuration, created_by))
     
     def get_agent_id(self, name: str) -> Optional[int]:
         """Récupère l'ID d'un agent par son nom"""
@@ -191,6 +456,12 @@ class DatabaseManager:
         results = self.execute_query(query, (name,))
         return results[0]["id"] if results else None
     
+    def get_agent_by_id(self, agent_id: int) -> Optional[Dict[str, Any]]:
+        """Récupère un agent actif par son ID"""
+        query = "SELECT * FROM agents WHERE id = ? AND is_active = 1"
+        results = self.execute_query(query, (agent_id,))
+        return results[0] if results else None
+    
     def get_all_agents(self) -> List[Dict[str, Any]]:
         """Récupère tous les agents actifs"""
         query = "SELECT * FROM agents WHERE is_active = 1 ORDER BY created_at DESC"
@@ -203,9 +474,153 @@ class DatabaseManager:
             INSERT INTO executions (agent_id, workflow_id, input_data, output_data, status, created_by)
             VALUES (?, ?, ?, ?, ?, ?)
         """
-        if self.execute_update(query, (agent_id, workflow_id, input_data, output_data, status, created_by)):
-            return self.get_last_execution_id()
-        return None
+        return self.execute_insert(query, (agent_id, workflow_id, input_data, output_data, status, created_by))
+    
+    def bulk_insert_agents(self, agents: Iterable[Dict[str, Any]], upsert: bool = False,
+                           chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        """Insère plusieurs agents par transactions groupées
+        
+        Les agents dont l'agent_key existe déjà sont ignorés, ou mis à jour
+        (et réactivés) si upsert est vrai.
+        """
+        columns = list(AGENT_DEFAULTS)
+        query = f"""
+            INSERT {'' if upsert else 'OR IGNORE '}INTO agents ({', '.join(columns)}, created_at)
+            VALUES ({', '.join(':' + column for column in columns)}, COALESCE(:created_at, CURRENT_TIMESTAMP))
+        """
+        if upsert:
+            updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column != "agent_key")
+            query += f"""
+            ON CONFLICT (agent_key) DO UPDATE SET {updates},
+                is_active = 1, updated_at = CURRENT_TIMESTAMP
+            """
+        return self.execute_many(query, (self._agent_params(agent) for agent in agents), chunk_size)
+    
+    def _agent_params(self, agent: Dict[str, Any]) -> Dict[str, Any]:
+        """Complète un agent avec les valeurs par défaut des colonnes"""
+        params = dict(AGENT_DEFAULTS, created_at=None)
+        params.update(agent)
+        for column in ("configuration", "metadata"):
+            if isinstance(params[column], (dict, list)):
+                params[column] = json.dumps(params[column], ensure_ascii=False)
+        return params
+    
+    def bulk_insert_executions(self, executions: Iterable[Dict[str, Any]],
+                               chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        """Insère plusieurs exécutions terminées par transactions groupées"""
+        query = """
+            INSERT INTO executions (agent_id, workflow_id, workflow_key, input_data, output_data, status,
+                                    execution_time, created_by, metadata, model, prompt_tokens,
+                                    completion_tokens, total_tokens, cost, tokens_estimated,
+                                    started_at, completed_at)
+            VALUES (:agent_id, :workflow_id, :workflow_key, :input_data, :output_data, :status,
+                    :execution_time, :created_by, :metadata, :model, :prompt_tokens,
+                    :completion_tokens, :total_tokens, :cost, :tokens_estimated,
+                    COALESCE(:started_at, CURRENT_TIMESTAMP), COALESCE(:started_at, CURRENT_TIMESTAMP))
+        """
+        return self.execute_many(query, (self._execution_params(execution) for execution in executions), chunk_size)
+    
+    def _execution_params(self, execution: Dict[str, Any]) -> Dict[str, Any]:
+        """Complète une exécution avec les valeurs par défaut des colonnes"""
+        params = {
+            "agent_id": None, "workflow_id": None, "workflow_key": None, "input_data": "",
+            "output_data": "", "status": "completed", "execution_time": None,
+            "created_by": None, "metadata": None, "started_at": None
+        }
+        params.update(dict.fromkeys(USAGE_COLUMNS))
+        params.update(execution)
+        if isinstance(params["metadata"], (dict, list)):
+            params["metadata"] = json.dumps(params["metadata"], ensure_ascii=False)
+        if isinstance(params["started_at"], datetime):
+            params["started_at"] = params["started_at"].strftime("%Y-%m-%d %H:%M:%S")
+        return params
+    
+    def log_execution(self, **execution) -> bool:
+        """Ajoute une exécution au journal (agent_id ou workflow_key, status, metadata...)"""
+        return self.bulk_insert_executions([execution]) == 1
+    
+    def _execution_filters(self, agent_id: Optional[int], workflow_key: Optional[str],
+                           since: Optional[Any], until: Optional[Any], created_by: Optional[int] = None,
+                           before: Optional[Tuple[str, int]] = None):
+        conditions, params = [], []
+        for clause, value in (("agent_id = ?", agent_id), ("workflow_key = ?", workflow_key),
+                              ("created_by = ?", created_by),
+                              ("started_at >= ?", since), ("started_at < ?", until)):
+            if value is not None:
+                if isinstance(value, datetime):
+                    value = value.strftime("%Y-%m-%d %H:%M:%S")
+                conditions.append(clause)
+                params.append(value)
+        if before is not None:
+            # Pagination par clé : lignes strictement après le curseur dans l'ordre (started_at, id) DESC
+            conditions.append("(started_at, id) < (?, ?)")
+            params.extend(before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, tuple(params)
+    
+    @staticmethod
+    def _decode_execution(row: Dict[str, Any]) -> Dict[str, Any]:
+        row["metadata"] = json.loads(row["metadata"]) if row.get("metadata") else {}
+        return row
+    
+    def get_executions(self, agent_id: Optional[int] = None, workflow_key: Optional[str] = None,
+                       since: Optional[Any] = None, until: Optional[Any] = None,
+                       limit: int = 50, offset: int = 0, created_by: Optional[int] = None,
+                       before: Optional[Tuple[str, int]] = None) -> List[Dict[str, Any]]:
+        """Récupère une page d'exécutions (plus récentes d'abord), filtrée par cible et période
+        
+        `before` est la clé (started_at, id) de la dernière ligne de la page précédente :
+        le coût ne dépend alors plus de la profondeur de la page, contrairement à `offset`.
+        """
+        where, params = self._execution_filters(agent_id, workflow_key, since, until, created_by, before)
+        query = f"SELECT * FROM executions {where} ORDER BY started_at DESC, id DESC LIMIT ? OFFSET ?"
+        return [self._decode_execution(row) for row in self.execute_query(query, params + (limit, offset))]
+    
+    def get_executions_page(self, limit: int = 50, cursor: Optional[str] = None,
+                            **filters) -> Dict[str, Any]:
+        """Page d'exécutions avec curseur opaque (pagination par clé sur started_at, id)"""
+        before = decode_cursor(cursor) if cursor else None
+        rows = self.get_executions(limit=limit + 1, before=before, **filters)
+        items = rows[:limit]
+        return {
+            "items": items,
+            "next_cursor": encode_cursor(items[-1]) if len(rows) > limit else None
+        }
+    
+    def iter_executions(self, batch_size: int = 1000, **filters) -> Iterator[Dict[str, Any]]:
+        """Parcourt les exécutions filtrées (plus récentes d'abord) en mémoire constante
+        
+        Les lignes sont lues par lots depuis un curseur SQLite ouvert sur une
+        connexion du pool, rendue au pool à la fin du parcours.
+        """
+        where, params = self._execution_filters(
+            filters.get("agent_id"), filters.get("workflow_key"), filters.get("since"),
+            filters.get("until"), filters.get("created_by")
+        )
+        query = f"SELECT * FROM executions {where} ORDER BY started_at DESC, id DESC"
+        with self._get_connection() as conn:
+            cursor = conn.execute(query, params)
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield self._decode_execution(dict(row))
+            finally:
+                cursor.close()
+    
+    def count_executions(self, agent_id: Optional[int] = None, workflow_key: Optional[str] = None,
+                         since: Optional[Any] = None, until: Optional[Any] = None) -> int:
+        """Compte les exécutions filtrées par cible et période"""
+        where, params = self._execution_filters(agent_id, workflow_key, since, until)
+        results = self.execute_query(f"SELECT COUNT(*) AS total FROM executions {where}", params)
+        return results[0]["total"] if results else 0
+    
+    def count_executions_by_agent(self) -> Dict[int, int]:
+        """Nombre d'exécutions par agent"""
+        query = "SELECT agent_id, COUNT(*) AS total FROM executions WHERE agent_id IS NOT NULL GROUP BY agent_id"
+        return {row["agent_id"]: row["total"] for row in self.execute_query(query)}
     
     def get_last_execution_id(self) -> Optional[int]:
         """Récupère l'ID de la dernière exécution"""
@@ -213,25 +628,87 @@ class DatabaseManager:
         results = self.execute_query(query)
         return results[0]["id"] if results else None
     
-    def update_execution_status(self, execution_id: int, status: str, output_data: str = None):
-        """Met à jour le statut d'une exécution"""
+    def update_execution_status(self, execution_id: int, status: str, output_data: str = None,
+                                usage: Optional[Dict[str, Any]] = None, execution_time: Optional[float] = None):
+        """Met à jour le statut d'une exécution
+        
+        `usage` contient les colonnes de comptabilité des tokens (USAGE_COLUMNS)
+        et `execution_time` la durée mesurée de l'appel au modèle, en secondes.
+        """
+        fields = {"status": status}
         if output_data:
-            query = "UPDATE executions SET status = ?, output_data = ?, completed_at = CURRENT_TIMESTAMP WHERE id = ?"
-            self.execute_update(query, (status, output_data, execution_id))
-        else:
-            query = "UPDATE executions SET status = ? WHERE id = ?"
-            self.execute_update(query, (status, execution_id))
-    
-    def get_execution_history(self, user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
-        """Récupère l'historique des exécutions d'un utilisateur"""
-        query = """
+            fields["output_data"] = output_data
+        if execution_time is not None:
+            fields["execution_time"] = execution_time
+        fields.update({column: value for column, value in (usage or {}).items()
+                       if column in USAGE_COLUMNS and value is not None})
+        assignments = ", ".join(f"{column} = :{column}" for column in fields)
+        if output_data:
+            assignments += ", completed_at = CURRENT_TIMESTAMP"
+        self.execute_update(f"UPDATE executions SET {assignments} WHERE id = :id", dict(fields, id=execution_id))
+    
+    def get_usage_summary(self, group_by: str = "model", since: Optional[Any] = None,
+                          until: Optional[Any] = None, created_by: Optional[int] = None,
+                          agent_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Consommation de tokens et coût agrégés par agent, utilisateur, modèle ou jour
+        
+        tokens_per_second est le débit de génération : tokens de réponse / durée des appels.
+        """
+        if group_by not in USAGE_GROUPS:
+            raise ValueError(f"Regroupement inconnu: {group_by}")
+        key, label, join = USAGE_GROUPS[group_by]
+        where, params = self._execution_filters(agent_id, None, since, until, created_by)
+        where = f"{where} AND total_tokens IS NOT NULL" if where else "WHERE total_tokens IS NOT NULL"
+        query = f"""
+            SELECT {key} AS key, {label} AS label,
+                   COUNT(*) AS executions,
+                   SUM(e.prompt_tokens) AS prompt_tokens,
+                   SUM(e.completion_tokens) AS completion_tokens,
+                   SUM(e.total_tokens) AS total_tokens,
+                   SUM(CASE WHEN e.tokens_estimated THEN e.total_tokens ELSE 0 END) AS estimated_tokens,
+                   ROUND(COALESCE(SUM(e.cost), 0), 6) AS cost,
+                   SUM(CASE WHEN e.execution_time > 0 THEN e.completion_tokens END) * 1.0
+                       / NULLIF(SUM(CASE WHEN e.execution_time > 0 THEN e.execution_time END), 0)
+                       AS tokens_per_second
+            FROM (SELECT * FROM executions {where}) e {join}
+            GROUP BY {key}
+            ORDER BY cost DESC, total_tokens DESC
+        """
+        return self.execute_query(query, params)
+    
+    def get_execution_history(self, user_id: int, limit: int = 50,
+                              before: Optional[Tuple[str, int]] = None) -> List[Dict[str, Any]]:
+        """Récupère l'historique des exécutions d'un utilisateur
+        
+        Passer en `before` la clé (started_at, id) de la dernière ligne reçue pour la page suivante.
+        """
+        keyset, params = "", (user_id,)
+        if before is not None:
+            keyset = "AND (e.started_at, e.id) < (?, ?)"
+            params += tuple(before)
+        query = f"""
             SELECT e.*, a.name as agent_name 
             FROM executions e 
             JOIN agents a ON e.agent_id = a.id 
-            WHERE e.created_by = ? 
-            ORDER BY e.started_at DESC 
+            WHERE e.created_by = ? {keyset}
+            ORDER BY e.started_at DESC, e.id DESC 
             LIMIT ?
         """
-        return self.execute_query(query, (user_id, limit))
-
+        return self.execute_query(query, params + (limit,))
+    
+    def explain_query_plan(self, query: str, params: tuple = ()) -> List[str]:
+        """Retourne le plan d'exécution SQLite d'une requête (EXPLAIN QUERY PLAN)"""
+        return [row["detail"] for row in self.execute_query(f"EXPLAIN QUERY PLAN {query}", params)]
+    
+    def check_query_plans(self) -> Dict[str, Dict[str, Any]]:
+        """Vérifie que les requêtes d'historique utilisent un index, sans parcours ni tri complet"""
+        report = {}
+        for name, (query, params) in QUERY_PLAN_CHECKS.items():
+            plan = self.explain_query_plan(query, params)
+            full_scan = any(
+                (detail.startswith("SCAN") and "USING" not in detail) or "TEMP B-TREE" in detail
+                for detail in plan
+            )
+            report[name] = {"plan": plan, "ok": bool(plan) and not full_scan}
+        return report
 
@@ -0,0 +1,150 @@
+# 📆 Dépôt des Tâches Planifiées
+# Tâches du planificateur stockées dans la table SQLite `planned_tasks` (anciennement data/planned_tasks.json)
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+import logging
+
+from .db_manager import DatabaseManager, BULK_CHUNK_SIZE
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TaskRepository:
+    """Persistance incrémentale des tâches planifiées : une ligne par tâche
+
+    Chaque changement d'état réécrit la seule ligne de la tâche concernée
+    (transaction SQLite atomique, journal WAL) au lieu du fichier complet.
+    Les colonnes indexées reprennent les champs filtrés ; la tâche entière
+    est conservée en JSON dans `data`.
+
+    Les colonnes lease_* servent de verrou d'exécution partagé entre les
+    processus (voir claim) ; elles ne sont jamais touchées par save().
+    """
+
+    UPSERT_QUERY = """
+        INSERT INTO planned_tasks (task_key, name, task_type, schedule_type, status, enabled,
+                                   next_execution, data, created_at, updated_at)
+        VALUES (:task_key, :name, :task_type, :schedule_type, :status, :enabled,
+                :next_execution, :data, :created_at, CURRENT_TIMESTAMP)
+        ON CONFLICT (task_key) DO UPDATE SET
+            name = excluded.name, task_type = excluded.task_type, schedule_type = excluded.schedule_type,
+            status = excluded.status, enabled = excluded.enabled, next_execution = excluded.next_execution,
+            data = excluded.data, updated_at = CURRENT_TIMESTAMP
+    """
+
+    # Une échéance n'est réclamée qu'une fois : aucun bail actif sur la tâche, et une échéance
+    # plus récente que la dernière réclamée (ou la même, si son bail a expiré sans libération)
+    CLAIM_QUERY = """
+        UPDATE planned_tasks SET lease_owner = :owner, lease_due = :due, lease_until = :until
+        WHERE task_key = :task_key AND enabled = 1
+          AND (lease_until IS NULL OR lease_until < :now)
+          AND (lease_due IS NULL OR lease_due < :due OR (lease_due = :due AND lease_until IS NOT NULL))
+    """
+
+    def __init__(self, db_manager: Optional[DatabaseManager] = None):
+        self.db = db_manager or DatabaseManager()
+
+    @staticmethod
+    def _params(task: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "task_key": task["id"],
+            "name": task.get("name", ""),
+            "task_type": task.get("type"),
+            "schedule_type": task.get("schedule_type"),
+            "status": task.get("status"),
+            "enabled": int(bool(task.get("enabled", True))),
+            "next_execution": task.get("next_execution"),
+            "data": json.dumps(task, ensure_ascii=False),
+            "created_at": task.get("created_at") or datetime.now().isoformat()
+        }
+
+    def save(self, task: Dict[str, Any]) -> bool:
+        """Enregistre l'état courant d'une tâche (création ou mise à jour)"""
+        return self.db.execute_update(self.UPSERT_QUERY, self._params(task))
+
+    def save_many(self, tasks: Iterable[Dict[str, Any]], chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        """Enregistre un lot de tâches par transactions groupées"""
+        return self.db.execute_many(self.UPSERT_QUERY, (self._params(task) for task in tasks), chunk_size)
+
+    def delete(self, task_id: str) -> bool:
+        """Supprime une tâche"""
+        return self.db.execute_update("DELETE FROM planned_tasks WHERE task_key = ?", (task_id,))
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Récupère une tâche par son identifiant"""
+        results = self.db.execute_query("SELECT data FROM planned_tasks WHERE task_key = ?", (task_id,))
+        return json.loads(results[0]["data"]) if results else None
+
+    def claim(self, task_id: str, owner: str, due: float, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """Réclame l'exécution de l'échéance `due` d'une tâche par une mise à jour conditionnelle atomique
+
+        Retourne l'état à jour de la tâche si ce processus a obtenu le bail,
+        None si un autre l'a déjà obtenu (ou si la tâche est désactivée ou supprimée).
+        """
+        now = time.time()
+        claimed = self.db.execute_rowcount(self.CLAIM_QUERY, {
+            "task_key": task_id, "owner": owner, "due": due, "until": now + lease_seconds, "now": now
+        })
+        return self.get(task_id) if claimed == 1 else None
+
+    def release(self, task_id: str, owner: str, due: float) -> bool:
+        """Libère le bail à la fin de l'exécution : l'échéance est marquée comme traitée"""
+        return self.db.execute_rowcount(
+            "UPDATE planned_tasks SET lease_until = NULL WHERE task_key = ? AND lease_owner = ? AND lease_due = ?",
+            (task_id, owner, due)
+        ) == 1
+
+    def latest_update(self) -> Optional[str]:
+        """Date de la dernière modification d'une tâche (point de départ de la synchronisation)"""
+        results = self.db.execute_query("SELECT MAX(updated_at) AS latest FROM planned_tasks")
+        return results[0]["latest"] if results else None
+
+    def load_changed(self, since: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Tâches créées ou modifiées depuis `since` (inclus) et date de la plus récente"""
+        if since is None:
+            rows = self.db.execute_query("SELECT data, updated_at FROM planned_tasks ORDER BY updated_at")
+        else:
+            rows = self.db.execute_query(
+                "SELECT data, updated_at FROM planned_tasks WHERE updated_at >= ? ORDER BY updated_at", (since,)
+            )
+        latest = rows[-1]["updated_at"] if rows else since
+        return [json.loads(row["data"]) for row in rows], latest
+
+    def load_all(self) -> List[Dict[str, Any]]:
+        """Toutes les tâches, dans l'ordre de création (reconstruction du planning au démarrage)"""
+        rows = self.db.execute_query("SELECT data FROM planned_tasks ORDER BY created_at, task_key")
+        return [json.loads(row["data"]) for row in rows]
+
+    def task_keys(self) -> set:
+        """Identifiants de toutes les tâches (détection des suppressions faites par un autre processus)"""
+        return {row["task_key"] for row in self.db.execute_query("SELECT task_key FROM planned_tasks")}
+
+    def count(self, enabled: Optional[bool] = None) -> int:
+        """Compte les tâches sans les charger"""
+        query, params = "SELECT COUNT(*) AS total FROM planned_tasks", ()
+        if enabled is not None:
+            query += " WHERE enabled = ?"
+            params = (int(enabled),)
+        results = self.db.execute_query(query, params)
+        return results[0]["total"] if results else 0
+
+    def import_from_json(self, json_path: str = "data/planned_tasks.json") -> int:
+        """Importe l'ancien fichier planned_tasks.json en une seule écriture groupée"""
+        if not os.path.exists(json_path):
+            return 0
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                tasks = json.load(f)
+        except Exception as e:
+            logger.error(f"Erreur lors de la lecture de {json_path}: {e}")
+            return 0
+
+        imported = self.save_many(task for task in tasks if task.get("id"))
+        logger.info(f"{imported} tâches planifiées importées depuis {json_path}")
+        return imported
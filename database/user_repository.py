@@ -0,0 +1,137 @@
+# 👥 Dépôt des Utilisateurs
+# Comptes utilisateurs stockés dans la table SQLite `users` (anciennement data/users.json)
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Optional
+import logging
+
+from .db_manager import DatabaseManager, BULK_CHUNK_SIZE
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Colonnes modifiables par update()
+UPDATABLE_FIELDS = {"email", "role", "password_hash", "is_active", "last_login"}
+
+
+class UserRepository:
+    """Accès indexé aux utilisateurs (username et email uniques)"""
+
+    INSERT_QUERY = """
+        INSERT OR IGNORE INTO users (username, email, password_hash, role, created_at, last_login, is_active)
+        VALUES (:username, :email, :password_hash, :role, COALESCE(:created_at, CURRENT_TIMESTAMP),
+                :last_login, :is_active)
+    """
+
+    def __init__(self, db_manager: Optional[DatabaseManager] = None):
+        self.db = db_manager or DatabaseManager()
+
+    @staticmethod
+    def _row_to_user(row: Dict[str, Any]) -> Dict[str, Any]:
+        row["is_active"] = bool(row.get("is_active", 1))
+        return row
+
+    def _get_one(self, column: str, value: Any) -> Optional[Dict[str, Any]]:
+        results = self.db.execute_query(f"SELECT * FROM users WHERE {column} = ?", (value,))
+        return self._row_to_user(results[0]) if results else None
+
+    def get(self, username: str) -> Optional[Dict[str, Any]]:
+        """Récupère un utilisateur par son nom d'utilisateur (actif ou non)"""
+        return self._get_one("username", username)
+
+    def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Récupère un utilisateur par son email"""
+        return self._get_one("email", email)
+
+    def get_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Récupère un utilisateur par son ID"""
+        return self._get_one("id", user_id)
+
+    def exists(self, username: str) -> bool:
+        return bool(self.db.execute_query("SELECT 1 FROM users WHERE username = ?", (username,)))
+
+    def _filtered_query(self, select: str, role: Optional[str], is_active: Optional[bool]):
+        query, params = f"{select} FROM users WHERE 1 = 1", ()
+        if role is not None:
+            query += " AND role = ?"
+            params += (role,)
+        if is_active is not None:
+            query += " AND is_active = ?"
+            params += (int(is_active),)
+        return query, params
+
+    def list_users(self, role: Optional[str] = None, is_active: Optional[bool] = None,
+                   limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        """Liste les utilisateurs par ordre alphabétique"""
+        query, params = self._filtered_query("SELECT *", role, is_active)
+        query += " ORDER BY username"
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params += (limit, offset)
+        return [self._row_to_user(row) for row in self.db.execute_query(query, params)]
+
+    def count(self, role: Optional[str] = None, is_active: Optional[bool] = None) -> int:
+        """Compte les utilisateurs sans les charger"""
+        query, params = self._filtered_query("SELECT COUNT(*) AS total", role, is_active)
+        results = self.db.execute_query(query, params)
+        return results[0]["total"] if results else 0
+
+    def create(self, username: str, email: str, password_hash: str, role: str = "user") -> Optional[int]:
+        """Crée un utilisateur ; retourne son ID, ou None si le nom ou l'email est déjà pris"""
+        return self.db.insert_user(username, email, password_hash, role)
+
+    def update(self, username: str, fields: Dict[str, Any]) -> bool:
+        """Met à jour uniquement les champs fournis d'un utilisateur"""
+        fields = {k: v for k, v in fields.items() if k in UPDATABLE_FIELDS}
+        if not fields:
+            return True
+        assignments = ", ".join(f"{column} = :{column}" for column in fields)
+        return self.db.execute_update(f"UPDATE users SET {assignments} WHERE username = :username",
+                                      dict(fields, username=username))
+
+    def touch_last_login(self, username: str) -> bool:
+        """Enregistre la date de dernière connexion"""
+        return self.update(username, {"last_login": datetime.now().isoformat()})
+
+    def delete(self, username: str) -> bool:
+        """Supprime un utilisateur"""
+        return self.db.execute_update("DELETE FROM users WHERE username = ?", (username,))
+
+    @staticmethod
+    def _import_params(user: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "username": user["username"],
+            "email": user.get("email") or f"{user['username']}@localhost",
+            "password_hash": user["password_hash"],
+            "role": user.get("role", "user"),
+            "created_at": user.get("created_at"),
+            "last_login": user.get("last_login"),
+            "is_active": int(user.get("is_active", True))
+        }
+
+    def bulk_import(self, users: Iterable[Dict[str, Any]], chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        """Importe des utilisateurs déjà hachés par transactions groupées
+
+        Les noms d'utilisateur ou emails déjà présents sont ignorés (import idempotent).
+        Retourne le nombre d'utilisateurs créés.
+        """
+        return self.db.execute_many(self.INSERT_QUERY, (self._import_params(user) for user in users), chunk_size)
+
+    def import_from_json(self, json_path: str = "data/users.json") -> int:
+        """Importe un fichier users.json ({username: {...}}) en une seule écriture groupée"""
+        if not os.path.exists(json_path):
+            return 0
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                users = json.load(f)
+        except Exception as e:
+            logger.error(f"Erreur lors de la lecture de {json_path}: {e}")
+            return 0
+
+        # La clé du fichier est le nom de connexion, même si le champ username diffère
+        imported = self.bulk_import(dict(user, username=username) for username, user in users.items())
+        logger.info(f"{imported} utilisateurs importés depuis {json_path}")
+        return imported
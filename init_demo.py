@@ -9,6 +9,8 @@ import os
 import shutil
 from datetime import datetime
 
+from database.agent_repository import AgentRepository
+
 def init_demo():
     """Initialise la démonstration avec des agents pré-configurés"""
     
@@ -31,20 +33,26 @@ def init_demo():
     
     # Vérifier si des agents existent déjà
     agents_file = "agents.json"
+    repository = AgentRepository()
+    existing_count = repository.count()
     if os.path.exists(agents_file):
         try:
             with open(agents_file, 'r', encoding='utf-8') as f:
-                existing_agents = json.load(f)
-            
-            if existing_agents:
-                print(f"⚠️ {len(existing_agents)} agents existants détectés")
-                response = input("Voulez-vous remplacer les agents existants ? (o/n): ").lower()
-                if response != 'o':
-                    print("❌ Initialisation annulée")
-                    return False
+                existing_count = max(existing_count, len(json.load(f)))
         except Exception as e:
             print(f"⚠️ Erreur lors de la lecture des agents existants: {e}")
     
+    if existing_count:
+        print(f"⚠️ {existing_count} agents existants détectés")
+        response = input("Voulez-vous remplacer les agents existants ? (o/n): ").lower()
+        if response != 'o':
+            print("❌ Initialisation annulée")
+            return False
+    
+    # Charger les agents dans la base en une seule écriture groupée
+    imported = repository.import_agents(demo_agents, replace=True)
+    print(f"✅ {imported} agents de démonstration enregistrés dans la base de données")
+    
     # Sauvegarder les agents de démonstration
     try:
         with open(agents_file, 'w', encoding='utf-8') as f:
@@ -122,7 +130,8 @@ Ce script:
   • Prépare la plateforme pour la démonstration
 
 Fichiers créés:
-  • agents.json     - Base de données des agents
+  • data/ai_platform.db - Catalogue des agents (SQLite)
+  • agents.json     - Copie JSON des agents
   • models.json     - Configuration des modèles IA
 
 Agents de démonstration:
@@ -15,7 +15,8 @@ class Agent(Base):
     model = Column(String(100))
     system_prompt = Column(Text)
     status = Column(String(20), default='active')
-    metadata = Column(JSON)  # Stockage flexible des métadonnées
+    # 'metadata' est réservé par SQLAlchemy : la colonne garde son nom, l'attribut est suffixé
+    metadata_ = Column("metadata", JSON)  # Stockage flexible des métadonnées
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -34,7 +35,7 @@ class Agent(Base):
             'model': self.model,
             'system_prompt': self.system_prompt,
             'status': self.status,
-            'metadata': self.metadata or {},
+            'metadata': self.metadata_ or {},
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'owner_id': self.owner_id
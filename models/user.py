@@ -6,6 +6,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import datetime
 import os
+import uuid
 from config.database import Base
 
 class User(Base):
@@ -37,10 +38,13 @@ class User(Base):
     
     def generate_token(self, expires_in=3600):
         """Génère un token JWT sécurisé"""
+        now = datetime.datetime.utcnow()
         payload = {
             'user_id': self.id,
             'username': self.username,
-            'exp': datetime.datetime.utcnow() + datetime.timedelta(seconds=expires_in)
+            'jti': uuid.uuid4().hex,  # identifiant du token : clé de cache et de révocation
+            'iat': now,
+            'exp': now + datetime.timedelta(seconds=expires_in)
         }
         return jwt.encode(payload, os.getenv('JWT_SECRET_KEY', 'your-secret-key'), algorithm='HS256')
     
@@ -1,14 +1,25 @@
 import streamlit as st
-import json
-import os
 from datetime import datetime
 import PyPDF2
 from docx import Document
-import io
-import base64
 from agents.email_agent import email_agent
+from database.db_manager import DatabaseManager
+from database.agent_repository import AgentRepository
 import time
 
+# Import du module d'intégration IA
+try:
+    import ai_integration
+    from ai_router import agent_models
+    from ai_usage import usage_columns, sum_usage
+    from ai_context import create_context_builder
+    AI_AVAILABLE = True
+except ImportError:
+    AI_AVAILABLE = False
+
+# Intervalle minimal entre deux rafraîchissements de l'affichage en streaming
+STREAM_REFRESH_INTERVAL = 0.05
+
 current_agent = st.session_state.current_agent
 
 # Configuration de la page
@@ -97,16 +108,19 @@ st.markdown("""
 
 
 # Fonctions utilitaires
-def load_agents():
-    if os.path.exists('agents.json'):
-        with open('agents.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+@st.cache_resource
+def get_db_manager():
+    return DatabaseManager()
+
 
+@st.cache_resource
+def get_agent_repository():
+    return AgentRepository(get_db_manager())
 
-def save_agents(agents):
-    with open('agents.json', 'w', encoding='utf-8') as f:
-        json.dump(agents, f, ensure_ascii=False, indent=2)
+
+@st.cache_resource
+def get_context_builder():
+    return create_context_builder(ai_integration.ai_orchestrator)
 
 
 def extract_text_from_pdf(pdf_file):
@@ -135,13 +149,88 @@ def extract_text_from_docx(docx_file):
         return None
 
 
-def simulate_ai_processing(agent, content, user_prompt):
-    """Simule le traitement IA (remplacez par votre vraie API)"""
+def build_user_input(content, user_prompt):
+    """Combine le contenu à traiter et les instructions de l'utilisateur"""
+    if user_prompt and user_prompt.strip():
+        return f"{user_prompt.strip()}\n\n{content}"
+    return content
+
+
+def prepare_context(agent, content, user_prompt):
+    """Adapte le contenu à la fenêtre du modèle (résumé par parties des documents volumineux)"""
+    if not AI_AVAILABLE or not ai_integration.ai_orchestrator.has_provider(agent_models(agent)):
+        return {"content": content, "strategy": "direct", "usage": None, "cost": 0.0}
+
+    progress_bar = st.empty()
+
+    def show_progress(done, total):
+        progress_bar.progress(done / total, text=f"📑 Document volumineux : résumé des parties ({done}/{total})")
+
+    context = get_context_builder().build(
+        agent_models(agent), agent.get('system_prompt', ''), user_prompt, content, progress=show_progress
+    )
+    progress_bar.empty()
+    if context["strategy"] != "direct":
+        st.info(f"📑 Document de {context['document_tokens']:,} tokens ramené à "
+                f"{context['context_tokens']:,} tokens ({context['strategy']}, {context['chunks']} parties)")
+    if context.get("truncated"):
+        st.warning("⚠️ Le document dépasse la taille maximale traitée : seul son début a été pris en compte")
+    return context
+
+
+def stream_ai_processing(agent, content, user_prompt, meta=None):
+    """Exécute l'agent avec son modèle IA et affiche la réponse au fil des tokens
+
+    `meta` reçoit le modèle qui a répondu et l'origine de la réponse (cache, simulation).
+    """
+    model_name = agent.get('model')
+    if not AI_AVAILABLE or not ai_integration.ai_orchestrator.has_provider(agent_models(agent)):
+        return simulate_ai_processing(agent, content, user_prompt)
+
+    placeholder = st.empty()
+    response = ""
+    last_refresh = 0.0
+    try:
+        for delta in ai_integration.ai_orchestrator.stream_request(
+            agent_models(agent),
+            agent.get('system_prompt', ''),
+            build_user_input(content, user_prompt),
+            meta=meta
+        ):
+            response += delta
+            now = time.monotonic()
+            if now - last_refresh >= STREAM_REFRESH_INTERVAL:
+                placeholder.markdown(response + "▌")
+                last_refresh = now
+    except Exception as e:
+        placeholder.empty()
+        st.error(f"❌ Erreur du modèle {model_name}: {e}")
+        return None
 
+    placeholder.empty()
+    return response
 
-    # Simulation du traitement
-    with st.spinner("🤖 L'agent IA traite votre demande..."):
-        time.sleep(2)  # Simulation du délai de traitement
+
+def execution_usage(agent, context, user_prompt, response):
+    """Tokens et coût d'une exécution : réponse diffusée (estimée) et résumés du document
+
+    Aucun pour une réponse simulée.
+    """
+    models = agent_models(agent) if AI_AVAILABLE else []
+    if not models or not ai_integration.ai_orchestrator.has_provider(models):
+        return {}
+    usage = ai_integration.ai_orchestrator.stream_usage(
+        models, agent.get('system_prompt', ''), build_user_input(context["content"], user_prompt), response,
+        meta=context.get("stream")
+    )
+    if context.get("usage"):
+        usage["usage"] = sum_usage([usage["usage"], context["usage"]])
+        usage["cost"] = (usage["cost"] or 0) + context["cost"]
+    return usage_columns(usage)
+
+
+def simulate_ai_processing(agent, content, user_prompt):
+    """Simule le traitement IA quand le modèle de l'agent n'est pas configuré"""
 
     # Génération d'une réponse simulée basée sur le type d'agent
     agent_type = agent.get('type', 'Analyse')
@@ -208,7 +297,7 @@ def simulate_ai_processing(agent, content, user_prompt):
         Traitement terminé avec succès selon les spécifications de l'agent.
                 """
 
-        return response
+    return response
 
 
 # Vérification de l'agent sélectionné
@@ -332,8 +421,14 @@ with col2:
             disabled=not file_uploaded
     ):
         if content:
-            # Exécution de l'agent
-            result = simulate_ai_processing(current_agent, content, user_prompt)
+            # Exécution de l'agent (affichage progressif des tokens)
+            started = time.perf_counter()
+            context = prepare_context(current_agent, content, user_prompt)
+            result = stream_ai_processing(current_agent, context["content"], user_prompt,
+                                          meta=context.setdefault("stream", {}))
+            execution_time = time.perf_counter() - started
+            if result is None:
+                st.stop()
 
             # Affichage du résultat
             st.markdown("### 🎯 Résultat du Traitement")
@@ -400,21 +495,27 @@ with col2:
                 "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 "content_type": content_type,
                 "content_length": len(content),
-                "user_prompt": user_prompt
+                "user_prompt": user_prompt,
+                "context_strategy": context["strategy"],
+                "document_tokens": context.get("document_tokens"),
+                "context_chunks": context.get("chunks")
             }
 
             st.session_state.execution_history.append(execution_record)
 
-            # Sauvegarde dans le fichier des agents
-            agents = load_agents()
-            for agent in agents:
-                if agent.get('id') == current_agent.get('id'):
-                    if 'executions' not in agent:
-                        agent['executions'] = []
-                    agent['executions'].append(execution_record)
-                    break
-
-            save_agents(agents)
+            # Ajout au journal des exécutions (append-only, agents.json reste limité aux métadonnées)
+            stored_agent = get_agent_repository().get(current_agent.get('id'))
+            if stored_agent:
+                get_db_manager().log_execution(
+                    agent_id=stored_agent['db_id'],
+                    status="completed",
+                    input_data=user_prompt,
+                    output_data=result,
+                    started_at=execution_record["timestamp"],
+                    execution_time=execution_time,
+                    metadata=execution_record,
+                    **execution_usage(current_agent, context, user_prompt, result)
+                )
 
             st.success("✅ Exécution terminée avec succès !")
         else:
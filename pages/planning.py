@@ -52,7 +52,10 @@ with st.expander("➕ Planifier une nouvelle tâche", expanded=True):
         elif schedule_type == "conditional":
             cond_type = st.selectbox("Condition", ["email","file","time"]) 
             condition = {"type": cond_type}
-            if cond_type == "file":
+            if cond_type == "email":
+                condition["email_sender"] = st.text_input("Expéditeur contient", placeholder="facturation@")
+                condition["email_subject"] = st.text_input("Sujet contient", placeholder="Facture")
+            elif cond_type == "file":
                 condition["file_path"] = st.text_input("Chemin du fichier à surveiller")
             elif cond_type == "time":
                 colA, colB = st.columns(2)
@@ -93,6 +96,8 @@ with st.expander("➕ Planifier une nouvelle tâche", expanded=True):
             target["action"] = st.text_input("Action personnalisée")
 
         max_exec = st.number_input("Nombre max d'exécutions (-1 illimité)", value=-1)
+        priority = st.selectbox("Priorité", ["normal", "high", "low"],
+                                format_func=lambda p: {"high": "Haute", "normal": "Normale", "low": "Basse"}[p])
 
         submitted = st.form_submit_button("📅 Planifier")
         if submitted:
@@ -103,7 +108,8 @@ with st.expander("➕ Planifier une nouvelle tâche", expanded=True):
                 "schedule_type": schedule_type,
                 "schedule_config": schedule_config,
                 "target": target,
-                "max_executions": int(max_exec)
+                "max_executions": int(max_exec),
+                "priority": priority
             }
             res = planner_agent.plan_task(payload)
             if res.get("success"):
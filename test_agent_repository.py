@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test pour le dépôt SQLite des agents
+"""
+
+import json
+import os
+import tempfile
+
+from database.db_manager import DatabaseManager
+from database.agent_repository import AgentRepository
+
+
+def make_repository(tmp):
+    return AgentRepository(DatabaseManager(os.path.join(tmp, "test.db")))
+
+
+def test_import_and_point_reads():
+    """L'import d'agents.json est idempotent et conserve les champs libres"""
+    with tempfile.TemporaryDirectory() as tmp:
+        repository = make_repository(tmp)
+        json_path = os.path.join(tmp, "agents.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump([
+                {"id": "agent_1", "name": "Analyste", "domain": "Finance", "type": "Analyse",
+                 "model": "GPT-4", "system_prompt": "...", "status": "active", "system": True},
+                {"id": "agent_2", "name": "Rédacteur", "domain": "Marketing", "type": "Rapport",
+                 "model": "Claude-3", "system_prompt": "...", "status": "inactive"}
+            ], f)
+
+        assert repository.import_from_json(json_path) == 2
+        assert repository.import_from_json(json_path) == 0
+
+        agent = repository.get("agent_1")
+        assert agent["name"] == "Analyste"
+        assert agent["model"] == "GPT-4"
+        assert agent["system"] is True
+        assert repository.get_by_name("Rédacteur")["id"] == "agent_2"
+        assert repository.count(status="active") == 1
+        assert [a["id"] for a in repository.list_agents(domain="Marketing")] == ["agent_2"]
+
+
+def test_update_and_delete():
+    """Les mises à jour ne touchent que l'agent visé"""
+    with tempfile.TemporaryDirectory() as tmp:
+        repository = make_repository(tmp)
+        repository.create({"id": "agent_1", "name": "A", "model": "GPT-4", "status": "active"})
+        repository.create({"id": "agent_2", "name": "B", "model": "GPT-4", "status": "active"})
+
+        assert repository.update("agent_1", {"name": "A2", "tags": ["x"]})
+        assert repository.get("agent_1")["name"] == "A2"
+        assert repository.get("agent_1")["tags"] == ["x"]
+        assert repository.get("agent_2")["name"] == "B"
+
+        assert repository.delete("agent_1")
+        assert repository.get("agent_1") is None
+        assert repository.count() == 1
+
+
+def test_import_moves_execution_history_out_of_agents():
+    """L'historique embarqué d'agents.json est versé dans la table executions"""
+    with tempfile.TemporaryDirectory() as tmp:
+        repository = make_repository(tmp)
+        json_path = os.path.join(tmp, "agents.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump([{"id": "agent_1", "name": "A", "model": "GPT-4", "executions": [
+                {"agent_id": "agent_1", "timestamp": "2025-08-24 03:51:20", "user_prompt": "un"},
+                {"agent_id": "agent_1", "timestamp": "2025-08-25 10:00:00", "user_prompt": "deux"}
+            ]}], f)
+
+        repository.import_from_json(json_path)
+        repository.import_from_json(json_path)
+
+        agent = repository.get("agent_1")
+        assert "executions" not in agent
+        executions = repository.db.get_executions(agent_id=agent["db_id"])
+        assert [e["input_data"] for e in executions] == ["deux", "un"]
+        assert executions[0]["metadata"]["timestamp"] == "2025-08-25 10:00:00"
+
+
+def test_unsaved_history_stays_in_agent_metadata():
+    """Une écriture partielle de l'historique laisse les exécutions restantes dans l'agent, reprises ensuite"""
+    with tempfile.TemporaryDirectory() as tmp:
+        repository = make_repository(tmp)
+        records = [{"timestamp": f"2025-08-2{i} 10:00:00", "user_prompt": str(i)} for i in range(3)]
+        insert = repository.db.bulk_insert_executions
+        repository.db.bulk_insert_executions = lambda executions, chunk_size=1000: insert(executions[:1])
+        repository.import_agents([{"id": "agent_1", "name": "A", "executions": records}])
+
+        agent = repository.get("agent_1")
+        assert [record["user_prompt"] for record in agent["executions"]] == ["1", "2"]
+        assert repository.migrate_embedded_executions() == 1
+        assert len(repository.get("agent_1")["executions"]) == 1
+
+        repository.db.bulk_insert_executions = insert
+        assert repository.migrate_embedded_executions() == 1
+        assert "executions" not in repository.get("agent_1")
+        executions = repository.db.get_executions(agent_id=agent["db_id"])
+        assert sorted(e["input_data"] for e in executions) == ["0", "1", "2"]
+
+
+if __name__ == "__main__":
+    test_import_and_point_reads()
+    test_update_and_delete()
+    test_import_moves_execution_history_out_of_agents()
+    test_unsaved_history_stays_in_agent_metadata()
+    print("✅ Tests du dépôt des agents réussis")
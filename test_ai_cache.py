@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test pour le cache des réponses IA
+"""
+
+import os
+import tempfile
+import time
+
+from ai_cache import MemoryResponseCache, SQLiteResponseCache, ResponseCache
+
+RESPONSE = {"success": True, "response": "Bonjour", "usage": {"total_tokens": 12}}
+
+
+def test_cache_key_depends_on_all_fields():
+    """La clé change avec le modèle, les prompts et les paramètres"""
+    base = ResponseCache.make_key("gpt-4", "sys", "input", {"temperature": 0.7})
+    assert base == ResponseCache.make_key("gpt-4", "sys", "input", {"temperature": 0.7})
+    assert base != ResponseCache.make_key("gpt-3.5", "sys", "input", {"temperature": 0.7})
+    assert base != ResponseCache.make_key("gpt-4", "autre", "input", {"temperature": 0.7})
+    assert base != ResponseCache.make_key("gpt-4", "sys", "input", {"temperature": 0.2})
+
+
+def test_memory_cache_hits_misses_and_lru_eviction():
+    """Le cache mémoire compte les hits/misses et évince l'entrée la moins récente"""
+    cache = MemoryResponseCache(ttl=None, max_entries=2)
+    assert cache.get("a") is None
+    cache.set("a", RESPONSE)
+    cache.set("b", RESPONSE)
+    assert cache.get("a") == RESPONSE  # "a" devient la plus récente
+    cache.set("c", RESPONSE)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == RESPONSE
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 2, 1)
+
+
+def test_memory_cache_ttl():
+    """Les entrées expirées ne sont plus servies"""
+    cache = MemoryResponseCache(ttl=0.05)
+    cache.set("a", RESPONSE)
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_sqlite_cache_persists_and_evicts():
+    """Le cache SQLite survit à la réouverture et reste borné"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.db")
+        cache = SQLiteResponseCache(path, ttl=None, max_entries=2)
+        cache.set("a", RESPONSE)
+        cache.set("b", RESPONSE)
+        cache.set("c", RESPONSE)
+        assert len(cache) == 2
+        assert cache.evictions == 1
+        cache.close()
+
+        reopened = SQLiteResponseCache(path, ttl=None, max_entries=2)
+        assert reopened.get("c") == RESPONSE
+        assert reopened.get("a") is None
+        reopened.close()
+
+
+def test_sqlite_cache_counts_only_when_full():
+    """Les écritures ne recomptent pas les entrées à chaque fois ; la limite reste respectée"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SQLiteResponseCache(os.path.join(tmp, "cache.db"), ttl=None, max_entries=50)
+        statements = []
+        cache._conn.set_trace_callback(statements.append)
+        for i in range(50):
+            cache.set(f"k{i}", RESPONSE)
+        cache.set("k0", RESPONSE)  # remplacement : taille surestimée, recalée sans éviction
+        assert sum("COUNT(*)" in statement for statement in statements) == 1
+        assert cache.evictions == 0
+
+        # Cache plein : éviction par lots de 10 %, un COUNT(*) toutes les 5 écritures au plus
+        statements.clear()
+        for i in range(50, 80):
+            cache.set(f"k{i}", RESPONSE)
+        cache._conn.set_trace_callback(None)
+        assert sum("COUNT(*)" in statement for statement in statements) <= 6
+        assert 45 <= len(cache) <= 50
+        assert cache.get("k79") == RESPONSE and cache.get("k1") is None
+        cache.close()
+
+
+if __name__ == "__main__":
+    test_cache_key_depends_on_all_fields()
+    test_memory_cache_hits_misses_and_lru_eviction()
+    test_memory_cache_ttl()
+    test_sqlite_cache_persists_and_evicts()
+    test_sqlite_cache_counts_only_when_full()
+    print("✅ Tests du cache réussis")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test de la construction du contexte (fenêtre, découpage, map-reduce)
+"""
+
+import threading
+
+from ai_context import ContextBuilder, chunk_text, get_context_window, truncate_text
+from ai_usage import count_tokens
+
+
+class FakeOrchestrator:
+    """Résume chaque partie en une ligne et enregistre les prompts reçus"""
+
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.fail_on = fail_on
+        self._lock = threading.Lock()
+
+    def process_request(self, models, system_prompt, user_input, **kwargs):
+        with self._lock:
+            self.calls.append((system_prompt, user_input, kwargs))
+        if self.fail_on and self.fail_on in user_input:
+            return {"success": False, "error": "quota"}
+        return {"success": True, "response": "résumé court",
+                "usage": {"prompt_tokens": 100, "completion_tokens": 5, "total_tokens": 105}, "cost": 0.001}
+
+
+def make_document(pages):
+    return "\n".join(f"Page {page} : " + "le contrat prévoit une clause de résiliation. " * 40
+                     for page in range(pages))
+
+
+def test_chunking_respects_budget_and_balances_parts():
+    """Chaque partie tient dans le budget, sans reliquat minuscule"""
+    document = make_document(50)
+    chunks = chunk_text(document, 2000)
+    assert all(count_tokens(chunk) <= 2000 for chunk in chunks)
+    sizes = [count_tokens(chunk) for chunk in chunks]
+    assert min(sizes) > max(sizes) / 2
+    assert "".join(chunks).replace("\n", "") == document.replace("\n", "")
+
+    one_line = "mot " * 5000
+    assert all(count_tokens(chunk) <= 1000 for chunk in chunk_text(one_line, 1000))
+    assert count_tokens(truncate_text(document, 300)) <= 300
+    assert get_context_window(["Claude-3", "GPT-4"]) == 8192
+
+
+def test_small_document_is_sent_unchanged():
+    """Un document qui tient dans la fenêtre ne déclenche aucun appel supplémentaire"""
+    orchestrator = FakeOrchestrator()
+    plan = ContextBuilder(orchestrator).build("GPT-4", "Tu es juriste.", "Résume", "Texte court.")
+    assert plan["strategy"] == "direct" and plan["content"] == "Texte court."
+    assert orchestrator.calls == []
+
+
+def test_large_document_is_map_reduced_with_stable_prefix():
+    """500 pages : parties résumées en parallèle, prompt système identique, coût additionné"""
+    orchestrator = FakeOrchestrator(fail_on="Partie 2/")
+    progress = []
+    builder = ContextBuilder(orchestrator, max_chunks=200)
+    plan = builder.build("GPT-4", "Tu es juriste.", "Liste les risques", make_document(500),
+                         progress=lambda done, total: progress.append(done))
+
+    assert plan["strategy"] == "map_reduce" and not plan["truncated"]
+    assert plan["calls"] == plan["chunks"] == len(orchestrator.calls)
+    assert plan["context_tokens"] <= builder.input_budget("GPT-4", "Tu es juriste.", "Liste les risques", 4000)
+    assert {system for system, _, _ in orchestrator.calls} == {"Tu es juriste."}
+    assert all(kwargs["max_tokens"] == builder.summary_tokens for _, _, kwargs in orchestrator.calls)
+    first_lines = {user_input.split("--- Partie")[0] for _, user_input, _ in orchestrator.calls}
+    assert len(first_lines) == 1
+    assert progress[-1] == plan["chunks"]
+    # La partie en échec est conservée sous forme tronquée, sans coût
+    assert "[Partie 2/" in plan["content"] and "Page " in plan["content"]
+    assert abs(plan["cost"] - 0.001 * (plan["calls"] - 1)) < 1e-9
+    assert plan["usage"]["total_tokens"] == 105 * (plan["calls"] - 1)
+
+
+def test_chunk_cap_and_truncate_strategy_bound_the_work():
+    """Le nombre d'appels est plafonné ; sans orchestrateur le document est tronqué"""
+    orchestrator = FakeOrchestrator()
+    plan = ContextBuilder(orchestrator, max_chunks=3).build("GPT-4", "", "", make_document(500))
+    assert plan["truncated"] and plan["calls"] == 3
+
+    plan = ContextBuilder(None).build("GPT-4", "", "", make_document(500))
+    assert plan["strategy"] == "truncate" and plan["truncated"] and plan["calls"] == 0
+
+
+if __name__ == "__main__":
+    test_chunking_respects_budget_and_balances_parts()
+    test_small_document_is_sent_unchanged()
+    test_large_document_is_map_reduced_with_stable_prefix()
+    test_chunk_cap_and_truncate_strategy_bound_the_work()
+    print("✅ Tests de la construction du contexte réussis")
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test du chargement paresseux de l'intégration IA
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+
+from ai_cache import MemoryResponseCache
+from ai_limits import ProviderLimiter
+from ai_integration import AIProvider, CachedProvider, GroqProvider, GrokProvider, _iter_sse_deltas
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Flux SSE /chat/completions : rôle seul, commentaire keep-alive, ligne illisible, fin de flux
+SSE_LINES = [
+    'data: {"choices": [{"delta": {"role": "assistant"}}]}',
+    "",
+    ": keep-alive",
+    'data: {"choices": [{"delta": {"content": "Bon"}}]}',
+    "data: pas du json",
+    'data: {"choices": [{"delta": {"content": "jour"}}]}',
+    "data: [DONE]",
+    'data: {"choices": [{"delta": {"content": "ignoré"}}]}',
+]
+
+
+class FakeStreamResponse:
+    """Réponse requests diffusée (stream=True)"""
+
+    def __init__(self, status_code, lines=()):
+        self.status_code = status_code
+        self.lines = list(lines)
+        self.headers = {}
+        self.text = ""
+        self.closed = False
+
+    def iter_lines(self, decode_unicode=False):
+        return iter(self.lines)
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    def post(self, url, **kwargs):
+        self.calls.append(kwargs)
+        return self.response
+
+
+class CountingProvider(AIProvider):
+    """Fournisseur qui diffuse deux fragments et compte ses appels"""
+
+    def __init__(self):
+        super().__init__("cle", "modele-test")
+        self.provider_name = "Test"
+        self.calls = 0
+
+    def stream_request(self, system_prompt, user_input, **kwargs):
+        self.calls += 1
+        yield "Bon"
+        yield "jour"
+
+
+def test_import_has_no_side_effects():
+    """Importer le module ne charge ni SDK, ni Streamlit, ni orchestrateur, et n'affiche rien"""
+    code = (
+        "import sys, ai_integration\n"
+        "loaded = [m for m in ('streamlit', 'requests', 'httpx', 'openai', 'anthropic', 'dotenv')"
+        " if m in sys.modules]\n"
+        "assert not loaded, loaded\n"
+        "assert ai_integration._orchestrator is None\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == ""
+
+
+def test_providers_are_built_on_first_use():
+    """Les fournisseurs déclarés ne sont construits qu'au premier get_provider"""
+    from ai_integration import AIOrchestrator
+
+    os.environ["META_API_KEY"] = "hf_test"
+    try:
+        orchestrator = AIOrchestrator()
+    finally:
+        del os.environ["META_API_KEY"]
+
+    assert "Llama 2" in orchestrator.list_available_models()
+    assert orchestrator.has_provider(["Inconnu", "Llama 2"])
+    assert "Llama 2" not in orchestrator.providers
+
+    provider = orchestrator.get_provider("Llama 2")
+    assert provider.provider_name == "Meta"
+    assert orchestrator.get_provider("Llama 2") is provider
+    assert orchestrator.get_provider("Inconnu") is None
+
+
+def test_iter_sse_deltas_keeps_only_text_until_done():
+    """Seuls les fragments de texte sont extraits, jusqu'à [DONE]"""
+    assert list(_iter_sse_deltas(SSE_LINES)) == ["Bon", "jour"]
+
+
+def test_grok_streams_tokens_and_falls_back_to_simulation():
+    """Grok diffuse le flux SSE ; une erreur de l'API donne la réponse simulée en un fragment"""
+    provider = GrokProvider("xai-test")
+    provider.session = FakeSession(FakeStreamResponse(200, SSE_LINES))
+    assert list(provider.stream_request("Système", "Question")) == ["Bon", "jour"]
+    call = provider.session.calls[0]
+    assert call["stream"] is True and call["json"]["stream"] is True
+    assert provider.session.response.closed
+
+    provider.session = FakeSession(FakeStreamResponse(404))
+    meta = {}
+    chunks = list(provider.stream_request("Système", "Question", meta=meta))
+    assert len(chunks) == 1 and "Question" in chunks[0] and meta["simulated"]
+
+
+def test_cached_provider_stream_serves_second_request_from_cache():
+    """Un flux complet est mis en cache ; la même requête est ensuite servie en un fragment"""
+    inner = CountingProvider()
+    provider = CachedProvider(inner, MemoryResponseCache())
+    assert list(provider.stream_request("Système", "Question")) == ["Bon", "jour"]
+    assert list(provider.stream_request("Système", "Question")) == ["Bonjour"]
+    assert inner.calls == 1
+    assert list(provider.stream_request("Système", "Question", use_cache=False)) == ["Bon", "jour"]
+    assert inner.calls == 2
+
+
+def test_stream_usage_bills_the_serving_model_and_skips_cache_hits():
+    """Après une bascule, le coût est celui du modèle qui a répondu ; un hit de cache ne coûte rien"""
+    from ai_integration import AIOrchestrator
+
+    class BrokenStream(CountingProvider):
+        def stream_request(self, system_prompt, user_input, **kwargs):
+            raise ConnectionError("indisponible")
+            yield
+
+    orchestrator = AIOrchestrator()
+    orchestrator.providers = {"GPT-4": BrokenStream(),
+                              "Groq": CachedProvider(CountingProvider(), MemoryResponseCache())}
+    models = ["GPT-4", "Groq"]
+
+    for cached in (False, True):
+        meta = {}
+        output = "".join(orchestrator.stream_request(models, "Système", "Question", meta=meta))
+        usage = orchestrator.stream_usage(models, "Système", "Question", output, meta=meta)
+        assert usage["model_name"] == "Groq" and usage["cached"] is cached
+        assert (usage["cost"] == 0.0) is cached and usage["usage"]["total_tokens"] > 0
+
+
+def test_async_clients_are_pooled_per_loop_and_closed_with_it():
+    """process_request_async réutilise un client par boucle ; il est fermé à l'arrêt de sa boucle"""
+    import httpx
+
+    requests_seen = []
+
+    def handler(request):
+        requests_seen.append(request)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "Bonjour"}}],
+                                         "usage": {"prompt_tokens": 3, "completion_tokens": 1}})
+
+    class MockedGroq(GroqProvider):
+        def _create_async_client(self):
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            clients.append(client)
+            return client
+
+    clients = []
+    provider = MockedGroq("gsk_test")
+    provider.limiter = ProviderLimiter("test")  # sans budget par minute
+
+    async def run_batch():
+        results = await asyncio.gather(*(provider.process_request_async("Système", f"Q{i}") for i in range(5)))
+        assert all(result["success"] and result["response"] == "Bonjour" for result in results)
+        assert len(clients) == 1 + run_batch.calls and not clients[-1].is_closed
+        run_batch.calls += 1
+
+    run_batch.calls = 0
+    asyncio.run(run_batch())
+    asyncio.run(run_batch())
+    assert len(requests_seen) == 10 and len(clients) == 2
+    assert all(client.is_closed for client in clients) and not provider._async_clients
+
+    async def explicit_close():
+        await provider.process_request_async("Système", "Q")
+        await provider.aclose()
+        assert clients[-1].is_closed and not provider._async_clients
+
+    asyncio.run(explicit_close())
+
+
+if __name__ == "__main__":
+    test_import_has_no_side_effects()
+    test_providers_are_built_on_first_use()
+    test_iter_sse_deltas_keeps_only_text_until_done()
+    test_grok_streams_tokens_and_falls_back_to_simulation()
+    test_cached_provider_stream_serves_second_request_from_cache()
+    test_stream_usage_bills_the_serving_model_and_skips_cache_hits()
+    test_async_clients_are_pooled_per_loop_and_closed_with_it()
+    print("✅ Tests de l'intégration IA réussis")
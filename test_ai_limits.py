@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test des limites des fournisseurs IA (concurrence, budgets, reprises)
+"""
+
+import asyncio
+import threading
+import time
+
+from ai_limits import ProviderLimiter, parse_retry_after, parse_reset_duration
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def test_parse_retry_after_and_reset_durations():
+    """Retry-After en secondes ou date HTTP, durées Groq en h/m/s/ms"""
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("n'importe quoi") is None
+    assert parse_reset_duration("1m2.5s") == 62.5
+    assert parse_reset_duration("450ms") == 0.45
+    assert parse_reset_duration("7.66s") == 7.66
+
+
+def test_request_and_token_budgets():
+    """Le budget est réservé sans dépassement et recalé sur l'usage réel"""
+    limiter = ProviderLimiter("test", requests_per_minute=2, tokens_per_minute=600)
+    assert limiter.reserve(100) == 0
+    assert limiter.reserve(100) == 0
+    assert limiter.reserve(100) > 0  # plus de requête disponible
+
+    limiter = ProviderLimiter("test", tokens_per_minute=600)
+    assert limiter.reserve(500) == 0
+    assert limiter.reserve(500) > 0
+    limiter.record_usage(500, {"total_tokens": 50})  # 450 tokens rendus
+    assert limiter.reserve(500) == 0
+
+    limiter.update_from_headers({"x-ratelimit-remaining-tokens": "0"})
+    assert limiter.reserve(10) > 0
+
+
+def test_retries_respect_retry_after_and_concurrency():
+    """Les 429/5xx sont réessayés après Retry-After ; la concurrence reste bornée"""
+    limiter = ProviderLimiter("test", max_concurrency=2, max_retries=3, base_delay=0.01)
+    responses = [FakeResponse(429, {"retry-after": "0.2"}), FakeResponse(503), FakeResponse(200)]
+    started = time.monotonic()
+    response = limiter.call(lambda: responses.pop(0))
+    assert response.status_code == 200
+    assert time.monotonic() - started >= 0.2
+    assert limiter.counters["retries"] == 2 and limiter.counters["rate_limited"] == 1
+
+    # Erreur définitive : aucune reprise
+    assert limiter.call(lambda: FakeResponse(400)).status_code == 400
+
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def send():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return FakeResponse(200)
+
+    threads = [threading.Thread(target=limiter.call, args=(send,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+
+    async def send_async():
+        return send()
+
+    async def burst():
+        return await asyncio.gather(*(limiter.acall(send_async) for _ in range(4)))
+
+    assert all(r.status_code == 200 for r in asyncio.run(burst()))
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_stream_keeps_its_slot_until_closed():
+    """Un flux occupe sa place de concurrence jusqu'à sa fermeture, reprises comprises"""
+    limiter = ProviderLimiter("flux", max_concurrency=2, max_retries=2, base_delay=0.01)
+    responses = [FakeResponse(503), FakeResponse(200)]
+    with limiter.stream(lambda: responses.pop(0)) as response:
+        assert response.status_code == 200 and limiter.stats()["in_flight"] == 1
+    assert limiter.stats()["in_flight"] == 0 and limiter.counters["server_errors"] == 1
+
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def consume():
+        with limiter.stream(lambda: FakeResponse(200)):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)  # lecture du flux
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=consume) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2 and limiter.counters["requests"] == 10
+
+
+if __name__ == "__main__":
+    test_parse_retry_after_and_reset_durations()
+    test_request_and_token_budgets()
+    test_retries_respect_retry_after_and_concurrency()
+    test_stream_keeps_its_slot_until_closed()
+    print("✅ Tests des limites des fournisseurs IA réussis")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test de la comptabilité des tokens et du calcul des coûts
+"""
+
+from ai_usage import normalize_usage, estimate_cost, account_result, usage_columns, count_tokens, sum_usage
+
+
+class SdkUsage:
+    """Usage au format objet, comme renvoyé par le SDK Anthropic"""
+    input_tokens = 12
+    output_tokens = 34
+
+
+def test_normalize_usage_from_every_provider_format():
+    """Champs OpenAI, Anthropic et Gemini ramenés au même format"""
+    openai = normalize_usage({"prompt_tokens": 5, "completion_tokens": 7, "total_tokens": 12})
+    assert openai == {"prompt_tokens": 5, "completion_tokens": 7, "total_tokens": 12, "estimated": False}
+    assert normalize_usage(SdkUsage())["total_tokens"] == 46
+    gemini = normalize_usage({"prompt_token_count": 3, "candidates_token_count": 4})
+    assert gemini["total_tokens"] == 7 and not gemini["estimated"]
+
+
+def test_missing_usage_is_estimated_from_texts():
+    """Sans usage fournisseur, les tokens sont comptés localement"""
+    usage = normalize_usage(None, "Bonjour, pouvez-vous résumer ce texte ?", "Oui.")
+    assert usage["estimated"]
+    assert usage["prompt_tokens"] == count_tokens("Bonjour, pouvez-vous résumer ce texte ?") > 0
+    assert usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"]
+
+    total_only = normalize_usage({"total_tokens": 100}, "", "Oui.")
+    assert total_only["total_tokens"] == 100 and total_only["estimated"]
+
+
+def test_cost_and_accounted_result():
+    """Coût calculé au tarif du modèle, nul pour une réponse en cache"""
+    usage = {"prompt_tokens": 1_000_000, "completion_tokens": 500_000}
+    assert estimate_cost("GPT-4", usage) == 60.0
+    assert estimate_cost("Modèle inconnu", usage) is None
+
+    result = {"success": True, "response": "Oui.", "usage": {"prompt_tokens": 10, "completion_tokens": 2}}
+    accounted = account_result(result, "GPT-3.5-turbo", "Question ?")
+    assert "cost" not in result
+    assert accounted["cost"] > 0 and accounted["model_name"] == "GPT-3.5-turbo"
+    assert account_result(dict(result, cached=True), "GPT-4", "Question ?")["cost"] == 0.0
+    assert account_result({"success": False, "error": "x"}, "GPT-4", "")["success"] is False
+
+    columns = usage_columns(accounted)
+    assert columns["total_tokens"] == 12 and columns["tokens_estimated"] == 0
+    assert usage_columns({"success": False})["total_tokens"] is None
+
+    combined = sum_usage([accounted["usage"], None, normalize_usage(None, "a", "b")])
+    assert combined["total_tokens"] == 12 + 2 and combined["estimated"]
+
+
+if __name__ == "__main__":
+    test_normalize_usage_from_every_provider_format()
+    test_missing_usage_is_estimated_from_texts()
+    test_cost_and_accounted_result()
+    print("✅ Tests de la comptabilité des tokens réussis")
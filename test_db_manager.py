@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test pour le gestionnaire de base de données SQLite
+"""
+
+import os
+import sqlite3
+import tempfile
+
+from database.db_manager import DatabaseManager
+
+
+def make_db(tmp):
+    return DatabaseManager(os.path.join(tmp, "test.db"))
+
+
+def test_execution_log_pagination_and_time_range():
+    """Le journal des exécutions se pagine et se filtre par période"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = make_db(tmp)
+        for day in range(1, 6):
+            assert db.log_execution(workflow_key="wf_1", started_at=f"2025-01-0{day} 12:00:00",
+                                    metadata={"day": day})
+        db.log_execution(workflow_key="wf_2", started_at="2025-01-03 12:00:00")
+
+        assert db.count_executions(workflow_key="wf_1") == 5
+        page = db.get_executions(workflow_key="wf_1", limit=2, offset=1)
+        assert [e["metadata"]["day"] for e in page] == [4, 3]
+
+        in_range = db.get_executions(since="2025-01-02", until="2025-01-04")
+        assert len(in_range) == 3
+
+
+def test_pooled_connections_use_wal_and_return_insert_ids():
+    """Les connexions sont réutilisées, en mode WAL, et les INSERT renvoient lastrowid"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = make_db(tmp)
+        with db._get_connection() as conn:
+            first = conn
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        with db._get_connection() as conn:
+            assert conn is first
+
+        user_id = db.insert_user("alice", "alice@example.com", "hash")
+        agent_ids = [db.insert_agent("Agent", "", "GPT-4", "", "{}", user_id) for _ in range(2)]
+        assert agent_ids[0] != agent_ids[1]
+        execution_id = db.insert_execution(agent_ids[1], "in", "", "running", user_id)
+        assert db.execute_query("SELECT agent_id FROM executions WHERE id = ?",
+                                (execution_id,))[0]["agent_id"] == agent_ids[1]
+        db.close()
+
+
+def test_bulk_writes_in_chunked_transactions():
+    """Les écritures groupées passent par lots et ignorent les agents déjà présents"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = make_db(tmp)
+        agents = [{"agent_key": f"agent_{i}", "name": f"Agent {i}", "metadata": {"i": i}} for i in range(25)]
+        assert db.bulk_insert_agents(agents, chunk_size=10) == 25
+        assert db.bulk_insert_agents(agents[:5]) == 0
+        assert db.bulk_insert_agents([{"agent_key": "agent_0", "name": "Renommé"}], upsert=True) == 1
+        assert db.execute_query("SELECT name FROM agents WHERE agent_key = 'agent_0'")[0]["name"] == "Renommé"
+
+        executions = ({"workflow_key": "wf", "status": "completed"} for _ in range(2500))
+        assert db.bulk_insert_executions(executions, chunk_size=1000) == 2500
+        assert db.count_executions(workflow_key="wf") == 2500
+
+        # Une ligne invalide n'annule que son lot
+        rows = [(f"k{i}",) for i in range(3)] + [(None,)]
+        assert db.execute_many("INSERT INTO agents (agent_key, name, model_type) VALUES (?, 'x', 'y')",
+                               rows[:2], chunk_size=1) == 2
+        assert db.execute_many("INSERT INTO agents (agent_key, name) VALUES (?, NULL)", rows) == 0
+        db.close()
+
+
+def test_schema_migrations_and_indexed_query_plans():
+    """Une base ancienne est migrée une seule fois et l'historique reste indexé"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        conn = sqlite3.connect(path)
+        conn.execute("""CREATE TABLE executions (id INTEGER PRIMARY KEY AUTOINCREMENT, agent_id INTEGER,
+                        workflow_id INTEGER, input_data TEXT, output_data TEXT, status TEXT NOT NULL,
+                        started_at TIMESTAMP, completed_at TIMESTAMP, execution_time REAL, created_by INTEGER)""")
+        conn.commit()
+        conn.close()
+
+        db = DatabaseManager(path)
+        assert db.get_schema_version() == len(db._migrations())
+        assert db.log_execution(workflow_key="wf", metadata={"ok": True})
+
+        report = db.check_query_plans()
+        assert all(check["ok"] for check in report.values()), report
+        assert "idx_executions_created_by_keyset" in report["execution_history"]["plan"][0]
+        db.close()
+
+        # Base déjà en v2 avec l'ancien index descendant : la v3 le remplace
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE INDEX idx_executions_created_by_started_at ON executions (created_by, started_at DESC)")
+        conn.execute("DROP INDEX idx_executions_created_by_keyset")
+        conn.execute("PRAGMA user_version = 2")
+        conn.commit()
+        conn.close()
+
+        db = DatabaseManager(path)
+        with db._get_connection() as conn:
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert "idx_executions_created_by_keyset" in indexes
+        assert "idx_executions_created_by_started_at" not in indexes
+        db.close()
+
+
+def test_keyset_pagination_and_streaming_iteration():
+    """Le curseur parcourt tout l'historique sans doublon, même à date égale"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = make_db(tmp)
+        db.bulk_insert_executions(
+            {"created_by": 1, "started_at": f"2025-01-0{1 + i // 3} 12:00:00", "metadata": {"i": i}}
+            for i in range(9)
+        )
+        db.log_execution(created_by=2, started_at="2025-01-05 12:00:00")
+
+        seen, cursor = [], None
+        while True:
+            page = db.get_executions_page(limit=4, cursor=cursor, created_by=1)
+            seen.extend(execution["metadata"]["i"] for execution in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert sorted(seen) == list(range(9))
+        assert seen[:3] == [8, 7, 6]
+
+        streamed = [execution["metadata"]["i"] for execution in db.iter_executions(batch_size=2, created_by=1)]
+        assert streamed == seen
+
+        try:
+            db.get_executions_page(cursor="pas-un-curseur")
+            assert False, "curseur invalide accepté"
+        except ValueError:
+            pass
+        db.close()
+
+
+def test_token_accounting_and_usage_summary():
+    """Les tokens et coûts des exécutions sont agrégés par modèle et par jour"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = make_db(tmp)
+        db.bulk_insert_executions([
+            {"agent_id": 1, "created_by": 1, "started_at": "2025-01-01 10:00:00", "model": "GPT-4",
+             "prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150, "cost": 0.006,
+             "execution_time": 2.0},
+            {"agent_id": 1, "created_by": 2, "started_at": "2025-01-02 10:00:00", "model": "Groq",
+             "prompt_tokens": 10, "completion_tokens": 30, "total_tokens": 40, "cost": 0.00001,
+             "tokens_estimated": 1, "execution_time": 0.5},
+            {"agent_id": 1, "created_by": 1, "started_at": "2025-01-02 11:00:00"}
+        ])
+        execution_id = db.get_last_execution_id()
+        db.update_execution_status(execution_id, "completed", "ok", execution_time=1.0, usage={
+            "model": "GPT-4", "prompt_tokens": 20, "completion_tokens": 10, "total_tokens": 30, "cost": 0.0012
+        })
+
+        by_model = {row["key"]: row for row in db.get_usage_summary("model")}
+        assert by_model["GPT-4"]["executions"] == 2
+        assert by_model["GPT-4"]["total_tokens"] == 180
+        assert abs(by_model["GPT-4"]["tokens_per_second"] - 20.0) < 1e-9
+        assert by_model["Groq"]["estimated_tokens"] == 40
+
+        by_day = db.get_usage_summary("day", since="2025-01-02 00:00:00", created_by=1)
+        assert [(row["key"], row["total_tokens"]) for row in by_day] == [("2025-01-02", 30)]
+
+        try:
+            db.get_usage_summary("couleur")
+            assert False, "regroupement inconnu accepté"
+        except ValueError:
+            pass
+        db.close()
+
+
+if __name__ == "__main__":
+    test_execution_log_pagination_and_time_range()
+    test_pooled_connections_use_wal_and_return_insert_ids()
+    test_bulk_writes_in_chunked_transactions()
+    test_schema_migrations_and_indexed_query_plans()
+    test_keyset_pagination_and_streaming_iteration()
+    test_token_accounting_and_usage_summary()
+    print("✅ Tests du gestionnaire de base de données réussis")
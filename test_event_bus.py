@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test du bus d'événements des tâches conditionnelles
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from agents.event_bus import EventBus
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def wait_for(event, timeout=2.0):
+    started = time.perf_counter()
+    assert event.wait(timeout), "événement non reçu"
+    return time.perf_counter() - started
+
+
+def test_thousand_file_conditions_share_one_watch():
+    """1 000 conditions sur un même dossier : un seul dossier surveillé, déclenchement immédiat"""
+    with tempfile.TemporaryDirectory() as tmp:
+        bus = EventBus()
+        bus.start()
+        fired, event = [], threading.Event()
+
+        def callback(i):
+            fired.append(i)
+            event.set()
+
+        for i in range(1000):
+            assert bus.subscribe(f"task_{i}", {"type": "file", "file_path": os.path.join(tmp, f"f{i}.csv")},
+                                 lambda i=i: callback(i))
+        assert bus.stats()["watched_directories"] == (1 if bus.use_watchdog else 0)
+
+        with open(os.path.join(tmp, "f42.csv"), "w") as f:
+            f.write("ok")
+        assert wait_for(event) < 1.5
+        time.sleep(0.1)
+        assert fired == [42]
+        assert "task_42" not in bus and len(bus) == 999  # abonnement à usage unique
+        bus.stop()
+
+
+def test_existing_file_and_polling_fallback():
+    """Un fichier déjà présent déclenche aussitôt ; un dossier absent est scruté jusqu'à sa création"""
+    with tempfile.TemporaryDirectory() as tmp:
+        present = os.path.join(tmp, "present.txt")
+        open(present, "w").close()
+        bus = EventBus(use_watchdog=False, poll_interval=0.05)
+        bus.start()
+        fired = []
+        bus.subscribe("present", {"type": "file", "file_path": present}, lambda: fired.append("present"))
+        assert fired == ["present"] and len(bus) == 0
+
+        event = threading.Event()
+        later = os.path.join(tmp, "plus", "tard.txt")
+        bus.subscribe("later", {"type": "file", "file_path": later}, event.set)
+        assert bus.stats()["polled_paths"] == 1
+        os.makedirs(os.path.dirname(later))
+        open(later, "w").close()
+        wait_for(event)
+
+        assert not bus.subscribe("horaire", {"type": "time"}, event.set)  # laissée à l'ordonnanceur
+        bus.stop()
+
+
+def test_maildir_email_condition():
+    """Un message livré dans new/ déclenche les seules conditions dont l'expéditeur et le sujet correspondent"""
+    for use_watchdog in (True, False):
+        with tempfile.TemporaryDirectory() as tmp:
+            for folder in ("tmp", "new", "cur"):
+                os.makedirs(os.path.join(tmp, folder))
+            bus = EventBus(maildir=tmp, poll_interval=0.05, use_watchdog=use_watchdog)
+            bus.start()
+            fired, event = [], threading.Event()
+            bus.subscribe("facture", {"type": "email", "email_sender": "compta@", "email_subject": "facture"},
+                          lambda: (fired.append("facture"), event.set()))
+            bus.subscribe("autre", {"type": "email", "email_sender": "rh@"}, lambda: fired.append("autre"))
+
+            draft = os.path.join(tmp, "tmp", "1.msg")
+            with open(draft, "wb") as f:
+                f.write("From: Compta <compta@exemple.fr>\nSubject: =?utf-8?q?Facture_d=C3=A9cembre?=\n\nCorps\n"
+                        .encode("utf-8"))
+            os.rename(draft, os.path.join(tmp, "new", "1.msg"))
+            wait_for(event)
+            time.sleep(0.1)
+            assert fired == ["facture"] and "autre" in bus, use_watchdog
+            bus.stop()
+
+    assert not EventBus().subscribe("sans_boite", {"type": "email"}, lambda: None)
+
+
+def test_planner_triggers_file_condition_on_creation():
+    """Une tâche conditionnelle sur fichier s'exécute dès la création du fichier, sans attendre 5 minutes"""
+    code = (
+        "import os, time\n"
+        "from agents.planner_agent import planner_agent\n"
+        "path = os.path.abspath('arrivee.csv')\n"
+        "res = planner_agent.plan_task({'name': 'import', 'type': 'custom_action', 'schedule_type': 'conditional',\n"
+        "    'schedule_config': {'condition': {'type': 'file', 'file_path': path}}})\n"
+        "assert res['task_id'] in planner_agent.events and res['task_id'] not in planner_agent.scheduler\n"
+        "open(path, 'w').close()\n"
+        "deadline = time.time() + 5\n"
+        "while planner_agent.get_task(res['task_id'])['enabled'] and time.time() < deadline:\n"
+        "    time.sleep(0.02)\n"
+        "task = planner_agent.get_task(res['task_id'])\n"
+        "assert task['execution_count'] == 1 and task['status'] == 'completed', task\n"
+        "assert planner_agent.get_stats()['events']['fired'] == 1\n"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        result = subprocess.run([sys.executable, "-c", code], cwd=tmp, env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+
+
+if __name__ == "__main__":
+    test_thousand_file_conditions_share_one_watch()
+    test_existing_file_and_polling_fallback()
+    test_maildir_email_condition()
+    test_planner_triggers_file_condition_on_creation()
+    print("✅ Tests du bus d'événements réussis")
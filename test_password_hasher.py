@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test pour le hachage des mots de passe
+"""
+
+import asyncio
+
+from auth.password_hasher import PasswordHasher
+
+
+def test_async_hash_and_verify():
+    """Le hachage et la vérification passent par le pool sans changer le résultat"""
+    hasher = PasswordHasher(rounds=4, max_workers=2)
+
+    async def scenario():
+        hashed = await hasher.hash_async("secret")
+        results = await asyncio.gather(*(hasher.verify_async(pwd, hashed) for pwd in ("secret", "autre")))
+        return hashed, results
+
+    hashed, results = asyncio.run(scenario())
+    assert results == [True, False]
+    assert hasher.verify("secret", hashed)
+    hasher.shutdown()
+
+
+def test_needs_rehash_when_cost_changes():
+    """Un hash calculé avec un autre coût est signalé pour mise à niveau"""
+    old_hash = PasswordHasher(rounds=4).hash("secret")
+    assert not PasswordHasher(rounds=4).needs_rehash(old_hash)
+    assert PasswordHasher(rounds=5).needs_rehash(old_hash)
+    assert PasswordHasher(rounds=5).needs_rehash("pas-un-hash-bcrypt")
+
+
+if __name__ == "__main__":
+    test_async_hash_and_verify()
+    test_needs_rehash_when_cost_changes()
+    print("✅ Tests du hachage des mots de passe réussis")
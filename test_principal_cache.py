@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test pour le cache des utilisateurs authentifiés
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from auth.principal_cache import PrincipalCache
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_ttl_bound_and_lru():
+    """Une entrée expire au plus tôt du TTL et du token, et le cache reste borné"""
+    cache = PrincipalCache(ttl=60, max_entries=2)
+    cache.set("jti-1", {"id": 1}, user_key=1, expires_at=time.time() - 1)
+    assert cache.get("jti-1") is None
+
+    cache.set("jti-1", {"id": 1}, user_key=1)
+    cache.set("jti-2", {"id": 2}, user_key=2)
+    assert cache.get("jti-1") == {"id": 1}
+    cache.set("jti-3", {"id": 3}, user_key=3)
+    assert cache.get("jti-2") is None  # la moins récemment utilisée
+    assert len(cache) == 2
+
+
+def test_invalidation_and_revocation():
+    """Changement de rôle : toutes les entrées de l'utilisateur ; déconnexion : le token reste refusé"""
+    cache = PrincipalCache()
+    cache.set("jti-a", {"id": 1, "role": "user"}, user_key=1)
+    cache.set("jti-b", {"id": 1, "role": "user"}, user_key=1)
+    cache.set("jti-c", {"id": 2}, user_key=2)
+
+    cache.invalidate_user(1)
+    assert cache.get("jti-a") is None and cache.get("jti-b") is None
+    assert cache.get("jti-c") == {"id": 2}
+
+    cache.revoke("jti-c", until=time.time() + 60)
+    assert cache.is_revoked("jti-c")
+    cache.set("jti-c", {"id": 2}, user_key=2)
+    assert cache.get("jti-c") is None
+
+    cache.revoke("jti-d", until=time.time() - 1)
+    assert not cache.is_revoked("jti-d")
+
+
+def test_jwt_revocation_is_shared_between_workers():
+    """Un token révoqué par un worker est refusé par un autre, même s'il l'a en cache"""
+    code = (
+        "import time, uuid, jwt\n"
+        "from types import SimpleNamespace\n"
+        "from auth.authentication import AuthenticationManager\n"
+        "from auth.principal_cache import principal_cache\n"
+        "from auth.session_store import SQLiteSessionStore\n"
+        "worker_a = AuthenticationManager(SQLiteSessionStore('sessions.db'))\n"
+        "worker_b = AuthenticationManager(SQLiteSessionStore('sessions.db'))\n"
+        "exp = int(time.time()) + 600\n"
+        "jti = uuid.uuid4().hex\n"
+        "token = jwt.encode({'user_id': 1, 'jti': jti, 'exp': exp}, worker_b.secret_key, algorithm='HS256')\n"
+        "principal_cache.set(jti, SimpleNamespace(id=1, username='alice'), user_key=1, expires_at=exp)\n"
+        "assert worker_b.get_principal(token).username == 'alice'\n"
+        "worker_a.revoke_token(token)\n"
+        "principal_cache._revoked.clear()  # la révocation locale n'existe que dans le worker A\n"
+        "principal_cache.set(jti, SimpleNamespace(id=1, username='alice'), user_key=1, expires_at=exp)\n"
+        "assert worker_b.get_principal(token) is None\n"
+        "assert principal_cache.is_revoked(jti)\n"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        result = subprocess.run([sys.executable, "-c", code], cwd=tmp, env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+
+
+if __name__ == "__main__":
+    test_ttl_bound_and_lru()
+    test_invalidation_and_revocation()
+    test_jwt_revocation_is_shared_between_workers()
+    print("✅ Tests du cache des utilisateurs réussis")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test pour la limitation de débit de l'API
+"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.rate_limit import (MemoryRateLimitBackend, SQLiteRateLimitBackend, RateLimitMiddleware,
+                            RateLimitRule)
+from auth.principal_cache import principal_cache
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_token_bucket_burst_then_refill():
+    """Le seau autorise une rafale de `capacity` requêtes puis annonce l'attente"""
+    backend = MemoryRateLimitBackend()
+    results = [backend.acquire("k", capacity=3, refill_rate=1.0) for _ in range(4)]
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert 0 < results[-1][1] <= 1.0
+
+
+def test_shared_backend_enforces_one_budget_across_workers():
+    """Deux workers sur le même fichier partagent le même seau"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rate_limits.db")
+        worker_a, worker_b = SQLiteRateLimitBackend(path), SQLiteRateLimitBackend(path)
+        assert worker_a.acquire("login:1.2.3.4", capacity=2, refill_rate=0.01)[0]
+        assert worker_b.acquire("login:1.2.3.4", capacity=2, refill_rate=0.01)[0]
+        allowed, wait = worker_a.acquire("login:1.2.3.4", capacity=2, refill_rate=0.01)
+        assert not allowed and wait > 50
+
+
+def test_idle_buckets_are_purged_and_lock_wait_is_bounded():
+    """Les seaux inactifs sont purgés ; un verrou tenu par un autre worker ne bloque pas longtemps"""
+    memory = MemoryRateLimitBackend()
+    for i in range(100):
+        memory.acquire(f"ip:{i}", capacity=1, refill_rate=1.0)
+    assert memory.purge_idle(max_idle=3600) == 0
+    assert memory.purge_idle(max_idle=-1) == 100 and not memory._buckets
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rate_limits.db")
+        worker_a, worker_b = SQLiteRateLimitBackend(path), SQLiteRateLimitBackend(path, lock_timeout=0.05)
+        worker_a.acquire("k", capacity=1, refill_rate=1.0)
+        worker_a._conn.execute("BEGIN IMMEDIATE")
+        started = time.perf_counter()
+        try:
+            worker_b.acquire("k", capacity=1, refill_rate=1.0)
+            assert False, "verrou ignoré"
+        except sqlite3.OperationalError:
+            assert time.perf_counter() - started < 1
+        worker_a._conn.execute("ROLLBACK")
+        assert worker_a.purge_idle(max_idle=-1) == 1
+
+
+def test_middleware_returns_429_with_retry_after():
+    """Les routes ciblées renvoient 429 + Retry-After, les autres ne sont pas affectées"""
+    app = FastAPI()
+
+    @app.post("/auth/login")
+    async def login():
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"ok": True}
+
+    rules = [RateLimitRule("login_ip", "ip", capacity=2, per_minute=6, path_prefixes=("/auth/login",))]
+    app.add_middleware(RateLimitMiddleware, rules=rules, backend=MemoryRateLimitBackend())
+    client = TestClient(app)
+
+    assert [client.post("/auth/login").status_code for _ in range(2)] == [200, 200]
+    response = client.post("/auth/login")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "10"
+    assert response.json()["rule"] == "login_ip"
+    assert client.get("/health").status_code == 200
+
+    middleware = RateLimitMiddleware.instances[-1]
+    assert middleware.stats()["rules"]["login_ip"] == {"allowed": 2, "throttled": 1}
+
+
+def test_unknown_tokens_share_the_ip_bucket():
+    """Des tokens inconnus ne créent pas de seaux neufs : ils partagent celui de l'IP"""
+    app = FastAPI()
+
+    @app.post("/execute")
+    async def execute():
+        return {"ok": True}
+
+    rules = [RateLimitRule("execute_user", "user", capacity=2, per_minute=1, path_prefixes=("/execute",)),
+             RateLimitRule("execute_route", "route", capacity=100, per_minute=1, path_prefixes=("/execute",))]
+    app.add_middleware(RateLimitMiddleware, rules=rules, backend=MemoryRateLimitBackend())
+    client = TestClient(app)
+
+    codes = [client.post("/execute", headers={"Authorization": f"Bearer faux-{i}"}).status_code
+             for i in range(5)]
+    assert codes == [200, 200, 429, 429, 429]
+    middleware = RateLimitMiddleware.instances[-1]
+    assert middleware.stats()["rules"]["execute_route"]["allowed"] == 2  # budget global épargné
+
+    # Un token déjà validé par l'authentification dispose de son propre seau
+    principal_cache.set("session-valide", {"username": "alice"}, user_key="alice")
+    assert client.post("/execute", headers={"Authorization": "Bearer session-valide"}).status_code == 200
+    principal_cache.invalidate("session-valide")
+
+
+def test_main_api_buckets_jwt_users_and_guards_metrics():
+    """api/main.py : seau par utilisateur pour les JWT mis en cache par jti, métriques réservées aux admins"""
+    code = (
+        "import time, uuid, jwt\n"
+        "from types import SimpleNamespace\n"
+        "from fastapi.testclient import TestClient\n"
+        "import api.main as main\n"
+        "from auth.principal_cache import principal_cache\n"
+        "def token_for(user_id, username, is_admin):\n"
+        "    exp, jti = int(time.time()) + 600, uuid.uuid4().hex\n"
+        "    principal_cache.set(jti, SimpleNamespace(id=user_id, username=username, is_admin=is_admin),\n"
+        "                        user_key=user_id, expires_at=exp)\n"
+        "    token = jwt.encode({'user_id': user_id, 'jti': jti, 'exp': exp}, main.auth_manager.secret_key,\n"
+        "                       algorithm='HS256')\n"
+        "    return {'Authorization': f'Bearer {token}'}\n"
+        "alice, bob = token_for(1, 'alice', True), token_for(2, 'bob', False)\n"
+        "client = TestClient(main.app)\n"
+        "codes = [client.post('/execute', headers=bob).status_code for _ in range(3)]\n"
+        "assert codes == [404, 404, 429], codes\n"
+        "assert client.post('/execute', headers=alice).status_code == 404  # seau propre, pas celui de l'IP\n"
+        "assert client.get('/metrics/throttling', headers=alice).json()['workers']\n"
+        "assert client.get('/metrics/throttling', headers=bob).status_code == 403\n"
+        "assert client.get('/metrics/throttling').status_code in (401, 403)\n"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=ROOT, RATE_LIMIT_BACKEND="memory", RATE_LIMIT_EXECUTE_BURST="2")
+        result = subprocess.run([sys.executable, "-c", code], cwd=tmp, env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+
+
+if __name__ == "__main__":
+    test_token_bucket_burst_then_refill()
+    test_shared_backend_enforces_one_budget_across_workers()
+    test_idle_buckets_are_purged_and_lock_wait_is_bounded()
+    test_middleware_returns_429_with_retry_after()
+    test_unknown_tokens_share_the_ip_bucket()
+    test_main_api_buckets_jwt_users_and_guards_metrics()
+    print("✅ Tests de la limitation de débit réussis")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test des routes de l'API REST (streaming SSE, lots NDJSON, authentification)
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Préambule commun : API importée dans un dossier temporaire, fournisseur IA factice
+SETUP = (
+    "import asyncio, json\n"
+    "from fastapi.testclient import TestClient\n"
+    "import api.rest_api as api\n"
+    "db = api.db_manager\n"
+    "db.insert_user('alice', 'alice@exemple.fr', 'x', 'admin')\n"
+    "user_id = db.get_user_id('alice')\n"
+    "agent_id = db.insert_agent('Agent', 'test', 'grok-beta', '', '{}', user_id)\n"
+    "class FakeOrchestrator:\n"
+    "    active = peak = 0\n"
+    "    async def process_request_async(self, models, system_prompt, user_input, **kwargs):\n"
+    "        self.active += 1\n"
+    "        self.peak = max(self.peak, self.active)\n"
+    "        await asyncio.sleep(float(user_input))\n"
+    "        self.active -= 1\n"
+    "        return {'success': True, 'response': f'ok {user_input}', 'usage': {'total_tokens': 2}, 'cost': 0.0}\n"
+    "    def has_provider(self, models):\n"
+    "        return True\n"
+    "    def stream_request(self, models, system_prompt, user_input, **kwargs):\n"
+    "        yield 'Bon'\n"
+    "        yield 'jour'\n"
+    "    def stream_usage(self, models, system_prompt, user_input, output, **kwargs):\n"
+    "        return {'model_name': 'grok-beta', 'usage': {'total_tokens': 3}, 'cost': 0.001}\n"
+    "orchestrator = FakeOrchestrator()\n"
+    "api.get_orchestrator = lambda: orchestrator\n"
+    "api.app.dependency_overrides[api.get_current_user] = lambda: {'username': 'alice', 'user_id': user_id,\n"
+    "                                                             'role': 'admin'}\n"
+    "client = TestClient(api.app)\n"
+)
+
+
+def run_api(code):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        result = subprocess.run([sys.executable, "-c", SETUP + code], cwd=tmp, env=env,
+                                capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+
+
+def test_execute_stream_sse_framing():
+    """/execute/stream : événements start, deltas puis done, chacun terminé par une ligne vide"""
+    run_api(
+        "response = client.post('/execute/stream', json={'agent_id': agent_id, 'input_data': 'Salut'})\n"
+        "assert response.status_code == 200\n"
+        "assert response.headers['content-type'].startswith('text/event-stream')\n"
+        "body = response.text\n"
+        "assert body.endswith('\\n\\n')\n"
+        "blocks = [block.split('\\n') for block in body.strip('\\n').split('\\n\\n')]\n"
+        "assert [block[0] for block in blocks][::len(blocks) - 1] == ['event: start', 'event: done']\n"
+        "start = json.loads(blocks[0][1][len('data: '):])\n"
+        "deltas = [json.loads(block[0][len('data: '):])['delta'] for block in blocks[1:-1]]\n"
+        "done = json.loads(blocks[-1][1][len('data: '):])\n"
+        "assert deltas == ['Bon', 'jour']\n"
+        "assert done['execution_id'] == start['execution_id'] and done['usage']['total_tokens'] == 3\n"
+        "execution = db.get_executions(limit=1)[0]\n"
+        "assert execution['status'] == 'completed' and execution['output_data'] == 'Bonjour', execution\n"
+    )
+
+
+def test_metrics_require_admin_and_do_not_build_orchestrator():
+    """Les métriques sont réservées aux administrateurs et ne construisent pas l'orchestrateur"""
+    run_api(
+        "import ai_integration\n"
+        "response = client.get('/metrics/throttling')\n"
+        "assert response.status_code == 200 and 'workers' in response.json(), response.text\n"
+        "assert client.get('/metrics/routing').json()['models'] == {}\n"
+        "assert ai_integration._orchestrator is None\n"
+        "db.insert_user('bob', 'bob@exemple.fr', 'x', 'user')\n"
+        "api.app.dependency_overrides[api.get_current_user] = lambda: {'username': 'bob', 'user_id': 2}\n"
+        "assert client.get('/metrics/throttling').status_code == 403\n"
+        "assert client.get('/metrics/routing').status_code == 403\n"
+        "del api.app.dependency_overrides[api.get_current_user]\n"
+        "assert client.get('/metrics/throttling').status_code in (401, 403)\n"
+    )
+
+
+def test_logout_from_another_worker_is_honoured_on_cache_hit():
+    """Une session supprimée du stockage partagé est refusée même si l'utilisateur est en cache"""
+    run_api(
+        "from datetime import datetime, timedelta\n"
+        "del api.app.dependency_overrides[api.get_current_user]\n"
+        "expires_at = datetime.now() + timedelta(hours=1)\n"
+        "api.auth_manager.session_store.create('session_alice', {'username': 'alice',\n"
+        "    'expires_at': expires_at.isoformat()}, expires_at.timestamp())\n"
+        "headers = {'Authorization': 'Bearer session_alice'}\n"
+        "assert client.get('/agents', headers=headers).status_code == 200\n"
+        "assert api.principal_cache.peek('session_alice') is not None\n"
+        "api.auth_manager.session_store.delete('session_alice')  # déconnexion traitée ailleurs\n"
+        "assert client.get('/agents', headers=headers).status_code == 401\n"
+        "assert api.principal_cache.peek('session_alice') is None\n"
+    )
+
+
+def test_execute_batch_streams_in_completion_order_and_persists():
+    """/execute/batch : lignes NDJSON dans l'ordre de fin, concurrence plafonnée, exécutions enregistrées"""
+    run_api(
+        "def batch(inputs, max_concurrency):\n"
+        "    response = client.post('/execute/batch', json={'agent_id': agent_id, 'inputs': inputs,\n"
+        "                                                   'max_concurrency': max_concurrency})\n"
+        "    assert response.status_code == 200, response.text\n"
+        "    return [json.loads(line) for line in response.text.splitlines()]\n"
+        "lines = batch(['0.15', '0.1', '0.05', '0'], 16)\n"
+        "assert [line['index'] for line in lines[:-1]] == [3, 2, 1, 0]\n"
+        "assert lines[1]['output'] == 'ok 0.05' and lines[1]['total_tokens'] == 2\n"
+        "assert lines[-1] == {'done': True, 'total': 4, 'completed': 4, 'failed': 0, 'unsaved': 0}\n"
+        "lines = batch(['0.02'] * 20, 4)\n"
+        "assert orchestrator.peak == 4 and lines[-1]['completed'] == 20\n"
+        "assert db.count_executions(agent_id=agent_id) == 24\n"
+    )
+
+
+def test_execute_batch_reports_unsaved_executions():
+    """Une écriture en échec est retentée puis signalée par une ligne d'erreur NDJSON"""
+    run_api(
+        "attempts = []\n"
+        "db.bulk_insert_executions = lambda rows, chunk_size=1000: attempts.append(len(rows)) or 0\n"
+        "response = client.post('/execute/batch', json={'agent_id': agent_id, 'inputs': ['0', '0']})\n"
+        "lines = [json.loads(line) for line in response.text.splitlines()]\n"
+        "assert attempts == [2, 2]\n"
+        "assert lines[-2] == {'error': \"Exécutions non enregistrées dans l'historique\", 'unsaved': 2}\n"
+        "assert lines[-1]['unsaved'] == 2 and lines[-1]['completed'] == 2\n"
+    )
+
+
+if __name__ == "__main__":
+    test_execute_stream_sse_framing()
+    test_metrics_require_admin_and_do_not_build_orchestrator()
+    test_logout_from_another_worker_is_honoured_on_cache_hit()
+    test_execute_batch_streams_in_completion_order_and_persists()
+    test_execute_batch_reports_unsaved_executions()
+    print("✅ Tests de l'API REST réussis")
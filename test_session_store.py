@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test pour les stockages de sessions
+"""
+
+import os
+import tempfile
+import time
+
+from auth.session_store import MemorySessionStore, SQLiteSessionStore, SessionSweeper
+
+
+def test_memory_store_expiry_heap():
+    """Les sessions expirées sont invisibles puis purgées par le tas d'expiration"""
+    store = MemorySessionStore()
+    now = time.time()
+    store.create("expired", {"username": "a"}, now - 1)
+    store.create("alive", {"username": "b"}, now + 60)
+    store.create("renewed", {"username": "c"}, now - 1)
+    store.create("renewed", {"username": "c"}, now + 60)
+
+    assert store.get("expired") is None
+    assert store.get("alive") == {"username": "b"}
+    assert store.purge_expired() == 0  # "expired" déjà retirée à la lecture, "renewed" prolongée
+    assert store.get("renewed") == {"username": "c"}
+
+    store.create("short", {"username": "d"}, now - 1)
+    assert store.purge_expired() == 1
+    assert len(store) == 2
+
+
+def test_sqlite_store_persists_and_purges():
+    """Les sessions SQLite survivent à un redémarrage et la purge utilise expires_at"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.db")
+        store = SQLiteSessionStore(path)
+        store.create("alive", {"username": "a"}, time.time() + 60)
+        store.create("expired", {"username": "b"}, time.time() - 1)
+        store.close()
+
+        store = SQLiteSessionStore(path)
+        assert store.get("alive") == {"username": "a"}
+        assert store.get("expired") is None
+        assert store.purge_expired() == 1
+        store.delete("alive")
+        assert len(store) == 0
+        store.close()
+
+
+def test_sweeper_purges_in_background():
+    """Le sweeper purge sans qu'aucune session ne soit consultée"""
+    store = MemorySessionStore()
+    store.create("expired", {}, time.time() - 1)
+    sweeper = SessionSweeper(store, interval=0.01).start()
+    deadline = time.time() + 2
+    while len(store) and time.time() < deadline:
+        time.sleep(0.01)
+    sweeper.stop()
+    assert len(store) == 0
+
+
+if __name__ == "__main__":
+    test_memory_store_expiry_heap()
+    test_sqlite_store_persists_and_purges()
+    test_sweeper_purges_in_background()
+    print("✅ Tests des sessions réussis")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test du pool d'exécution des tâches planifiées
+"""
+
+import threading
+import time
+
+from agents.task_executor import TaskExecutor
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_throughput_scales_with_workers():
+    """8 tâches de 0,2 s sur 4 workers durent environ 0,4 s"""
+    executor = TaskExecutor(workers=4, type_limits={"agent_execution": 4})
+    executor.start()
+    started = time.perf_counter()
+    for i in range(8):
+        executor.submit(f"t{i}", lambda: time.sleep(0.2), task_type="agent_execution", target=f"agent:{i}")
+    assert wait_for(lambda: executor.counters["completed"] == 8)
+    assert time.perf_counter() - started < 0.7
+    executor.shutdown()
+
+
+def test_priorities_and_coalescing():
+    """La priorité la plus haute part d'abord ; une tâche déjà en file n'est pas dupliquée"""
+    executor = TaskExecutor(workers=1)
+    gate, order = threading.Event(), []
+    executor.start()
+    executor.submit("bloquante", gate.wait)
+    assert wait_for(lambda: executor.stats()["running"])
+    for key, priority in (("basse", "low"), ("haute", "high"), ("normale", "normal"), ("urgente", -1)):
+        assert executor.submit(key, lambda key=key: order.append(key), priority=priority)
+    assert not executor.submit("basse", lambda: order.append("doublon"))
+    gate.set()
+    assert wait_for(lambda: len(order) == 4)
+    assert order == ["urgente", "haute", "normale", "basse"]
+    assert executor.counters["coalesced"] == 1
+    executor.shutdown()
+
+
+def test_target_and_type_concurrency_limits():
+    """Une cible ne dépasse pas sa limite et un type lent laisse un worker aux autres"""
+    executor = TaskExecutor(workers=3, max_per_target=1)
+    lock, running, peak = threading.Lock(), {"n": 0}, {"n": 0}
+    gate, email_done = threading.Event(), threading.Event()
+
+    def agent_run():
+        with lock:
+            running["n"] += 1
+            peak["n"] = max(peak["n"], running["n"])
+        gate.wait()
+        with lock:
+            running["n"] -= 1
+
+    executor.start()
+    for i in range(3):
+        executor.submit(f"rapport_{i}", agent_run, task_type="agent_execution", target="agent:Rapport")
+    executor.submit("autre", agent_run, task_type="agent_execution", target="agent:Autre")
+    executor.submit("email", email_done.set, task_type="email_send")
+
+    assert email_done.wait(1), "l'email attend derrière les tâches d'agent"
+    assert wait_for(lambda: executor.stats()["waiting_for_target"] == 2)
+    gate.set()
+    assert wait_for(lambda: executor.counters["completed"] == 5)
+    assert peak["n"] == 2
+    executor.shutdown()
+
+
+def test_misfire_grace():
+    """Une échéance trop ancienne est abandonnée au lieu d'être exécutée en retard"""
+    executor = TaskExecutor(workers=1, misfire_grace=1)
+    ran, missed = [], []
+    executor.start()
+    executor.submit("en_retard", lambda: ran.append(1), due=time.time() - 10, on_misfire=missed.append)
+    executor.submit("sans_limite", lambda: ran.append(2), due=time.time() - 10, misfire_grace=None)
+    assert wait_for(lambda: len(ran) + len(missed) == 2)
+    assert ran == [2] and missed[0] >= 10
+    assert executor.counters["missed"] == 1
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    test_throughput_scales_with_workers()
+    test_priorities_and_coalescing()
+    test_target_and_type_concurrency_limits()
+    test_misfire_grace()
+    print("✅ Tests du pool d'exécution des tâches réussis")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test des baux d'exécution des tâches planifiées (plusieurs processus)
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+from database.db_manager import DatabaseManager
+from database.task_repository import TaskRepository
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_task(task_id, **fields):
+    task = {"id": task_id, "name": task_id, "type": "custom_action", "schedule_type": "recurring",
+            "schedule_config": {"frequency": "daily", "time": "09:00"}, "target": {}, "status": "planned",
+            "execution_count": 0, "max_executions": -1, "enabled": True}
+    task.update(fields)
+    return task
+
+
+def test_only_one_connection_wins_a_claim():
+    """Des réclamations simultanées depuis plusieurs connexions : un seul bail accordé"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        repositories = [TaskRepository(DatabaseManager(path)) for _ in range(4)]
+        repositories[0].save(make_task("partagee"))
+
+        results, barrier = [], threading.Barrier(16)
+
+        def claim(index):
+            barrier.wait()
+            results.append(repositories[index % 4].claim("partagee", f"owner-{index}", 1000.0, 60))
+
+        threads = [threading.Thread(target=claim, args=(i,)) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sum(result is not None for result in results) == 1
+
+
+def test_released_occurrence_is_not_claimed_again():
+    """Une échéance terminée n'est plus réclamable ; un bail expiré l'est de nouveau"""
+    with tempfile.TemporaryDirectory() as tmp:
+        repository = TaskRepository(DatabaseManager(os.path.join(tmp, "test.db")))
+        repository.save(make_task("quotidienne"))
+
+        assert repository.claim("quotidienne", "a", 1000.0, 60)["id"] == "quotidienne"
+        assert repository.claim("quotidienne", "b", 2000.0, 60) is None  # bail actif
+        assert repository.release("quotidienne", "a", 1000.0)
+        assert repository.claim("quotidienne", "b", 1000.0, 60) is None  # déjà exécutée
+        assert repository.claim("quotidienne", "b", 2000.0, 60) is not None
+        assert repository.release("quotidienne", "b", 2000.0)
+
+        # Processus arrêté sans libérer : l'échéance est reprise à l'expiration du bail
+        assert repository.claim("quotidienne", "c", 3000.0, -1) is not None
+        assert repository.claim("quotidienne", "d", 3000.0, 60) is not None
+        assert not repository.release("quotidienne", "c", 3000.0)
+
+        repository.save(make_task("quotidienne", enabled=False))
+        assert repository.claim("quotidienne", "a", 4000.0, 60) is None
+
+
+def test_task_runs_once_across_processes():
+    """Trois processus chargent la même tâche datée : elle n'est exécutée qu'une fois"""
+    worker = (
+        "import time\n"
+        "from agents.planner_agent import planner_agent\n"
+        "deadline = time.time() + 10\n"
+        "while planner_agent.repository.get('unique')['enabled'] and time.time() < deadline:\n"
+        "    time.sleep(0.05)\n"
+        "time.sleep(0.5)\n"
+        "print(planner_agent.executor.stats()['counters'].get('completed', 0))\n"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        repository = TaskRepository(DatabaseManager(os.path.join(tmp, "data", "ai_platform.db")))
+        when = (datetime.now() + timedelta(seconds=2)).isoformat()
+        repository.save(make_task("unique", schedule_type="datetime", schedule_config={"datetime": when}))
+
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        processes = [subprocess.Popen([sys.executable, "-c", worker], cwd=tmp, env=env,
+                                      stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                     for _ in range(3)]
+        outputs = [process.communicate(timeout=30) for process in processes]
+        assert all(process.returncode == 0 for process in processes), [err for _, err in outputs]
+
+        task = repository.get("unique")
+        assert task["execution_count"] == 1 and task["status"] == "completed", task
+        assert sum(int(out.strip() or 0) for out, _ in outputs) == 3  # un run par processus, un seul exécute
+
+
+def test_planners_sync_changes_from_each_other():
+    """Création et suppression faites par un processus reprises par les autres à la synchronisation"""
+    code = (
+        "from agents.planner_agent import planner_agent, PlannerAgent\n"
+        "other = PlannerAgent()\n"
+        "res = planner_agent.plan_task({'name': 'partagée', 'type': 'custom_action', 'schedule_type': 'recurring',\n"
+        "    'schedule_config': {'frequency': 'weekly', 'day': 'monday'}})\n"
+        "other._sync_from_store()\n"
+        "assert other.get_task(res['task_id'])['name'] == 'partagée' and res['task_id'] in other.scheduler\n"
+        "planner_agent.disable_task(res['task_id'])\n"
+        "other._sync_from_store()\n"
+        "assert res['task_id'] not in other.scheduler\n"
+        "planner_agent.delete_task(res['task_id'])\n"
+        "other._sync_from_store()\n"
+        "assert other.get_task(res['task_id']) is None and other.get_tasks() == []\n"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        result = subprocess.run([sys.executable, "-c", code], cwd=tmp, env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+
+
+def test_concurrent_changes_keep_list_and_index_consistent():
+    """Créations, suppressions et synchronisations simultanées : liste et index restent d'accord"""
+    code = (
+        "import sys, threading\n"
+        "sys.setswitchinterval(1e-6)\n"
+        "from agents.planner_agent import planner_agent, PlannerAgent\n"
+        "other = PlannerAgent()\n"
+        "config = {'name': 'n', 'type': 'custom_action', 'schedule_type': 'recurring',\n"
+        "          'schedule_config': {'frequency': 'weekly', 'day': 'monday'}}\n"
+        "def churn():\n"
+        "    for _ in range(20):\n"
+        "        task_id = planner_agent.plan_task(config)['task_id']\n"
+        "        other._sync_from_store()\n"
+        "        planner_agent.delete_task(task_id)\n"
+        "        other._sync_from_store()\n"
+        "threads = [threading.Thread(target=churn) for _ in range(4)]\n"
+        "for thread in threads:\n"
+        "    thread.start()\n"
+        "for thread in threads:\n"
+        "    thread.join()\n"
+        "other._sync_from_store()\n"
+        "for agent in (planner_agent, other):\n"
+        "    ids = [task['id'] for task in agent.get_tasks()]\n"
+        "    assert ids == [] and agent._task_index == {}, (ids, list(agent._task_index))\n"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        result = subprocess.run([sys.executable, "-c", code], cwd=tmp, env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+
+
+if __name__ == "__main__":
+    test_only_one_connection_wins_a_claim()
+    test_released_occurrence_is_not_claimed_again()
+    test_task_runs_once_across_processes()
+    test_planners_sync_changes_from_each_other()
+    test_concurrent_changes_keep_list_and_index_consistent()
+    print("✅ Tests des baux d'exécution réussis")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test pour le dépôt SQLite des tâches planifiées
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from database.db_manager import DatabaseManager
+from database.task_repository import TaskRepository
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_task(i, **fields):
+    task = {"id": f"task_{i:06d}", "name": f"Tâche {i}", "type": "custom_action", "schedule_type": "recurring",
+            "schedule_config": {"frequency": "daily", "time": "09:00"}, "target": {}, "status": "planned",
+            "created_at": f"2025-01-01T00:00:{i % 60:02d}", "execution_count": 0, "max_executions": -1,
+            "enabled": True}
+    task.update(fields)
+    return task
+
+
+def test_each_transition_rewrites_a_single_row():
+    """Création, changements d'état et suppression ne touchent que la ligne de la tâche"""
+    with tempfile.TemporaryDirectory() as tmp:
+        repository = TaskRepository(DatabaseManager(os.path.join(tmp, "test.db")))
+        task = make_task(1)
+        assert repository.save(task)
+        repository.save(make_task(2))
+
+        task.update(status="executing", execution_count=1)
+        assert repository.save(task)
+        task.update(status="completed", enabled=False, last_error=None)
+        assert repository.save(task)
+
+        assert repository.get("task_000001")["execution_count"] == 1
+        assert repository.count() == 2 and repository.count(enabled=True) == 1
+        assert repository.delete("task_000002")
+        assert [t["id"] for t in repository.load_all()] == ["task_000001"]
+
+
+def test_legacy_json_import_and_fast_replay():
+    """L'ancien fichier est importé une fois ; 100 000 tâches se rechargent rapidement"""
+    with tempfile.TemporaryDirectory() as tmp:
+        repository = TaskRepository(DatabaseManager(os.path.join(tmp, "test.db")))
+        legacy = os.path.join(tmp, "planned_tasks.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump([make_task(i) for i in range(3)], f)
+        assert repository.import_from_json(legacy) == 3
+        assert repository.import_from_json(legacy) == 3  # upsert : aucune copie en double
+        assert repository.count() == 3
+
+        assert repository.save_many(make_task(i) for i in range(3, 100_000)) == 99_997
+        started = time.perf_counter()
+        tasks = repository.load_all()
+        assert len(tasks) == 100_000
+        assert time.perf_counter() - started < 10
+
+
+def test_planner_state_survives_restart():
+    """Un nouveau planificateur reprend les tâches et leur état depuis la base"""
+    code = (
+        "import json, os, time\n"
+        "os.makedirs('data', exist_ok=True)\n"
+        "json.dump([{'id': 'ancienne', 'name': 'Ancienne', 'type': 'custom_action', 'schedule_type': 'recurring',\n"
+        "    'schedule_config': {'frequency': 'daily'}, 'target': {}, 'status': 'planned',\n"
+        "    'execution_count': 0, 'max_executions': -1, 'enabled': True}],\n"
+        "    open('data/planned_tasks.json', 'w'))\n"
+        "from agents.planner_agent import planner_agent, PlannerAgent\n"
+        "assert os.path.exists('data/planned_tasks.json.migrated')\n"
+        "res = planner_agent.plan_task({'name': 'pause', 'type': 'custom_action', 'schedule_type': 'recurring',\n"
+        "    'schedule_config': {'frequency': 'weekly', 'day': 'friday'}})\n"
+        "planner_agent.disable_task(res['task_id'])\n"
+        "planner_agent.stop_scheduler()\n"
+        "restarted = PlannerAgent()\n"
+        "assert [t['id'] for t in restarted.get_tasks()] == ['ancienne', res['task_id']]\n"
+        "assert restarted.get_task(res['task_id'])['enabled'] is False\n"
+        "assert 'ancienne' in restarted.scheduler and res['task_id'] not in restarted.scheduler\n"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        result = subprocess.run([sys.executable, "-c", code], cwd=tmp, env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+
+
+def test_failed_legacy_import_keeps_the_file():
+    """planned_tasks.json n'est renommé que si toutes ses tâches ont été enregistrées"""
+    code = (
+        "import json, os\n"
+        "os.makedirs('data', exist_ok=True)\n"
+        "json.dump([{'id': f't{i}', 'name': 'n', 'type': 'custom_action', 'schedule_type': 'recurring',\n"
+        "    'schedule_config': {'frequency': 'weekly', 'day': 'monday'}, 'enabled': False} for i in range(3)],\n"
+        "    open('data/planned_tasks.json', 'w'))\n"
+        "from database.task_repository import TaskRepository\n"
+        "save_many = TaskRepository.save_many\n"
+        "TaskRepository.save_many = lambda self, tasks, chunk_size=1000: save_many(self, list(tasks)[:2])\n"
+        "from agents.planner_agent import planner_agent, PlannerAgent\n"
+        "assert os.path.exists('data/planned_tasks.json') and len(planner_agent.get_tasks()) == 2\n"
+        "TaskRepository.save_many = save_many\n"
+        "restarted = PlannerAgent()\n"
+        "assert not os.path.exists('data/planned_tasks.json') and len(restarted.get_tasks()) == 3\n"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        result = subprocess.run([sys.executable, "-c", code], cwd=tmp, env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+
+
+if __name__ == "__main__":
+    test_each_transition_rewrites_a_single_row()
+    test_legacy_json_import_and_fast_replay()
+    test_planner_state_survives_restart()
+    test_failed_legacy_import_keeps_the_file()
+    print("✅ Tests du dépôt des tâches planifiées réussis")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test de l'ordonnanceur de tâches (tas des échéances, récurrences)
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from agents.task_scheduler import TaskScheduler, next_occurrence, next_time_window
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_next_occurrence_for_every_recurrence():
+    """Quotidienne, hebdomadaire, week-end, mensuelle, saisonnière et plages horaires"""
+    friday = datetime(2025, 1, 31, 12, 0)
+    assert next_occurrence("recurring", {"frequency": "daily", "time": "09:00"}, friday) == datetime(2025, 2, 1, 9, 0)
+    assert next_occurrence("recurring", {"frequency": "daily", "time": "13:00"}, friday) == datetime(2025, 1, 31, 13, 0)
+    assert next_occurrence("recurring", {"frequency": "weekly", "day": "friday", "time": "09:00"},
+                           friday) == datetime(2025, 2, 7, 9, 0)
+    assert next_occurrence("recurring", {"frequency": "weekend"}, friday) == datetime(2025, 2, 1, 10, 0)
+    assert next_occurrence("recurring", {"frequency": "monthly", "day": 31, "time": "09:00"},
+                           friday) == datetime(2025, 2, 28, 9, 0)
+    assert next_occurrence("seasonal", {"season": "winter", "time": "08:00"},
+                           datetime(2025, 12, 22)) == datetime(2026, 12, 21, 8, 0)
+    assert next_occurrence("conditional", {}, friday) is None
+
+    window = {"after": "08:00", "before": "18:00"}
+    assert next_time_window(window, friday) == friday
+    assert next_time_window(window, datetime(2025, 1, 31, 7, 0)) == datetime(2025, 1, 31, 8, 0)
+    assert next_time_window(window, datetime(2025, 1, 31, 19, 0)) == datetime(2025, 2, 1, 8, 0)
+    assert next_time_window({"after": "", "before": ""}, friday) == friday
+    assert next_time_window({"after": "18:00", "before": "08:00"}, friday) is None
+
+
+def test_fires_in_due_order_and_wakes_for_earlier_tasks():
+    """Le thread dort jusqu'à l'échéance et se réveille si une tâche plus proche arrive"""
+    scheduler = TaskScheduler()
+    fired, done = [], threading.Event()
+
+    def record(key):
+        fired.append((key, time.time()))
+        if len(fired) == 3:
+            done.set()
+
+    scheduler.start()
+    start = time.time()
+    scheduler.schedule("lente", start + 60, lambda: record("lente"))
+    scheduler.schedule("b", start + 0.2, lambda: record("b"))
+    scheduler.schedule("a", start + 0.1, lambda: record("a"))
+    scheduler.schedule("annulée", start + 0.05, lambda: record("annulée"))
+    assert scheduler.cancel("annulée")
+    scheduler.schedule("c", start - 1, lambda: record("c"))
+    scheduler.schedule("lente", start + 0.3, lambda: record("lente"))  # replanifiée plus tôt
+
+    assert done.wait(3)
+    assert [key for key, _ in fired] == ["c", "a", "b"]
+    assert fired[1][1] - start >= 0.1
+    assert scheduler.next_run("lente") is not None
+    scheduler.stop()
+    assert not scheduler.running and len(scheduler) == 0
+
+
+def test_hundred_thousand_tasks_insert_and_cancel():
+    """100 000 échéances : ajout et annulation rapides, tas compacté"""
+    scheduler = TaskScheduler()
+    now = time.time()
+    started = time.perf_counter()
+    for i in range(100_000):
+        scheduler.schedule(f"task_{i}", now + 3600 + i, lambda: None)
+    for i in range(0, 100_000, 2):
+        scheduler.cancel(f"task_{i}")
+    elapsed = time.perf_counter() - started
+
+    stats = scheduler.stats()
+    assert stats["scheduled"] == 50_000
+    assert stats["heap_size"] < 100_000
+    assert abs(scheduler.next_run("task_1").timestamp() - (now + 3601)) < 1e-3
+    assert elapsed < 5, elapsed
+
+
+def test_planner_runs_tasks_without_polling_threads():
+    """Le planificateur exécute une tâche datée via l'ordonnanceur, sans thread par tâche"""
+    code = (
+        "import threading, time\n"
+        "from datetime import datetime, timedelta\n"
+        "from agents.planner_agent import planner_agent\n"
+        "when = (datetime.now() + timedelta(seconds=0.3)).isoformat()\n"
+        "res = planner_agent.plan_task({'name': 'unique', 'type': 'custom_action',\n"
+        "    'schedule_type': 'datetime', 'schedule_config': {'datetime': when}})\n"
+        "planner_agent.plan_task({'name': 'mensuelle', 'type': 'custom_action', 'schedule_type': 'recurring',\n"
+        "    'schedule_config': {'frequency': 'monthly', 'day': 15, 'time': '08:00'}})\n"
+        "assert threading.active_count() == 2 + planner_agent.executor.workers, threading.enumerate()\n"
+        "deadline = time.time() + 5\n"
+        "while planner_agent.get_task(res['task_id'])['enabled'] and time.time() < deadline:\n"
+        "    time.sleep(0.05)\n"
+        "task = planner_agent.get_task(res['task_id'])\n"
+        "assert task['execution_count'] == 1 and not task['enabled'], task\n"
+        "assert res['task_id'] not in planner_agent.scheduler and len(planner_agent.get_tasks()) == 2\n"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        result = subprocess.run([sys.executable, "-c", code], cwd=tmp, env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+
+
+if __name__ == "__main__":
+    test_next_occurrence_for_every_recurrence()
+    test_fires_in_due_order_and_wakes_for_earlier_tasks()
+    test_hundred_thousand_tasks_insert_and_cancel()
+    test_planner_runs_tasks_without_polling_threads()
+    print("✅ Tests de l'ordonnanceur de tâches réussis")
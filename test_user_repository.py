@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de test pour le dépôt SQLite des utilisateurs
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from database.db_manager import DatabaseManager
+from database.user_repository import UserRepository
+from auth.auth_manager import AuthManager
+from auth.password_hasher import PasswordHasher
+from auth.session_store import MemorySessionStore
+
+
+def test_bulk_import_is_batched_and_idempotent():
+    """100 000 comptes s'importent en transactions groupées, sans doublon au second passage"""
+    with tempfile.TemporaryDirectory() as tmp:
+        repository = UserRepository(DatabaseManager(os.path.join(tmp, "test.db")))
+        users = [{"username": f"user_{i}", "email": f"user_{i}@example.com", "password_hash": "x",
+                  "role": "admin" if i % 1000 == 0 else "user"} for i in range(100000)]
+
+        started = time.perf_counter()
+        assert repository.bulk_import(users) == 100000
+        assert time.perf_counter() - started < 30
+        assert repository.bulk_import(users[:10]) == 0
+
+        assert repository.count() == 100000
+        assert repository.count(role="admin") == 100
+        assert repository.get_by_email("user_42@example.com")["username"] == "user_42"
+        assert [user["username"] for user in repository.list_users(limit=2)] == ["user_0", "user_1"]
+
+
+def test_auth_manager_migrates_json_and_authenticates():
+    """users.json est repris une fois, puis connexion, désactivation et import passent par la base"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            hasher = PasswordHasher(rounds=4)
+            os.makedirs("data")
+            with open("data/users.json", "w", encoding="utf-8") as f:
+                json.dump({"alice": {"username": "alice", "email": "alice@example.com",
+                                     "password_hash": hasher.hash("secret1"), "role": "admin"}}, f)
+
+            repository = UserRepository(DatabaseManager("data/test.db"))
+            manager = AuthManager(MemorySessionStore(), hasher, repository)
+            assert not os.path.exists("data/users.json")
+
+            login = manager.authenticate_user("alice", "secret1")
+            assert login["role"] == "admin"
+            assert manager.validate_session(login["session_id"])["username"] == "alice"
+
+            assert manager.import_users([{"username": "bob", "email": "bob@example.com", "password": "pwd123"}]) == 1
+            assert manager.register_user("carol", "pwd123", "bob@example.com") is False  # email déjà pris
+            assert manager.authenticate_user("bob", "pwd123")
+
+            manager.update_user_profile("bob", is_active=False)
+            assert manager.authenticate_user("bob", "pwd123") is None
+        finally:
+            os.chdir(cwd)
+
+
+def test_failed_json_import_keeps_the_file():
+    """users.json n'est renommé que lorsque tous ses comptes sont en base"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            os.makedirs("data")
+            with open("data/users.json", "w", encoding="utf-8") as f:
+                json.dump({name: {"email": f"{name}@example.com", "password_hash": "x"}
+                           for name in ("alice", "bob")}, f)
+
+            repository = UserRepository(DatabaseManager("data/test.db"))
+            import_chunk = repository.bulk_import
+            repository.bulk_import = lambda users, chunk_size=1000: import_chunk(list(users)[:1], chunk_size)
+            AuthManager(MemorySessionStore(), PasswordHasher(rounds=4), repository)
+            assert os.path.exists("data/users.json") and repository.exists("alice")
+
+            repository.bulk_import = import_chunk  # redémarrage : alice est ignorée, bob est importé
+            AuthManager(MemorySessionStore(), PasswordHasher(rounds=4), repository)
+            assert not os.path.exists("data/users.json") and repository.exists("bob")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    test_bulk_import_is_batched_and_idempotent()
+    test_auth_manager_migrates_json_and_authenticates()
+    test_failed_json_import_keeps_the_file()
+    print("✅ Tests du dépôt des utilisateurs réussis")